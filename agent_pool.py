@@ -0,0 +1,159 @@
+'''
+Agent instances shared by the Flask request threads.
+Agents are built in the background at startup. Their chains are reentrant, so each agent type is built
+once and every request uses that instance concurrently. Types listed as `exclusive` (agents that keep
+per-request state) instead get `size` instances, and each request checks one out and returns it.
+A type whose build fails is rebuilt with exponential backoff; the error is reported by stats() (/ready/).
+Until an agent type is ready (or while all its exclusive instances are busy) requests wait up to a timeout
+and then fail with AgentUnavailable, which app.py turns into a 503.
+While an instance is checked out, metrics recorded by the request are labelled with its class.
+'''
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class AgentUnavailable(Exception):
+    """Raised when no instance of an agent type could be checked out in time."""
+
+
+class AgentPool:
+    def __init__(self, factories, exclusive=(), size=2, ready_timeout=30, checkout_timeout=60,
+                 retry_base=1.0, retry_cap=60.0):
+        """
+        factories: {agent name: zero-argument callable building one instance}
+        exclusive: agent types checked out one request at a time, from `size` instances each
+        """
+        self.factories = factories
+        self.exclusive = set(exclusive)
+        self.size = size
+        self.ready_timeout = ready_timeout
+        self.checkout_timeout = checkout_timeout
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.shared = {}
+        self.available = {name: queue.Queue() for name in factories}
+        self.ready = {name: threading.Event() for name in factories}
+        self.errors = {}
+        self.stats_lock = threading.Lock()
+        self.waiting = {name: 0 for name in factories}
+        self.in_use = {name: 0 for name in factories}
+        self.checkouts = {name: 0 for name in factories}
+        self.rejected = {name: 0 for name in factories}
+        self.wait_total = {name: 0.0 for name in factories}
+        self.wait_max = {name: 0.0 for name in factories}
+        self.started_at = None
+        self.ready_at = None
+
+    def start(self, on_ready=None):
+        """Build all instances on a background thread; `on_ready` is called once every agent type is ready."""
+        self.started_at = time.time()
+        threading.Thread(target=self._build_all, args=(on_ready,), daemon=True).start()
+
+    def _build(self, name):
+        """Build the instances of one type, retrying failures with backoff; instances already built are kept."""
+        attempt = 0
+        while True:
+            try:
+                if name in self.exclusive:
+                    while self.available[name].qsize() < self.size:
+                        self.available[name].put(self.factories[name]())
+                else:
+                    self.shared[name] = self.factories[name]()
+                self.errors.pop(name, None)
+                self.ready[name].set()
+                return
+            except Exception as e:
+                delay = min(self.retry_cap, self.retry_base * 2 ** attempt)
+                attempt += 1
+                self.errors[name] = str(e)
+                print(f"[ERROR] Failed to build {name} agents (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+    def _build_all(self, on_ready):
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(self._build, self.factories))
+        self.ready_at = time.time()
+        print(f"[INFO] All agents loaded successfully ({self.ready_at - self.started_at:.1f}s)")
+        if on_ready:
+            on_ready()
+
+    def is_ready(self, name=None):
+        names = [name] if name else self.factories
+        return all(self.ready[n].is_set() for n in names)
+
+    def acquire(self, name):
+        """Take one `name` agent out of the pool; it must be given back with release()."""
+        start = time.perf_counter()
+        with self.stats_lock:
+            self.waiting[name] += 1
+        try:
+            if not self.ready[name].wait(self.ready_timeout):
+                error = self.errors.get(name)
+                raise AgentUnavailable(f"{name} agent failed to load ({error}), retrying" if error else f"{name} agent is still loading")
+            if name in self.exclusive:
+                try:
+                    agent = self.available[name].get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    raise AgentUnavailable(f"all {name} agents are busy")
+            else:
+                agent = self.shared[name]
+        except AgentUnavailable:
+            with self.stats_lock:
+                self.rejected[name] += 1
+            raise
+        finally:
+            with self.stats_lock:
+                self.waiting[name] -= 1
+
+        waited = time.perf_counter() - start
+        with self.stats_lock:
+            self.in_use[name] += 1
+            self.checkouts[name] += 1
+            self.wait_total[name] += waited
+            self.wait_max[name] = max(self.wait_max[name], waited)
+        return agent
+
+    def release(self, name, agent):
+        with self.stats_lock:
+            self.in_use[name] -= 1
+        if name in self.exclusive:
+            self.available[name].put(agent)
+
+    @contextmanager
+    def checkout(self, name):
+        """Check out one `name` agent for the duration of the with-block."""
+        agent = self.acquire(name)
+        agent_class = type(agent).__name__
+        try:
+            with metrics.labels(agent=agent_class):
+                route = metrics.current_labels().get("route")
+                with metrics.agent_in_flight.track(agent=agent_class, route=route), \
+                        metrics.agent_seconds.time(agent=agent_class, route=route):
+                    yield agent
+        finally:
+            self.release(name, agent)
+
+    def stats(self):
+        """Per agent type: readiness, build error, requests using it, idle exclusive instances, queue depth and checkout wait times (seconds)."""
+        with self.stats_lock:
+            return {
+                name: {
+                    "ready": self.ready[name].is_set(),
+                    "shared": name not in self.exclusive,
+                    "size": self.size if name in self.exclusive else 1,
+                    "in_use": self.in_use[name],
+                    "idle": self.available[name].qsize() if name in self.exclusive else None,
+                    "queue_depth": self.waiting[name],
+                    "checkouts": self.checkouts[name],
+                    "rejected": self.rejected[name],
+                    "avg_wait": self.wait_total[name] / self.checkouts[name] if self.checkouts[name] else 0.0,
+                    "max_wait": self.wait_max[name],
+                    "error": self.errors.get(name),
+                }
+                for name in self.factories
+            }
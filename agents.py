@@ -1,35 +1,79 @@
 import os
 
-import langchain_openai as lcai
-from utils import mLangChain
+import metrics
+import resilient_llm
+import model_routing
+from model_registry import registry
+from step_graph import StepGraph
+from semantic_cache import SemanticCache
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnableLambda, RunnablePassthrough
 
 import re
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
 from dotenv import load_dotenv
 load_dotenv("project.env")
 
-embeddings = lcai.OpenAIEmbeddings(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model="text-embedding-3-small"
-)
-
-llmchat = lcai.ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model="gpt-5-nano",
-    temperature=1
-)
-llminfo = lcai.ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model="gpt-5-nano",
-    temperature=1
-)
-llmemo = lcai.ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    model="gpt-5-nano",
-    temperature=1
-)
+# Model clients are built on first use (or by registry.warm_up()) so importing this module stays cheap
+def _openai_embeddings():
+    lcai = registry.import_module("langchain_openai")
+    return lcai.OpenAIEmbeddings(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model="text-embedding-3-small"
+    )
+
+def _openai_chat():
+    lcai = registry.import_module("langchain_openai")
+    return lcai.ChatOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model="gpt-5-nano",
+        temperature=1,
+        # Retries and timeouts are handled by resilient_llm (deadline, backoff, circuit breaker)
+        max_retries=0,
+        timeout=resilient_llm.LLM_REQUEST_DEADLINE
+    )
+
+def _openai_completion():
+    utils = registry.import_module("utils")
+    return utils.mLangChain().client_completion
+
+def _tier_model(tier):
+    # Factory for one model_routing tier (registered as "tier:<name>")
+    def factory():
+        lcai = registry.import_module("langchain_openai")
+        settings = model_routing.routing["tiers"][tier]
+        model_class = lcai.ChatOpenAI if settings["kind"] == "chat" else lcai.OpenAI
+        return model_class(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model=settings["model"],
+            temperature=settings["temperature"],
+            max_retries=0,
+            timeout=resilient_llm.LLM_REQUEST_DEADLINE
+        )
+    return factory
+
+registry.register("embeddings", _openai_embeddings)
+registry.register("llmchat", _openai_chat)
+registry.register("llminfo", _openai_chat)
+registry.register("llmemo", _openai_chat)
+registry.register("llmcompletion", _openai_completion)
+for _tier in model_routing.routing["tiers"]:
+    registry.register(model_routing.component(_tier), _tier_model(_tier))
+
+for _name in ["llmchat", "llminfo", "llmemo", "llmcompletion"] + [model_routing.component(t) for t in model_routing.routing["tiers"]]:
+    registry.on_load(_name, metrics.instrument_model)
+    registry.on_load(_name, resilient_llm.wrap)
+
+def __getattr__(name):
+    # Keeps `agents.llmchat` / `agents.llminfo` / `agents.llmemo` / `agents.embeddings` working for callers
+    if name in ("embeddings", "llmchat", "llminfo", "llmemo"):
+        return registry.get(name)
+    raise AttributeError(f"module 'agents' has no attribute '{name}'")
 
 
 categories = {
@@ -41,7 +85,8 @@ categories = {
 }
 
 def extract_cues(chain_output):
-    cues_text = chain_output.content
+    # Chat models return a message, completion models a string
+    cues_text = getattr(chain_output, 'content', chain_output)
     # Assuming each cue is separated by a newline in the chain_output.
     cues = cues_text.split('\n')
     # Filter out any empty strings or whitespace-only strings
@@ -67,20 +112,147 @@ def get_historical_context_chain():
             ("human", "{sender}:{message}"),
         ]
     )
-    contextualize_q_chain = contextualize_q_prompt | llminfo | StrOutputParser()
+    contextualize_q_chain = contextualize_q_prompt | registry.get("llminfo") | StrOutputParser()
     return contextualize_q_chain
 
+
+# Number of times an assign() branch was skipped because no later stage read it, keyed by (chain, branch)
+skipped_calls = Counter()
+_skipped_calls_lock = threading.Lock()
+
+def get_skipped_calls():
+    """Return a snapshot of skipped assign() branches as {"chain.branch": count}."""
+    with _skipped_calls_lock:
+        return {f"{chain}.{branch}": count for (chain, branch), count in skipped_calls.items()}
+
+def build_chain(name, template, model, **branches):
+    """
+    Build `assign(**branches) | template | model`, keeping only the branches the template consumes.
+
+    Branches can be Runnables or zero-argument factories returning one; factories for unused
+    branches are never called, so their LLM round-trip is neither built nor run.
+    Every invocation that skips a branch is counted in `skipped_calls`.
+    """
+    used = set(template.input_variables)
+    consumed = {}
+    skipped = []
+    for key, branch in branches.items():
+        if key not in used:
+            skipped.append(key)
+            continue
+        consumed[key] = branch if isinstance(branch, Runnable) else branch()
+
+    chain = template
+    if consumed:
+        chain = RunnablePassthrough.assign(**consumed) | chain
+
+    if skipped:
+        print(f"[INFO] {name}: skipping unused assign branches {skipped}")
+
+        def record_skipped(inputs):
+            with _skipped_calls_lock:
+                for key in skipped:
+                    skipped_calls[(name, key)] += 1
+            return inputs
+
+        chain = RunnableLambda(record_skipped) | chain
+
+    return chain | model
+
+
+def prompt_hash(*agents):
+    """Hash of every prompt template in the given agent instances' chains and of the model routing; changes whenever a prompt is edited or a step changes model."""
+    digest = hashlib.sha256(model_routing.fingerprint().encode())
+    for agent in agents:
+        for attr, chain in vars(agent).items():
+            if isinstance(chain, Runnable):
+                for prompt in chain.get_prompts():
+                    digest.update(f"{type(agent).__name__}.{attr}:{prompt.pretty_repr()}".encode())
+    return digest.hexdigest()[:16]
+
+
+# ===== Fused mode =====
+# mAgentER and mAgentEP can also answer with a single structured generation holding every intermediate
+# field, instead of one LLM call per step. Output that does not parse falls back to the step pipeline.
+
+fused_fallbacks = metrics.Counter("agent_fused_fallbacks_total", "Fused generations that did not parse and fell back to the step pipeline",
+                                  ["agent"])
+
+
+class FusedOutputError(ValueError):
+    """A fused generation that is not a JSON object with every expected field."""
+
+
+def parse_fused(output, keys):
+    """
+    {key: text} from a fused generation. Tolerates markdown fences, text around the JSON object and trailing
+    commas; raises FusedOutputError when a key is missing or empty.
+    """
+    text = getattr(output, 'content', output).strip()
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise FusedOutputError("no JSON object in the output")
+    candidate = text[start:end + 1]
+    try:
+        data = json.loads(candidate)
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(re.sub(r',\s*([}\]])', r'\1', candidate))
+        except json.JSONDecodeError as e:
+            raise FusedOutputError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise FusedOutputError("output is not a JSON object")
+    missing = [key for key in keys if not isinstance(data.get(key), str) or not data[key].strip()]
+    if missing:
+        raise FusedOutputError(f"missing fields {missing}")
+    return {key: data[key].strip() for key in keys}
+
+
+def structured_model(agent, step, keys):
+    """model_for(agent, step), constrained to a JSON object of string `keys` when its tier is a chat model."""
+    model = model_routing.model_for(agent, step)
+    if model_routing.tier_for(agent, step)["kind"] != "chat":
+        return model
+    schema = {"type": "object", "properties": {key: {"type": "string"} for key in keys},
+              "required": list(keys), "additionalProperties": False}
+    return model.bind(response_format={"type": "json_schema",
+                                       "json_schema": {"name": f"{agent}_{step}", "strict": True, "schema": schema}})
+
+
+def run_fused(graph, chain_input, fallback):
+    """
+    Run a single-step fused graph; when its output does not parse, run `fallback` (the step graph) instead.
+    Returns (results, timings); after a fallback the timings also hold 'fused_attempt'.
+    """
+    start = time.perf_counter()
+    try:
+        return graph.run(chain_input)
+    except FusedOutputError as e:
+        attempt = time.perf_counter() - start
+        fused_fallbacks.inc(agent=graph.name)
+        print(f"[WARNING] {graph.name}: fused output unusable ({e}), falling back to the step pipeline")
+    results, timings = fallback.run(chain_input)
+    timings['fused_attempt'] = attempt
+    timings['total'] += attempt
+    return results, timings
+
+
+# Cue / procedure lists for similar messages in the same domain are reused (see semantic_cache.py)
+info_cache = SemanticCache("mAgentInfo")
+trouble_cache = SemanticCache("mAgentTrouble")
+
 class mAgentInfo:
     def __init__(self):
         self.info_chain = self.agent_coworker_info()
 
     def invoke(self, input_params):
-        info_cue = self.info_chain.invoke({
+        info_cue = info_cache.invoke(input_params['domain'], input_params['message'], input_params['chat_history'],
+                                     lambda: self.info_chain.invoke({
             'domain':input_params['domain'],
             'message':input_params['message'],
             'sender': input_params['sender'],
             'chat_history':input_params['chat_history']
-            })
+            }), refresh=input_params.get('refresh_cache', False))
 
         return info_cue
     
@@ -111,12 +283,7 @@ class mAgentInfo:
             ]
         )
 
-        chain = (RunnablePassthrough.assign(
-            context=get_historical_context_chain()
-        )
-                 | template
-                 | llminfo
-                 )
+        chain = build_chain("mAgentInfo", template, model_routing.model_for("mAgentInfo", "cues"), context=get_historical_context_chain)
 
         chain = chain | extract_cues
 
@@ -128,12 +295,13 @@ class mAgentTrouble:
         self.trouble_chain = self.agent_coworker_trouble()
 
     def invoke(self, input_params):
-        trouble_steps = self.trouble_chain.invoke({
+        trouble_steps = trouble_cache.invoke(input_params['domain'], input_params['message'], input_params['chat_history'],
+                                             lambda: self.trouble_chain.invoke({
             'domain':input_params['domain'],
             'message':input_params['message'],
             'sender': input_params['sender'],
             'chat_history':input_params['chat_history']
-        })
+        }), refresh=input_params.get('refresh_cache', False))
 
         return trouble_steps
     
@@ -163,34 +331,77 @@ class mAgentTrouble:
             ]
         )
 
-        chain = (RunnablePassthrough.assign(
-            context=get_historical_context_chain()
-        )
-                 | template
-                 | llminfo
-                 )
+        chain = build_chain("mAgentTrouble", template, model_routing.model_for("mAgentTrouble", "procedure"), context=get_historical_context_chain)
 
         chain = chain | extract_cues
 
         return chain
 
 
+class mAgentSummary:
+    """Folds chat messages that have left the agents' history window into a running summary."""
+    def __init__(self):
+        self.summary_chain = self.agent_summary()
+
+    def invoke(self, input_params):
+        summary = self.summary_chain.invoke({
+            'summary': input_params['summary'] or "(none yet)",
+            'new_lines': "\n".join(str(m.content) for m in input_params['messages'])
+        })
+
+        return summary.strip()
+
+    def agent_summary(self):
+        prompt = """Your role is to keep a running summary of an online chat between a customer and a support representative.\
+            
+            Extend the current summary with the new lines of the conversation.\
+            Keep the customer's complaint, the details they shared, what the representative has already done or offered,\
+            and how the customer reacted.\
+            Do NOT add anything that is not in the conversation.\
+            Limit the summary to 5 sentences.\
+            """
+        template = ChatPromptTemplate.from_messages(
+            [
+                ("system", prompt),
+                ("user", "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}\n\nNew summary:"),
+            ]
+        )
+        chain = template | registry.get("llminfo") | StrOutputParser()
+        return chain
+
+
 class mAgentEP:
+    # Fields of the fused (single-call) generation
+    FUSED_KEYS = ['perspective', 'paraphrase']
+
     def __init__(self):
         self.ep_chain = self.agent_coworker_emo_perspective()
         self.rephrase = self.paraphraseResponse()
 
-    def invoke(self, user_input):
+        self.graph = StepGraph("mAgentEP")
+        self.graph.add('perspective', lambda r: self.ep_chain.invoke({'complaint': r['complaint']}))
+        self.graph.add('paraphrase', lambda r: self.rephrase.invoke({'response': r['perspective']}), deps=['perspective'])
 
-        # emo_perspec = self.ep_chain.invoke({'complaint':input_params['complaint'], 'chat_history':input_params['chat_history']})
-        emo_perspec = self.ep_chain.invoke({'complaint':user_input['complaint']})
-        final_res = self.rephrase.invoke({'response': emo_perspec})
+        # mode="fused": perspective and paraphrase from one structured generation
+        self.fused_chain = self.fused()
+        self.fused_graph = StepGraph("mAgentEP")
+        self.fused_graph.add('fused', lambda r: parse_fused(self.fused_chain.invoke({'complaint': r['complaint']}), self.FUSED_KEYS))
 
+    def invoke(self, user_input, mode="steps"):
+        final_res, _ = self.invoke_with_timings(user_input, mode)
         return final_res
+
+    def invoke_with_timings(self, user_input, mode="steps"):
+        """Same as invoke(), also returning the seconds spent in each step."""
+        # emo_perspec = self.ep_chain.invoke({'complaint':input_params['complaint'], 'chat_history':input_params['chat_history']})
+        if mode == "fused":
+            results, timings = run_fused(self.fused_graph, {'complaint': user_input['complaint']}, self.graph)
+            results = results.get('fused', results)
+        else:
+            results, timings = self.graph.run({'complaint': user_input['complaint']})
+        return results['paraphrase'], timings
     
     def agent_coworker_emo_perspective(self):
-        client = mLangChain()
-
         prompt = """Your role is to provide the customer's perspective of the conversation.
                     Summarize this for the representative.\
                     Describe how the customer might feel.\
@@ -207,7 +418,7 @@ class mAgentEP:
                 ("user", "{complaint}"),
             ]
         )
-        chain = template | client.client_completion
+        chain = template | model_routing.model_for("mAgentEP", "perspective") | StrOutputParser()
 
         # chain = (RunnablePassthrough.assign(
         #     context=get_historical_info_context_chain()
@@ -219,8 +430,6 @@ class mAgentEP:
         return chain
     
     def paraphraseResponse(self):
-        client = mLangChain()
-
         prompt = """Your role is to paraphrase given {response} using 2nd person pronouns as subject.\
                     The meaning of the sentence should NOT be changed while paraphrasing.\
                 """
@@ -230,32 +439,69 @@ class mAgentEP:
                 ("user", "{response}"),
             ]
         )
-        chain = template | client.client_completion
+        chain = template | model_routing.model_for("mAgentEP", "paraphrase") | StrOutputParser()
         return chain
 
+    def fused(self):
+        prompt = """Your role is to provide the customer's perspective of the conversation to the representative.\
+                    
+                    Answer with a JSON object with these fields:\
+                    - "perspective": how the customer might feel and how the customer might view the problem, in 2 sentences.\
+                    - "paraphrase": the perspective paraphrased using 2nd person pronouns as subject, without changing its meaning.\
+                    
+                    Output only the JSON object.\
+                """
+        template = ChatPromptTemplate.from_messages(
+            [
+                ("system", prompt),
+                ("user", "{complaint}"),
+            ]
+        )
+        return template | structured_model("mAgentEP", "fused", self.FUSED_KEYS)
+
 class mAgentER:
+    # Fields of the fused (single-call) generation
+    FUSED_KEYS = ['situation', 'thought', 'reframe', 'rephrase_thought', 'rephrase_reframe']
+
     def __init__(self):
         self.situation_chain = self.agent_coworker_emo_situation()
         self.thought_chain = self.agent_coworker_emo_thought()
         self.reframe_chain = self.agent_coworker_emo_reframe()
-
-    def invoke(self, user_input):
-        situation = self.situation_chain.invoke({'complaint':user_input['complaint'], 'chat_history':user_input['chat_history']})
-        thought = self.thought_chain.invoke({'complaint':user_input['complaint'], 'situation':situation, 'chat_history':user_input['chat_history']})
-        reframe = self.reframe_chain.invoke({'thought':thought, 'situation':situation})
-
-
-        rephrase_thought = self.rephrase().invoke({'thought':thought})
-        print(rephrase_thought)
-
-        rephrase_reframe = self.rephrase_rf().invoke({'thought':reframe})
-        print(rephrase_reframe)
+        self.rephrase_chain = self.rephrase()
+        self.rephrase_rf_chain = self.rephrase_rf()
+
+        # situation -> thought -> reframe -> rephrase_reframe, with rephrase_thought running alongside reframe
+        self.graph = StepGraph("mAgentER")
+        self.graph.add('situation', lambda r: self.situation_chain.invoke({'complaint': r['complaint'], 'chat_history': r['chat_history']}))
+        self.graph.add('thought', lambda r: self.thought_chain.invoke({'complaint': r['complaint'], 'situation': r['situation'], 'chat_history': r['chat_history']}), deps=['situation'])
+        self.graph.add('reframe', lambda r: self.reframe_chain.invoke({'thought': r['thought'], 'situation': r['situation']}), deps=['situation', 'thought'])
+        self.graph.add('rephrase_thought', lambda r: self.rephrase_chain.invoke({'thought': r['thought']}), deps=['thought'])
+        self.graph.add('rephrase_reframe', lambda r: self.rephrase_rf_chain.invoke({'thought': r['reframe']}), deps=['reframe'])
+
+        # mode="fused": all five fields from one structured generation
+        self.fused_chain = self.fused()
+        self.fused_graph = StepGraph("mAgentER")
+        self.fused_graph.add('fused', lambda r: parse_fused(self.fused_chain.invoke({'complaint': r['complaint'], 'chat_history': r['chat_history']}),
+                                                            self.FUSED_KEYS))
+
+    def invoke(self, user_input, mode="steps"):
+        result, _ = self.invoke_with_timings(user_input, mode)
+        return result
+
+    def invoke_with_timings(self, user_input, mode="steps"):
+        """Same as invoke(), also returning the seconds spent in each step. mode="fused" makes a single structured call."""
+        chain_input = {'complaint': user_input['complaint'], 'chat_history': user_input['chat_history']}
+        if mode == "fused":
+            results, timings = run_fused(self.fused_graph, chain_input, self.graph)
+            results = results.get('fused', results)
+        else:
+            results, timings = self.graph.run(chain_input)
 
         return {
-            'situation': situation.strip(),
-            'thought': rephrase_thought.strip(),
-            'reframe': rephrase_reframe.strip(),
-        }
+            'situation': results['situation'].strip(),
+            'thought': results['rephrase_thought'].strip(),
+            'reframe': results['rephrase_reframe'].strip(),
+        }, timings
     
 
     def agent_coworker_emo_situation(self):
@@ -278,7 +524,7 @@ class mAgentER:
                 ("user", "{complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | model_routing.model_for("mAgentER", "situation") | StrOutputParser()
 
         return chain
 
@@ -301,7 +547,7 @@ class mAgentER:
                 ("user", "{thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | model_routing.model_for("mAgentER", "rephrase_thought") | StrOutputParser()
         return chain
 
     def rephrase_rf(self):
@@ -323,7 +569,7 @@ class mAgentER:
                 ("user", "{thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | model_routing.model_for("mAgentER", "rephrase_reframe") | StrOutputParser()
         return chain
 
     def agent_coworker_emo_thought(self):
@@ -361,7 +607,7 @@ class mAgentER:
                 ("user", "{situation}: {complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | model_routing.model_for("mAgentER", "thought") | StrOutputParser()
 
         return chain
 
@@ -399,10 +645,51 @@ class mAgentER:
                 ("user", "{situation}: {thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | model_routing.model_for("mAgentER", "reframe") | StrOutputParser()
 
         return chain
 
+    def fused(self):
+
+        prompt = """
+            The chat history describes a representative chatting online with a complaining customer.\
+            The latest input is the last message from the customer.\
+            
+            Work through these steps and answer with a JSON object holding one field per step:\
+            
+            - "situation": summarize the situation in a concise paragraph that uses the following template:\
+              The customer is <context of complaint>.\
+              The customer is feeling <emotional state> because of the complaint.\
+              The customer's behavior towards the representative is <negative behavior>, as observed by statements such as <evidence>.\
+              These behaviors make the representative look <negative perception>.\
+            - "thought": the negative thought the representative might have in this situation.\
+            - "reframe": the representative's thought, reframed.\
+            - "rephrase_thought": acknowledge the thought as if speaking to the representative, beginning with phrases similar to\
+              "You might be thinking...", "It might seem like..." or "It could be that you are feeling...". Be concise.\
+            - "rephrase_reframe": rephrase the reframe as if convincing the representative to think that way, addressed to them as "you".\
+              Do NOT add information to the reframe, ONLY rephrase it, in 2-3 sentences.\
+            
+            Here are examples of thoughts and reframes given challenging situations:\
+            
+            Situation: I was at work and sent info for an ad to our local newspaper. They called me later and said my boss had over-ridden everything and sent them new info.\
+            Thought: He shouldn't assign me a task if he doesn't trust my work.\
+            Reframe: My boss wanted to provide different information, I did not know that beforehand. This is not a reflection of my work.\
+            
+            Situation: I was talking to a friend who got me angry.\
+            Thought: He's insulting me.\
+            Reframe: I should have a conversation with my friend to clarify what is going on if I am having such a strong reaction to what they said. If this is the first time this has happened, I will assume that they were not intentionally insulting me.\
+            
+            Output only the JSON object.\
+        """
+        template = ChatPromptTemplate.from_messages(
+            [
+                ("system", prompt),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("user", "{complaint}"),
+            ]
+        )
+        return template | structured_model("mAgentER", "fused", self.FUSED_KEYS)
+
 
 class mAgentCustomer:
     def get_historical_context_chain(self):
@@ -417,7 +704,7 @@ class mAgentCustomer:
                 ("human", "{question}"),
             ]
         )
-        contextualize_q_chain = contextualize_q_prompt | llmchat | StrOutputParser()
+        contextualize_q_chain = contextualize_q_prompt | model_routing.model_for("mAgentCustomer", "context") | StrOutputParser()
         return contextualize_q_chain
     
     def get_civil_chain(self):
@@ -451,13 +738,7 @@ class mAgentCustomer:
                 '''),
             ]
         )
-        rag_chain_info = (
-                RunnablePassthrough.assign(
-                    context=self.history_chain
-                )
-                | qa_info
-                | llmchat
-        )
+        rag_chain_info = build_chain("mAgentCustomer.civil", qa_info, model_routing.model_for("mAgentCustomer", "reply"), context=self.history_chain)
         return rag_chain_info
     
     def get_uncivil_chain(self):
@@ -500,13 +781,7 @@ class mAgentCustomer:
                 '''),
             ]
         )
-        rag_chain_info = (
-                RunnablePassthrough.assign(
-                    context=self.history_chain
-                )
-                | qa_info
-                | llmchat
-        )
+        rag_chain_info = build_chain("mAgentCustomer.uncivil", qa_info, model_routing.model_for("mAgentCustomer", "reply"), context=self.history_chain)
         return rag_chain_info
 
     def invoke(self, user_input):
@@ -515,7 +790,13 @@ class mAgentCustomer:
         else:
             ai_msg = self.uncivil_chain.invoke({"chat_history": user_input['chat_history'], "question": user_input['input'], "civil": user_input['civil']})
 
-        return ai_msg.content
+        return getattr(ai_msg, 'content', ai_msg)
+
+    def stream(self, user_input):
+        """Same as invoke(), yielding the reply text chunk by chunk as the model produces it."""
+        chain = self.civil_chain if user_input['civil'] == '1' else self.uncivil_chain
+        for chunk in chain.stream({"chat_history": user_input['chat_history'], "question": user_input['input'], "civil": user_input['civil']}):
+            yield getattr(chunk, 'content', chunk)
 
     def __init__(self):
             self.history_chain = self.get_historical_context_chain()
@@ -525,7 +806,6 @@ class mAgentCustomer:
 
 
 def agent_sender_fewshot_twitter_categorized():
-    client = mLangChain()
     prompt = """Your role is to act like a customer seeking support. \
                 You are messaging a service representative via live chat.\
                 You ONLY play the role of the customer. Do NOT play the role of the representative. \
@@ -617,11 +897,10 @@ def agent_sender_fewshot_twitter_categorized():
             ("system", prompt),
         ]
     )
-    chain = template | client.client_completion
+    chain = template | registry.get("llmcompletion")
     return chain
 
 def agent_sender_fewshot_twitter():
-    client = mLangChain()
     prompt = """Your role is to act like a customer seeking support. \
                 You are messaging a service representative via the support chat.\
                 You ONLY play the role of the customer. Do NOT play the role of the representative. \
@@ -684,6 +963,6 @@ def agent_sender_fewshot_twitter():
             ("system", prompt),
         ]
     )
-    chain = template | client.client_completion
+    chain = template | registry.get("llmcompletion")
     return chain
 
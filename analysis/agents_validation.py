@@ -1,5 +1,6 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnableParallel
 import langchain_openai as lcai
 
 import os
@@ -19,33 +20,60 @@ llmemo = lcai.AzureChatOpenAI(
     temperature=1,
 )
 
-class mAgentER_validation:
+# Optional limits on the LLM calls of every chain below, shared by all threads (see generate_reframe_summative.py)
+request_limiter = None  # RateLimiter counting requests
+token_limiter = None    # RateLimiter counting prompt tokens (estimated at ~4 characters per token)
+
+def _rate_limit(prompt):
+    if request_limiter:
+        request_limiter.acquire()
+    if token_limiter:
+        token_limiter.acquire(len(prompt.to_string()) // 4)
+    return prompt
+
+llmemo_limited = RunnableLambda(_rate_limit) | llmemo
+
+
+class ReframePipeline:
+    """
+    situation -> thought -> reframe -> reframe rephrase, with the thought rephrase running alongside the reframe;
+    shared by the agents below (which supply the prompts).
+    batch() runs each step for all inputs as one .batch() call, so variants of an incident run concurrently.
+    """
     def __init__(self):
         self.situation_chain = self.agent_coworker_emo_situation()
         self.thought_chain = self.agent_coworker_emo_thought()
         self.reframe_chain = self.agent_coworker_emo_reframe()
+        self.rephrase_rf_chain = self.rephrase_rf()
+        # The thought rephrase only needs the thought, so it runs side by side with the reframe step
+        self.reframe_step = RunnableParallel(reframe=self.reframe_chain, rephrased_thought=self.rephrase())
 
     def invoke(self, user_input):
-        situation = self.situation_chain.invoke({'complaint':user_input['complaint'], 'chat_history':user_input['chat_history']})
-        thought = self.thought_chain.invoke({'complaint':user_input['complaint'], 'situation':situation, 'chat_history':user_input['chat_history']})
-        reframe = self.reframe_chain.invoke({'thought':thought, 'situation':situation})
-
-
-        rephrase_thought = self.rephrase().invoke({'thought':thought})
-        rephrase_reframe = self.rephrase_rf().invoke({'reframe_thought':reframe})
-
-        if DEBUG:
-            print(f"{thought}\n -> \n{rephrase_thought}\n")
-            print()
-            print(f"{reframe}\n -> \n{rephrase_reframe}\n")
-
-        return {
-            'situation': situation.strip(),
-            'thought': rephrase_thought.strip(),
-            'reframe': rephrase_reframe.strip(),
-        }
-
-
+        return self.batch([user_input])[0]
+
+    def batch(self, user_inputs, config=None):
+        """user_inputs: dicts with 'complaint', 'chat_history' and the agent's context key"""
+        situations = self.situation_chain.batch(user_inputs, config)
+        thoughts = self.thought_chain.batch([{**u, 'situation': situation} for u, situation in zip(user_inputs, situations)], config)
+        reframed = self.reframe_step.batch([{**u, 'thought': thought, 'situation': situation}
+                                            for u, thought, situation in zip(user_inputs, thoughts, situations)], config)
+        rephrased_reframes = self.rephrase_rf_chain.batch([{'reframe_thought': r['reframe']} for r in reframed], config)
+
+        results = []
+        for situation, thought, r, rephrased_reframe in zip(situations, thoughts, reframed, rephrased_reframes):
+            if DEBUG:
+                print(f"{thought}\n -> \n{r['rephrased_thought']}\n")
+                print()
+                print(f"{r['reframe']}\n -> \n{rephrased_reframe}\n")
+
+            results.append({
+                'situation': situation.strip(),
+                'thought': r['rephrased_thought'].strip(),
+                'reframe': rephrased_reframe.strip(),
+            })
+        return results
+
+class mAgentER_validation(ReframePipeline):
     def agent_coworker_emo_situation(self):
 
         prompt = """
@@ -66,7 +94,7 @@ class mAgentER_validation:
                 ("user", "{complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -89,7 +117,7 @@ class mAgentER_validation:
                 ("user", "{thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
     def rephrase_rf(self):
@@ -111,7 +139,7 @@ class mAgentER_validation:
                 ("user", "{reframe_thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
     def agent_coworker_emo_thought(self):
@@ -149,7 +177,7 @@ class mAgentER_validation:
                 ("user", "{situation}: {complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -187,38 +215,12 @@ class mAgentER_validation:
                 ("user", "{situation}: {thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
 
-class nAgentER_ctx_pers:
-    def __init__(self):
-        self.situation_chain = self.agent_coworker_emo_situation()
-        self.thought_chain = self.agent_coworker_emo_thought()
-        self.reframe_chain = self.agent_coworker_emo_reframe()
-
-    def invoke(self, user_input):
-        situation = self.situation_chain.invoke({'complaint':user_input['complaint'], 'chat_history':user_input['chat_history']})
-        thought = self.thought_chain.invoke({'complaint':user_input['complaint'], 'situation':situation, 'chat_history':user_input['chat_history'],  "personality": user_input['personality']})
-        reframe = self.reframe_chain.invoke({'thought':thought, 'situation':situation,  "personality": user_input['personality']})
-
-
-        rephrase_thought = self.rephrase().invoke({'thought':thought})
-        rephrase_reframe = self.rephrase_rf().invoke({'reframe_thought':reframe})
-
-        if DEBUG:
-            print(f"{thought}\n -> \n{rephrase_thought}\n")
-            print()
-            print(f"{reframe}\n -> \n{rephrase_reframe}\n")
-
-        return {
-            'situation': situation.strip(),
-            'thought': rephrase_thought.strip(),
-            'reframe': rephrase_reframe.strip(),
-        }
-
-
+class nAgentER_ctx_pers(ReframePipeline):
     def agent_coworker_emo_situation(self):
 
         prompt = """
@@ -239,7 +241,7 @@ class nAgentER_ctx_pers:
                 ("user", "{complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -262,7 +264,7 @@ class nAgentER_ctx_pers:
                 ("user", "{thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
     def rephrase_rf(self):
@@ -284,7 +286,7 @@ class nAgentER_ctx_pers:
                 ("user", "thought: {reframe_thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
 
@@ -325,7 +327,7 @@ class nAgentER_ctx_pers:
                 ("user", "{situation} +  {personality}: {thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -347,39 +349,13 @@ class nAgentER_ctx_pers:
                 ("user", "{situation} + {personality}: {complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
 
 
-class nAgentER_ctx_behv:
-    def __init__(self):
-        self.situation_chain = self.agent_coworker_emo_situation()
-        self.thought_chain = self.agent_coworker_emo_thought()
-        self.reframe_chain = self.agent_coworker_emo_reframe()
-
-    def invoke(self, user_input):
-        situation = self.situation_chain.invoke({'complaint':user_input['complaint'], 'chat_history':user_input['chat_history']})
-        thought = self.thought_chain.invoke({'complaint':user_input['complaint'], 'situation':situation, 'chat_history':user_input['chat_history'],  "behavior": user_input['behavior']})
-        reframe = self.reframe_chain.invoke({'thought':thought, 'situation':situation,  "behavior": user_input['behavior']})
-
-
-        rephrase_thought = self.rephrase().invoke({'thought':thought})
-        rephrase_reframe = self.rephrase_rf().invoke({'reframe_thought':reframe})
-
-        if DEBUG:
-            print(f"{thought}\n -> \n{rephrase_thought}\n")
-            print()
-            print(f"{reframe}\n -> \n{rephrase_reframe}\n")
-
-        return {
-            'situation': situation.strip(),
-            'thought': rephrase_thought.strip(),
-            'reframe': rephrase_reframe.strip(),
-        }
-
-
+class nAgentER_ctx_behv(ReframePipeline):
     def agent_coworker_emo_situation(self):
 
         prompt = """
@@ -400,7 +376,7 @@ class nAgentER_ctx_behv:
                 ("user", "{complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -423,7 +399,7 @@ class nAgentER_ctx_behv:
                 ("user", "{thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
     def rephrase_rf(self):
@@ -445,7 +421,7 @@ class nAgentER_ctx_behv:
                 ("user", "thought: {reframe_thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
         return chain
 
 
@@ -486,7 +462,7 @@ class nAgentER_ctx_behv:
                 ("user", "{situation} +  {behavior}: {thought}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
@@ -508,7 +484,7 @@ class nAgentER_ctx_behv:
                 ("user", "{situation} + {behavior}: {complaint}"),
             ]
         )
-        chain = template | llmemo | StrOutputParser()
+        chain = template | llmemo_limited | StrOutputParser()
 
         return chain
 
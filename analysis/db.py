@@ -1,45 +1,239 @@
-from pymongo import MongoClient
+'''
+Export the study collections from MongoDB to TSV and Parquet (or Arrow IPC) files.
+
+Collections are read with a cursor in batches of `batch_size` documents, in `key` order (default `_id`),
+and every batch is appended to <name>.tsv and written as one part file in the <name>/ directory, so
+memory is bounded by one batch and rows are on disk as soon as they are read.
+
+Exports are incremental: export_state.json records, per collection, the last exported `key` value and
+how far the files got. The next run only queries documents after that value, and first trims anything a
+crashed run wrote after its last recorded batch. Use --full to start over. With the default `_id` key,
+documents are ordered by ObjectId creation time; pass --key with a timestamp field if writers can insert
+out of order (documents without that field are not exported).
+
+The export functions take a collection object, so they also run against mongomock.MongoClient().
+
+    python db.py [DIR_PATH] [--formats tsv,parquet] [--batch-size 1000] [--fields a,b] [--key _id] [--full]
+'''
 import pandas as pd
-import os, sys
+import os, json, argparse, datetime
+
+COLLECTIONS = ['chat_post_task', 'chat_history', 'chat_client_info', 'chat_in_task', 'chat_pre_task',
+               'summative_writing', 'summative_scoring']
+STATE_FILE = 'export_state.json'
+
+
+def encode_key(value):
+    """JSON-safe form of the last exported key value (ObjectId and datetime keep their type)."""
+    if type(value).__name__ == 'ObjectId':
+        return {'type': 'ObjectId', 'value': str(value)}
+    if isinstance(value, datetime.datetime):
+        return {'type': 'datetime', 'value': value.isoformat()}
+    return {'type': 'json', 'value': value}
+
 
-client = MongoClient('localhost', 27017)
-db = client['flask_db']
+def decode_key(encoded):
+    if encoded['type'] == 'ObjectId':
+        from bson import ObjectId
+        return ObjectId(encoded['value'])
+    if encoded['type'] == 'datetime':
+        return datetime.datetime.fromisoformat(encoded['value'])
+    return encoded['value']
 
-collections = {
-    'chat_post_task': db.chat_post_task,
-    'chat_history': db.chat_history,
-    'chat_client_info': db.chat_client_info,
-    'chat_in_task': db.chat_in_task,
-    'chat_pre_task': db.chat_pre_task,
-    'summative_writing': db.summative_writing,
-    'summative_scoring': db.summative_scoring
-}
 
+def load_state(dir_path):
+    path = os.path.join(dir_path, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
 
-def fetch_and_format_data(collection):
-    data = list(collection.find())
-    df = pd.DataFrame(data)
+
+def save_state(dir_path, state):
+    path = os.path.join(dir_path, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def format_batch(documents):
+    """DataFrame of one batch: ObjectIds as strings, nested documents/arrays as JSON, duplicate columns dropped"""
+    def flat(value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        if type(value).__name__ == 'ObjectId':
+            return str(value)
+        return value
+    df = pd.DataFrame([{k: flat(v) for k, v in doc.items()} for doc in documents])
     df = df.loc[:, ~df.columns.duplicated()]
     return df
 
-def mongo_to_tsv(collection, file_name):
-    data = fetch_and_format_data(collection)
-    file_name = os.path.join(DIR_PATH, file_name)
-    data.to_csv(file_name, sep='\t', index=False)
-    print(f"Data saved to {file_name}")
+
+def _read_header(tsv_path):
+    with open(tsv_path, newline='') as f:
+        return f.readline().rstrip('\n').split('\t')
+
+
+def _rewrite_header(tsv_path, columns):
+    """Replace the TSV header line; older rows simply lack the new trailing columns (read back as empty)."""
+    tmp_path = tsv_path + '.tmp'
+    with open(tsv_path, newline='') as src, open(tmp_path, 'w', newline='') as dst:
+        src.readline()
+        dst.write('\t'.join(columns) + '\n')
+        for line in src:
+            dst.write(line)
+    os.replace(tmp_path, tsv_path)
+
+
+def _write_part(df, part_path, fmt):
+    import pyarrow as pa
+    # Mongo documents have no fixed types, so columns are stored as strings (like the TSV); nulls stay null
+    table = pa.Table.from_pandas(df.astype('string'), preserve_index=False)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, part_path)
+    else:
+        import pyarrow.ipc as ipc
+        with ipc.new_file(part_path, table.schema) as writer:
+            writer.write_table(table)
+
+
+def with_key(projection, key):
+    """Mongo projection (field list or dict) that always returns `key`, which the incremental export resumes from"""
+    if projection is None:
+        return None
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    projection = dict(projection)
+    if any(value for field, value in projection.items() if field != '_id'):
+        projection[key] = 1
+    else:
+        projection.pop(key, None)
+    return projection
+
+
+def export_collection(collection, name, dir_path, formats=('tsv', 'parquet'), batch_size=1000, projection=None,
+                      key='_id', resume=True):
+    """
+    Stream `collection` into dir_path/<name>.tsv and dir_path/<name>/part-*.<format>.
+    projection: fields to export (a list of fields or a Mongo projection), default all; `key` is always included.
+    resume: continue after the last export recorded in export_state.json (False starts the files over).
+    Returns the number of documents exported by this call.
+    """
+    tsv_path = os.path.join(dir_path, name + '.tsv')
+    parts_dir = os.path.join(dir_path, name)
+    columnar = [fmt for fmt in formats if fmt in ('parquet', 'arrow')]
+    os.makedirs(dir_path, exist_ok=True)
+    state = load_state(dir_path)
+    progress = state.get(name) if resume else None
+    if progress and progress.get('key') != key:
+        print(f"{name}: export key changed from {progress.get('key')} to {key}, exporting everything again")
+        progress = None
+    progress = progress or {'key': key, 'last': None, 'rows': 0, 'tsv_bytes': 0, 'parts': 0}
+
+    # Drop whatever a previous run wrote after its last recorded batch (or everything, for a full export)
+    if 'tsv' in formats and os.path.exists(tsv_path):
+        with open(tsv_path, 'r+b') as f:
+            f.truncate(progress['tsv_bytes'])
+    if os.path.isdir(parts_dir):
+        for part in os.listdir(parts_dir):
+            if part.startswith('part-') and int(part.split('-')[1].split('.')[0]) >= progress['parts']:
+                os.remove(os.path.join(parts_dir, part))
+    if columnar:
+        os.makedirs(parts_dir, exist_ok=True)
+    # Record the reset now: a run that finds nothing to export must not leave the old offsets behind
+    state[name] = progress
+    save_state(dir_path, state)
+
+    if progress['last']:
+        query = {key: {'$gt': decode_key(progress['last'])}}
+    else:
+        query = {} if key == '_id' else {key: {'$exists': True}}
+    cursor = collection.find(query, with_key(projection, key)).sort(key, 1).batch_size(batch_size)
+    columns = _read_header(tsv_path) if 'tsv' in formats and progress['tsv_bytes'] else None
+    exported = 0
+
+    def flush(documents):
+        nonlocal columns, exported
+        df = format_batch(documents)
+        if 'tsv' in formats:
+            # Keep the column order of the file; columns first seen in this batch go at the end
+            new_columns = [c for c in df.columns if c not in (columns or [])]
+            columns = (columns or []) + new_columns
+            df.reindex(columns=columns).to_csv(tsv_path, sep='\t', index=False, mode='a',
+                                               header=progress['tsv_bytes'] == 0)
+            if new_columns and progress['tsv_bytes']:
+                _rewrite_header(tsv_path, columns)
+            progress['tsv_bytes'] = os.path.getsize(tsv_path)
+        for fmt in columnar:
+            _write_part(df, os.path.join(parts_dir, f"part-{progress['parts']:05d}.{fmt}"), fmt)
+        if columnar:
+            progress['parts'] += 1
+        progress['last'] = encode_key(documents[-1][key])
+        progress['rows'] += len(documents)
+        exported += len(documents)
+        state[name] = progress
+        save_state(dir_path, state)
+
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    print(f"Exported {exported} new rows of {name} ({progress['rows']} total) to {dir_path}")
+    return exported
+
+
+def read_parts(dir_path, name, fmt='parquet'):
+    """Load the columnar export of a collection as one DataFrame (parts may have different columns)."""
+    import pyarrow as pa
+    parts_dir = os.path.join(dir_path, name)
+    paths = sorted(os.path.join(parts_dir, p) for p in os.listdir(parts_dir) if p.endswith('.' + fmt))
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        tables = [pq.read_table(p) for p in paths]
+    else:
+        import pyarrow.ipc as ipc
+        tables = [ipc.open_file(p).read_all() for p in paths]
+    try:
+        table = pa.concat_tables(tables, promote_options='default')
+    except TypeError:  # pyarrow < 14
+        table = pa.concat_tables(tables, promote=True)
+    return table.to_pandas()
+
+
+def export_all(db, dir_path, formats=('tsv', 'parquet'), batch_size=1000, projection=None, key='_id', resume=True):
+    for name in COLLECTIONS:
+        export_collection(db[name], name, dir_path, formats=formats, batch_size=batch_size, projection=projection,
+                          key=key, resume=resume)
 
 
-### If argument provided, it will be used as DIR_PATH
-DIR_PATH = '../data'    # Default path is data directory in the project. Already in .gitignore
-if len(sys.argv) > 1:
-    DIR_PATH = sys.argv[1]
-os.makedirs(DIR_PATH, exist_ok=True)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the study collections to TSV and Parquet/Arrow")
+    ### If argument provided, it will be used as DIR_PATH
+    parser.add_argument('dir_path', nargs='?', default='../data')    # Default path is data directory in the project. Already in .gitignore
+    parser.add_argument('--formats', default='tsv,parquet', help="comma-separated: tsv, parquet, arrow")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--fields', help="comma-separated fields to export (default: all); the --key field is always included")
+    parser.add_argument('--key', default='_id', help="field the incremental export resumes from")
+    parser.add_argument('--full', action='store_true', help="ignore export_state.json and export everything")
+    args = parser.parse_args()
 
+    formats = args.formats.split(',')
+    if any(fmt in ('parquet', 'arrow') for fmt in formats):
+        try:
+            import pyarrow
+        except ModuleNotFoundError:
+            print("pyarrow is not installed, exporting TSV only")
+            formats = [fmt for fmt in formats if fmt == 'tsv']
+    os.makedirs(args.dir_path, exist_ok=True)
 
-mongo_to_tsv(db.chat_post_task, 'chat_post_task.tsv')
-mongo_to_tsv(db.chat_history, 'chat_history.tsv')
-mongo_to_tsv(db.chat_client_info, 'chat_client_info.tsv')
-mongo_to_tsv(db.chat_in_task, 'chat_in_task.tsv')
-mongo_to_tsv(db.chat_pre_task, 'chat_pre_task.tsv')
-mongo_to_tsv(db.summative_writing, 'summative_writing.tsv')
-mongo_to_tsv(db.summative_scoring, 'summative_scoring.tsv')
\ No newline at end of file
+    from pymongo import MongoClient
+    client = MongoClient('localhost', 27017)
+    db = client['flask_db']
+    export_all(db, args.dir_path, formats=formats, batch_size=args.batch_size,
+               projection=args.fields.split(',') if args.fields else None, key=args.key, resume=not args.full)
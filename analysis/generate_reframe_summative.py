@@ -1,9 +1,12 @@
-import time,os
+import time,os,sys,json,argparse,threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from langchain_core.messages import AIMessage, HumanMessage
 import agents_validation as av
 
 ROOT_RELATIVE_PATH = os.path.dirname(os.path.abspath(''))
+sys.path.append(ROOT_RELATIVE_PATH)
+from rate_limiter import RateLimiter
 
 DIR_PATH = os.path.join(ROOT_RELATIVE_PATH,'data')    # Default path is data directory in the project. Already in .gitignore
 DIR_SERVER_PATH = os.path.join(DIR_PATH,'server_data')
@@ -25,7 +28,7 @@ defaultBehaviors = {
     "bored":"The conversation takes place at the middle of the work shift. The representative has been spending minimal time on tasks and has been regularly checking their personal messages."
 }
 
-def generate_empathetic_msg(incident_row):
+def incident_chat(incident_row):
     chat_history = [
         AIMessage(content="Client: "+incident_row['Initial Complaint']),
         HumanMessage(content="Representative: "+incident_row['Support Agent Response 1']),
@@ -33,65 +36,110 @@ def generate_empathetic_msg(incident_row):
         HumanMessage(content="Representative: "+incident_row['Support Agent Response 2'])
     ]
     reply = incident_row['Follow-up Complaint 2']
+    return reply, chat_history
 
-    emo_agent = av.mAgentER_validation()
-    emo_agent_ctx_pers = av.nAgentER_ctx_pers()
-    emo_agent_ctx_behv = av.nAgentER_ctx_behv()
 
-    responses = []
-    response_cw_emo = emo_agent.invoke({'complaint':reply, "chat_history": chat_history})
-    response_row = {
+def generate_empathetic_msg(incident_row, emo_agent, emo_agent_ctx_pers, emo_agent_ctx_behv):
+    """
+    7 messages for the incident: 1 default, 1 per personality, 1 per behavior.
+    The personality and behavior variants each run as one batch, and the three groups run concurrently.
+    """
+    reply, chat_history = incident_chat(incident_row)
+    incident_id = int(incident_row['ID'])
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        default = executor.submit(emo_agent.invoke, {'complaint':reply, "chat_history": chat_history})
+        pers = executor.submit(emo_agent_ctx_pers.batch, [{'complaint':reply, "chat_history": chat_history, "personality": defaultPersonalities[personality]}
+                                                          for personality in defaultPersonalities])
+        behv = executor.submit(emo_agent_ctx_behv.batch, [{'complaint':reply, "chat_history": chat_history, "behavior": defaultBehaviors[behavior]}
+                                                          for behavior in defaultBehaviors])
+
+    responses = [{
         "user_id": "system",
-        "incident_id": incident_row['ID'],
-        "coworker_empathetic_msg": response_cw_emo['reframe']
-    }
-    responses.append(response_row)
-    print(f"Generated empathetic message for incident {incident_row['ID']}")
-
-    for personality in defaultPersonalities:
-        response_cw_emo_ctx = emo_agent_ctx_pers.invoke({'complaint':reply, "chat_history": chat_history, "personality": defaultPersonalities[personality]})
-        response_row = {
+        "incident_id": incident_id,
+        "coworker_empathetic_msg": default.result()['reframe']
+    }]
+    for personality, response_cw_emo_ctx in zip(defaultPersonalities, pers.result()):
+        responses.append({
             "user_id": "system",
-            "incident_id": incident_row['ID'],
+            "incident_id": incident_id,
             "coworker_empathetic_msg": response_cw_emo_ctx['reframe'],
             "context_pers": defaultPersonalities[personality]
-        }
-        responses.append(response_row)
-        print(f"Generated empathetic message for incident {incident_row['ID']} with personality {personality}")
-
-    for behavior in defaultBehaviors:
-        response_cw_emo_ctx = emo_agent_ctx_behv.invoke({'complaint':reply, "chat_history": chat_history, "behavior": defaultBehaviors[behavior]})
-        response_row = {
+        })
+    for behavior, response_cw_emo_ctx in zip(defaultBehaviors, behv.result()):
+        responses.append({
             "user_id": "system",
-            "incident_id": incident_row['ID'],
+            "incident_id": incident_id,
             "coworker_empathetic_msg": response_cw_emo_ctx['reframe'],
             "context_behv": defaultBehaviors[behavior]
-        }
-        responses.append(response_row)
-        print(f"Generated empathetic message for incident {incident_row['ID']} with behavior {behavior}")
-
-    print()
+        })
     return responses
 
+
+def load_checkpoint(checkpoint_path):
+    """Messages of incidents finished by earlier runs, keyed by incident ID (a truncated last line is ignored)."""
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[record['incident_id']] = record['responses']
+    return done
+
 '''
 Generate empathetic messages for each incident
-Each message takes at max 9 seconds to generate
-7 messages for each incident: 1 default, 3 for each personality, 3 for each behavior
-Total time to generate messages for 1 incident: 7*9 = 63 seconds
-Total time to generate messages for 45 incidents: 45*63 = 2835 seconds = 47.25 minutes
-Adding 15 seconds in between each incident for a break
-Total time to generate messages for 45 incidents: 45*78 = 3510 seconds = 58.5 minutes
+Each message is a 5-step pipeline (situation, thought, reframe, 2 rephrases run together) of ~9 seconds.
+The 7 messages of an incident run concurrently and max_concurrency incidents run at a time, so the job is
+bounded by the API rate limits (requests_per_minute / tokens_per_minute) instead of 45*78 seconds.
+Finished incidents are appended to checkpoint_path; a rerun only generates the missing ones.
 '''
-def generate_empathetic_msgs(incidents_df):
-    responses = []
-    for index, row in incidents_df.iterrows():
-        responses += generate_empathetic_msg(row)
-        print("Taking a 15 second break...")
-        time.sleep(15)
-        print()
+def generate_empathetic_msgs(incidents_df, checkpoint_path, max_concurrency=4, requests_per_minute=0, tokens_per_minute=0):
+    av.request_limiter = RateLimiter(requests_per_minute)
+    av.token_limiter = RateLimiter(tokens_per_minute, burst=tokens_per_minute) if tokens_per_minute > 0 else None
 
+    # Agents hold only their chains, so one instance of each serves every incident and thread
+    emo_agent = av.mAgentER_validation()
+    emo_agent_ctx_pers = av.nAgentER_ctx_pers()
+    emo_agent_ctx_behv = av.nAgentER_ctx_behv()
+
+    done = load_checkpoint(checkpoint_path)
+    pending = [row for _, row in incidents_df.iterrows() if int(row['ID']) not in done]
+    print(f"{len(done)} incidents in {checkpoint_path}, generating {len(pending)}")
+    write_lock = threading.Lock()
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(generate_empathetic_msg, row, emo_agent, emo_agent_ctx_pers, emo_agent_ctx_behv): int(row['ID'])
+                   for row in pending}
+        for future in as_completed(futures):
+            incident_id = futures[future]
+            try:
+                responses = future.result()
+            except Exception as e:
+                print(f"Incident {incident_id} failed, it will be retried on the next run: {e}")
+                continue
+            with write_lock:
+                with open(checkpoint_path, 'a') as f:
+                    f.write(json.dumps({'incident_id': incident_id, 'responses': responses}) + "\n")
+                done[incident_id] = responses
+            print(f"Generated empathetic messages for incident {incident_id} ({time.time() - start_time:.1f}s)")
+
+    responses = [response for incident_id in sorted(done) for response in done[incident_id]]
     responses_df = pd.DataFrame(responses)
     return responses_df
 
-responses_df = generate_empathetic_msgs(incidents_df)
-responses_df.to_csv(os.path.join(DIR_SANITIZED_PATH,'empathetic_msgs_ai.tsv'), sep='\t', index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the AI empathetic reframing messages for every incident")
+    parser.add_argument('--max-concurrency', type=int, default=4, help="incidents generated at the same time (7 messages each)")
+    parser.add_argument('--rpm', type=float, default=0, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument('--tpm', type=float, default=0, help="prompt tokens per minute (0 = unlimited)")
+    parser.add_argument('--checkpoint', default=os.path.join(DIR_SANITIZED_PATH,'empathetic_msgs_ai.jsonl'))
+    args = parser.parse_args()
+
+    responses_df = generate_empathetic_msgs(incidents_df, args.checkpoint, max_concurrency=args.max_concurrency,
+                                            requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    responses_df.to_csv(os.path.join(DIR_SANITIZED_PATH,'empathetic_msgs_ai.tsv'), sep='\t', index=False)
@@ -1,14 +1,27 @@
 from flask import Flask, send_from_directory
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
-import os, json
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, Response, stream_with_context, copy_current_request_context
+import os, json, time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from agents import *
 
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain.schema import messages_from_dict, messages_to_dict
-from sentiment import analyze_sentiment_decision
+from sentiment import sentiment_engine
+from model_registry import registry
+from agent_pool import AgentPool, AgentUnavailable
 
 import config as common
+import metrics
+import resilient_llm
+import event_store
+import mouse_log
+import mouse_summary
+from conversation_store import ConversationStore
+from conversation_summary import RollingSummary
+from support_prefetch import SupportPrefetcher
+from opening_panels import OpeningPanelPool
+from slot_allocator import SlotAllocator
 
 # from pymongo import MongoClient
 # from flask_pymongo import PyMongo
@@ -19,7 +32,6 @@ from uuid import uuid4
 import datetime
 from flask_session import Session
 import fcntl
-import random
 load_dotenv("project.env")
 
 DB_NAME = "test"
@@ -48,10 +60,22 @@ DATA_DIR = "study_data_round_1"
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+# Chat histories, keyed by client_id (the session only keeps the per-client settings)
+conversation_store = ConversationStore(os.path.join(DATA_DIR, "conversations.db"))
+
 # Participant count management
-COUNTS_FILE = "participant_counts.json"  # verified completions — source of truth for slot availability
+COUNTS_FILE = "participant_counts.json"  # copy of the verified completion counts, for the study admins
+COMPLETIONS_CSV = "completions.csv"
 MAX_PER_CONDITION_PER_TYPE = 30
 
+# Slot availability (completions + leases of participants in progress); see slot_allocator.py
+slot_allocator = SlotAllocator("slots.db", max_per_slot=MAX_PER_CONDITION_PER_TYPE)
+if os.path.exists(COUNTS_FILE):
+    with open(COUNTS_FILE) as f:
+        slot_allocator.seed(json.load(f))  # one-time migration; no-op once completions are counted
+elif os.path.exists(COMPLETIONS_CSV):
+    slot_allocator.rebuild(COMPLETIONS_CSV)
+
 def get_participant_dir(session_id):
     """Return the data directory for a participant, named by Prolific ID when available."""
     prolific_id = session.get(session_id, {}).get('prolific_id', '').strip()
@@ -86,22 +110,8 @@ def save_session_data(session_id, data_type, data):
         return False
 
 def save_ai_suggestion(session_id, client_id, turn_number, support_type, support_content, round_num=None):
-    """Append AI agent suggestion to ai_suggestions file"""
+    """Append AI agent suggestion to the ai_suggestions log"""
     try:
-        participant_dir = get_participant_dir(session_id)
-        if not os.path.exists(participant_dir):
-            os.makedirs(participant_dir)
-
-        filepath = os.path.join(participant_dir, 'ai_suggestions.json')
-
-        # Load existing suggestions or create new
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                suggestions = json.load(f)
-        else:
-            suggestions = []
-
-        # Append new suggestion
         suggestion_data = {
             'session_id': session_id,
             'client_id': client_id,
@@ -111,11 +121,7 @@ def save_ai_suggestion(session_id, client_id, turn_number, support_type, support
             'support_content': support_content,
             'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
         }
-        suggestions.append(suggestion_data)
-
-        # Save updated suggestions
-        with open(filepath, 'w') as f:
-            json.dump(suggestions, f, indent=2)
+        event_store.append(get_participant_dir(session_id), 'ai_suggestions', suggestion_data)
 
         return True
     except Exception as e:
@@ -123,22 +129,8 @@ def save_ai_suggestion(session_id, client_id, turn_number, support_type, support
         return False
 
 def save_slider_feedback(session_id, client_id, turn_number, support_type, slider_value, round_num=None):
-    """Append slider feedback to ai_feedback file"""
+    """Append slider feedback to the ai_feedback log"""
     try:
-        participant_dir = get_participant_dir(session_id)
-        if not os.path.exists(participant_dir):
-            os.makedirs(participant_dir)
-
-        filepath = os.path.join(participant_dir, 'ai_feedback.json')
-
-        # Load existing feedback or create new
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                feedback = json.load(f)
-        else:
-            feedback = []
-
-        # Append new feedback
         feedback_data = {
             'session_id': session_id,
             'client_id': client_id,
@@ -148,11 +140,7 @@ def save_slider_feedback(session_id, client_id, turn_number, support_type, slide
             'slider_value': slider_value,
             'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
         }
-        feedback.append(feedback_data)
-
-        # Save updated feedback
-        with open(filepath, 'w') as f:
-            json.dump(feedback, f, indent=2)
+        event_store.append(get_participant_dir(session_id), 'ai_feedback', feedback_data)
 
         return True
     except Exception as e:
@@ -160,22 +148,8 @@ def save_slider_feedback(session_id, client_id, turn_number, support_type, slide
         return False
 
 def save_chat_message(session_id, client_id, turn_number, sender, receiver, message, round_num=None):
-    """Append chat message to chat history file"""
+    """Append chat message to the chat_history log"""
     try:
-        participant_dir = get_participant_dir(session_id)
-        if not os.path.exists(participant_dir):
-            os.makedirs(participant_dir)
-
-        filepath = os.path.join(participant_dir, 'chat_history.json')
-
-        # Load existing chat history or create new
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                chat_history = json.load(f)
-        else:
-            chat_history = []
-
-        # Append new message
         message_data = {
             'session_id': session_id,
             'client_id': client_id,
@@ -186,11 +160,7 @@ def save_chat_message(session_id, client_id, turn_number, sender, receiver, mess
             'message': message.strip(),
             'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
         }
-        chat_history.append(message_data)
-
-        # Save updated chat history
-        with open(filepath, 'w') as f:
-            json.dump(chat_history, f, indent=2)
+        event_store.append(get_participant_dir(session_id), 'chat_history', message_data)
 
         return True
     except Exception as e:
@@ -198,60 +168,32 @@ def save_chat_message(session_id, client_id, turn_number, sender, receiver, mess
         return False
 
 def load_participant_counts():
-    """Load participant counts from JSON with file locking"""
-    try:
-        with open(COUNTS_FILE, 'r') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)  # Shared lock for reading
-            counts = json.load(f)
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)  # Unlock
-            return counts
-    except FileNotFoundError:
-        # Initialize if file doesn't exist
-        initial_counts = {
-            "no_agents": {"Suppressor": 0, "NonSuppressor": 0},
-            "emo_only": {"Suppressor": 0, "NonSuppressor": 0},
-            "info_only": {"Suppressor": 0, "NonSuppressor": 0},
-            "both_agents": {"Suppressor": 0, "NonSuppressor": 0}
-        }
-        save_participant_counts(initial_counts)
-        return initial_counts
+    """Completed participants per condition and emotion regulation type (served from memory)"""
+    return slot_allocator.counts()
 
 def save_participant_counts(counts):
-    """Save participant counts to JSON with file locking"""
-    with open(COUNTS_FILE, 'w') as f:
-        fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Exclusive lock for writing
+    """Write a copy of the counts to participant_counts.json for the study admins"""
+    tmp_path = COUNTS_FILE + ".tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(counts, f, indent=2)
-        fcntl.flock(f.fileno(), fcntl.LOCK_UN)  # Unlock
+    os.replace(tmp_path, COUNTS_FILE)
 
 def is_study_full():
     """
-    Check if ALL 240 slots are filled (4 conditions × 30 suppressors × 2 types).
+    Check if ALL 240 slots are taken (4 conditions × 30 × 2 types), counting completed participants
+    and the slots leased to participants still in progress.
     Returns True if study is at full capacity.
     """
-    counts = load_participant_counts()
-    for condition, type_counts in counts.items():
-        if type_counts["Suppressor"] < MAX_PER_CONDITION_PER_TYPE or \
-           type_counts["NonSuppressor"] < MAX_PER_CONDITION_PER_TYPE:
-            return False
-    return True
-
-def assign_condition(emotion_regulation_type):
+    return slot_allocator.is_full()
+
+def assign_condition(session_id, emotion_regulation_type):
     """
-    Assign participant to a condition based on verified completion counts.
-    Does NOT increment — the count only moves when a participant fully completes.
+    Assign participant to a random condition that still has room for their type, leasing them the slot.
+    The lease is released if they fail the attention check or do not finish within SLOT_LEASE_MINUTES,
+    and becomes a completion in storeProlificExit.
     Returns condition name or None if all conditions are full for this type.
     """
-    counts = load_participant_counts()
-
-    available_conditions = []
-    for condition, type_counts in counts.items():
-        if type_counts[emotion_regulation_type] < MAX_PER_CONDITION_PER_TYPE:
-            available_conditions.append(condition)
-
-    if not available_conditions:
-        return None
-
-    return random.choice(available_conditions)
+    return slot_allocator.reserve(session_id, emotion_regulation_type)
 
 ### Mongo DB
 # db = client[DB_NAME]
@@ -267,7 +209,6 @@ def assign_condition(emotion_regulation_type):
 # summative_writing = db.summative_writing
 # summative_scoring = db.summative_scoring
 
-sender_agent = None
 chat_history = [
 ]
 
@@ -276,36 +217,78 @@ clientQueue = []
 
 
 
-# Load all agents in background so Flask starts immediately
-from concurrent.futures import ThreadPoolExecutor
-import threading
-
-sender_agent = None
-emo_agent = None
-ep_agent = None
-info_agent = None
-trouble_agent = None
-
-def _load_agents():
-    global sender_agent, emo_agent, ep_agent, info_agent, trouble_agent
-    with ThreadPoolExecutor() as executor:
-        future_sender = executor.submit(mAgentCustomer)
-        future_emo = executor.submit(mAgentER)
-        future_ep = executor.submit(mAgentEP)
-        future_info = executor.submit(mAgentInfo)
-        future_trouble = executor.submit(mAgentTrouble)
-
-        sender_agent = future_sender.result()
-        emo_agent = future_emo.result()
-        ep_agent = future_ep.result()
-        info_agent = future_info.result()
-        trouble_agent = future_trouble.result()
-    print("[INFO] All agents loaded successfully")
-
-_agent_loader = threading.Thread(target=_load_agents, daemon=True)
-_agent_loader.start()
-
+# Agents are built in the background so Flask starts immediately. Their chains are stateless, so one
+# instance per type serves every request concurrently (see agent_pool.py)
 
+def _warm_up_models():
+    # Load the remaining models (sentiment) now rather than on the first participant's request
+    if os.getenv("WARM_UP_MODELS", "1") == "1":
+        try:
+            print(f"[INFO] Model load timings: {registry.warm_up()}")
+        except Exception as e:
+            print(f"[WARNING] Model warm-up failed, models will load on first use: {e}")
+
+agent_pool = AgentPool({
+    "sender": mAgentCustomer,
+    "emo": mAgentER,
+    "ep": mAgentEP,
+    "info": mAgentInfo,
+    "trouble": mAgentTrouble,
+    "summary": mAgentSummary,
+})
+agent_pool.start(on_ready=lambda: (_warm_up_models(), _fill_opening_panels()))
+
+def _summarize(summary, messages):
+    with agent_pool.checkout("summary") as summary_agent:
+        return summary_agent.invoke({"summary": summary, "messages": messages})
+
+# Agents see a running summary plus the latest messages instead of the whole chat history
+rolling_summary = RollingSummary(conversation_store, _summarize)
+
+
+@app.before_request
+def label_route():
+    # LLM and agent metrics recorded while serving this request are labelled with its route
+    metrics.set_route(request.url_rule.rule if request.url_rule else None)
+    # LLM calls made for this request (prefetched panels included) give up at the deadline
+    resilient_llm.set_deadline(resilient_llm.LLM_REQUEST_DEADLINE)
+
+@app.teardown_request
+def clear_route(error=None):
+    metrics.set_route(None)
+    resilient_llm.set_deadline(None)
+
+@app.errorhandler(AgentUnavailable)
+def agent_unavailable(e):
+    return jsonify({"message": str(e)}), 503, {"Retry-After": "5"}
+
+@app.errorhandler(resilient_llm.CircuitOpen)
+def llm_circuit_open(e):
+    return jsonify({"message": str(e)}), 503, {"Retry-After": str(int(e.retry_after))}
+
+@app.errorhandler(resilient_llm.DeadlineExceeded)
+def llm_deadline_exceeded(e):
+    return jsonify({"message": str(e)}), 504
+
+@app.route('/ready/')
+def ready():
+    """Readiness probe: 200 once every agent type is built, 503 (with any build errors being retried) before"""
+    if agent_pool.is_ready():
+        return jsonify({"ready": True}), 200
+    stats = agent_pool.stats()
+    return jsonify({"ready": False, "agents": {name: s["ready"] for name, s in stats.items()},
+                    "errors": {name: s["error"] for name, s in stats.items() if s["error"]}}), 503
+
+@app.route('/health/')
+def health():
+    """Liveness plus per-agent pool stats (idle instances, queue depth, checkout wait times), support prefetch hit rates per turn, semantic cache hit rates and LLM hedge/retry rates"""
+    return jsonify({"status": "ok", "ready": agent_pool.is_ready(), "agents": agent_pool.stats(), "prefetch": support_prefetcher.stats(),
+                    "semantic_cache": {"info": info_cache.stats(), "trouble": trouble_cache.stats()}, "llm": resilient_llm.stats()}), 200
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-model/agent/step LLM latency, token, error and in-flight metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def hello():
@@ -499,7 +482,7 @@ def storePreSurvey(session_id):
         # assigned_condition = "info_only"
         # assigned_condition = "both_agents"
         # PRODUCTION:
-        assigned_condition = assign_condition(emotion_regulation_type)
+        assigned_condition = assign_condition(session_id, emotion_regulation_type)
 
         if assigned_condition is None:
             # No conditions have space for this suppressor type - redirect out
@@ -660,7 +643,8 @@ def attention_check_failed(session_id):
             json.dump(failure_data, f, indent=2)
         print(f"[ATTENTION CHECK] Failure logged to {failure_file}")
 
-        # Invalidate session so participant cannot continue the study
+        # Give the participant's condition slot back, then invalidate session so they cannot continue the study
+        slot_allocator.release(session_id)
         session.pop(session_id, None)
         print(f"[ATTENTION CHECK] Session {session_id} invalidated")
 
@@ -680,6 +664,76 @@ def index(session_id):
     return render_template('index_chat.html', session_id=session_id, current_client=current_client, current_round=current_round, common_strings=common.SUPPORT_TYPE_STRINGS)
 
 
+REPLY_PREFIXES = ["Client:", "Customer:", "Representative:", "client:", "customer:", "representative:"]
+FINISH_MARKER = "FINISH:999"
+
+def strip_reply_prefix(response):
+    """Remove a role label the customer agent may have put in front of its reply"""
+    for prefix in REPLY_PREFIXES:
+        if response.startswith(prefix):
+            return response[len(prefix):].strip()
+    return response
+
+def store_reply(session_id, client_id, prompt, response):
+    """Append the representative's message and the customer's reply to the conversation store and the chat log"""
+    conversation_store.append(client_id, HumanMessage(content="Representative: "+prompt), AIMessage(content="Client: "+response))
+    rolling_summary.refresh(client_id)
+
+    turn_number = conversation_store.count(client_id) // 2 + 1
+    current_round = session[session_id].get('current_round', 1)
+
+    # Save representative message
+    save_chat_message(session_id, client_id, turn_number - 1, 'representative', 'client', prompt, current_round)
+
+    # Save client reply
+    save_chat_message(session_id, client_id, turn_number, 'client', 'representative', response, current_round)
+
+
+class ReplyStreamCleaner:
+    """
+    Incremental version of getReply's clean-up for a streamed reply.
+    feed() returns only text that can no longer change: a possible leading role prefix, trailing
+    whitespace and anything that could be the start of FINISH:999 are held back until resolved.
+    """
+    def __init__(self):
+        self.raw = ""
+        self.sent = 0
+        self.finished = False
+
+    def feed(self, chunk):
+        self.raw += chunk
+        if any(prefix.startswith(self.raw) for prefix in REPLY_PREFIXES):
+            return ""
+
+        cleaned = strip_reply_prefix(self.raw)
+        marker_at = cleaned.find(FINISH_MARKER)
+        if marker_at >= 0:
+            self.finished = True
+            safe = cleaned[:marker_at]
+        else:
+            safe = cleaned
+            for k in range(len(FINISH_MARKER) - 1, 0, -1):
+                if cleaned.endswith(FINISH_MARKER[:k]):
+                    safe = cleaned[:-k]
+                    break
+        safe = safe.rstrip()
+
+        if len(safe) <= self.sent:
+            return ""
+        token = safe[self.sent:]
+        self.sent = len(safe)
+        return token
+
+    def result(self):
+        """The complete reply, cleaned exactly like the non-streaming route"""
+        return strip_reply_prefix(self.raw)
+
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
 @app.route('/get-reply/<session_id>/', methods=['GET','POST'])
 def getReply(session_id):
     if session_id not in session:
@@ -697,28 +751,19 @@ def getReply(session_id):
         show_emo = request.args.get('emo')
 
         # Hardcoded first complaint messages per category (avoids slow LLM call)
-        hardcoded_complaints = {
-            "Service Quality": "I just got off the worst flight of my life. The crew was completely dismissive, nobody helped with my overhead bag, and the gate agent was rude when I asked a simple question. This is absolutely unacceptable!",
-            "Product Issues": "Your online check-in keeps throwing errors every time I try to get my boarding pass! My flight leaves in a few hours and I can't even check in. What kind of system are you running here?!",
-            "Pricing and Charges": "I just noticed a $150 charge on my credit card that was never mentioned when I booked my ticket! Hidden fees are completely unacceptable. I want an explanation and a refund immediately!",
-            "Policy": "So you're telling me I can't change my flight without paying a $200 fee even though YOUR airline changed the departure time?! That's the most unfair policy I've ever heard. This is ridiculous!",
-            "Resolution": "I filed a complaint two weeks ago about my lost luggage and all I got was a generic email saying you're 'looking into it.' Nobody has actually done anything! I'm still waiting for my bag and a real answer!"
-        }
-
-        response = hardcoded_complaints.get(val_category, "I'm having a serious issue with your airline and I need this resolved immediately!")
+        response = common.openingComplaints.get(val_category, common.OPENING_COMPLAINT_FALLBACK)
 
         client_id = str(uuid4())
-        current_client = session[session_id]['current_client']
-        session[session_id][client_id] = {"current_client": current_client, "domain": val_domain, "category": val_category, "civil": val_civil, "chat_history": []}
-        session[session_id][client_id]["chat_history"] = messages_to_dict([AIMessage(content="Client: "+response)])
-        
+        session[session_id][client_id] = {"domain": val_domain, "category": val_category, "civil": val_civil}
+        conversation_store.append(client_id, AIMessage(content="Client: "+response))
 
-        turn_number = len(session[session_id][client_id]["chat_history"])
+        turn_number = conversation_store.count(client_id)
         timestamp = datetime.datetime.now(datetime.timezone.utc)
         current_round = session[session_id].get('current_round', 1)
 
         # Save initial complaint message
         save_chat_message(session_id, client_id, turn_number, 'client', 'representative', response, current_round)
+        prefetch_support(session_id, client_id, response)
 
         # chat_client_info.insert_one({
         #     "session_id": session_id,
@@ -752,8 +797,7 @@ def getReply(session_id):
         show_info = request.json.get("show_info")
         show_emo = request.json.get("show_emo")
 
-        retrieve_from_session = json.loads(json.dumps(session[session_id][client_id]["chat_history"]))
-        chat_history = messages_from_dict(retrieve_from_session)
+        chat_history = conversation_store.messages(client_id)
 
         # Count representative messages (HumanMessage objects in chat history)
         rep_message_count = sum(1 for msg in chat_history if isinstance(msg, HumanMessage))
@@ -763,28 +807,17 @@ def getReply(session_id):
             response = "FINISH:999"
         else:
             print(f"[DEBUG] Calling LLM for turn {rep_message_count + 1}...")
-            result = sender_agent.invoke({"input": prompt, "chat_history": chat_history, "civil": session[session_id][client_id]["civil"]})
+            with agent_pool.checkout("sender") as sender_agent:
+                result = sender_agent.invoke({"input": prompt, "chat_history": rolling_summary.window(client_id, chat_history), "civil": session[session_id][client_id]["civil"]})
             response = result
             print(f"[DEBUG] LLM response received: {response[:80]}...")
 
         # Clean up any prefixes that AI might have added
-        for prefix in ["Client:", "Customer:", "Representative:", "client:", "customer:", "representative:"]:
-            if response.startswith(prefix):
-                response = response[len(prefix):].strip()
-                break
+        response = strip_reply_prefix(response)
 
-        chat_history.extend([HumanMessage(content="Representative: "+prompt), AIMessage(content="Client: "+response)])
-        session[session_id][client_id]["chat_history"] = messages_to_dict(chat_history)
-
-        turn_number = len(chat_history) // 2 + 1
+        store_reply(session_id, client_id, prompt, response)
+        prefetch_support(session_id, client_id, response)
         timestamp = datetime.datetime.now(datetime.timezone.utc)
-        current_round = session[session_id].get('current_round', 1)
-
-        # Save representative message
-        save_chat_message(session_id, client_id, turn_number - 1, 'representative', 'client', prompt, current_round)
-
-        # Save client reply
-        save_chat_message(session_id, client_id, turn_number, 'client', 'representative', response, current_round)
 
         # Insert representative response
         # chat_history_collection.insert_one({
@@ -817,6 +850,66 @@ def getReply(session_id):
 
     })
 
+@app.route('/get-reply-stream/<session_id>/', methods=['POST'])
+def getReplyStream(session_id):
+    """
+    Server-sent events variant of getReply (POST).
+    Sends {"token": ...} events as the customer's reply is generated, then one "done" event
+    carrying the same payload getReply returns, once the reply has been saved.
+    """
+    if session_id not in session:
+        return "Invalid session", 401
+    clientQueue = session[session_id]['client_queue']
+    prompt = request.json.get("prompt")
+    client_id = request.json.get("client_id")
+    show_info = request.json.get("show_info")
+    show_emo = request.json.get("show_emo")
+
+    chat_history = conversation_store.messages(client_id)
+    civil = session[session_id][client_id]["civil"]
+
+    # Force FINISH after 6 representative turns
+    rep_message_count = sum(1 for msg in chat_history if isinstance(msg, HumanMessage))
+    chat_history = rolling_summary.window(client_id, chat_history)
+    sender_agent = agent_pool.acquire("sender") if rep_message_count < 6 else None
+
+    def generate():
+        if sender_agent is None:
+            response = FINISH_MARKER
+        else:
+            print(f"[DEBUG] Streaming LLM reply for turn {rep_message_count + 1}...")
+            cleaner = ReplyStreamCleaner()
+            try:
+                for chunk in sender_agent.stream({"input": prompt, "chat_history": chat_history, "civil": civil}):
+                    token = cleaner.feed(chunk)
+                    if token:
+                        yield sse_event({"token": token})
+                    if cleaner.finished:
+                        break
+            except Exception as e:
+                print(f"[ERROR] Streaming reply failed: {e}")
+                yield sse_event({"message": str(e)}, "error")
+                return
+            response = cleaner.result()
+            print(f"[DEBUG] LLM response received: {response[:80]}...")
+
+        store_reply(session_id, client_id, prompt, response)
+        prefetch_support(session_id, client_id, response)
+
+        yield sse_event({
+            "client": client_id,
+            "message": response,
+            "show_info": show_info,
+            "show_emo": show_emo,
+            "clientQueue": clientQueue
+        }, "done")
+
+    stream = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if sender_agent is not None:
+        stream.call_on_close(lambda: agent_pool.release("sender", sender_agent))
+    return stream
+
 @app.route('/update-clientQueue/<session_id>/')
 def update_client_queue(session_id):
     if session_id not in session:
@@ -939,7 +1032,7 @@ def storeTroubleFeedback(session_id):
         rating = int(request.json.get("rate"))  # 0-100 scale (no need to reverse)
         support_type = request.json.get("type")
 
-        turn_number = len(session[session_id][client_id]["chat_history"])//2+1
+        turn_number = conversation_store.count(client_id)//2+1
         current_round = session[session_id].get('current_round', 1)
 
         # Save slider feedback to file
@@ -955,7 +1048,7 @@ def storeSentimentFeedback(session_id):
         rating = int(request.json.get("rate"))  # 0-100 scale (no need to reverse)
         support_type = request.json.get("type")
 
-        turn_number = len(session[session_id][client_id]["chat_history"])//2+1
+        turn_number = conversation_store.count(client_id)//2+1
         current_round = session[session_id].get('current_round', 1)
 
         # Save slider feedback to file
@@ -971,7 +1064,7 @@ def storeEmoFeedback(session_id):
         rating = int(request.json.get("rate"))  # 0-100 scale (no need to reverse)
         support_type = request.json.get("type")
 
-        turn_number = len(session[session_id][client_id]["chat_history"]) // 2 + 1
+        turn_number = conversation_store.count(client_id) // 2 + 1
         current_round = session[session_id].get('current_round', 1)
 
         # Save slider feedback to file
@@ -981,47 +1074,61 @@ def storeEmoFeedback(session_id):
     return jsonify({"message": "Invalid session or session expired"}), 400
 
 
+# Simplifies, summarizes and archives a round once its final chunk is in (see mouse_summary.py)
+mouse_ingest_executor = ThreadPoolExecutor(max_workers=2)
+
 @app.route('/store-mouse-tracking/<session_id>/', methods=['POST'])
 def storeMouseTracking(session_id):
-    """Store mouse tracking data (position, quadrants, agent hovers)"""
+    """Append a chunk of mouse tracking data (positions, quadrant visits, agent hovers) to the round's log"""
     if session_id in session:
         try:
-            data = request.get_json()
+            # sendBeacon posts a Blob, which may arrive without a JSON content type
+            data = request.get_json(force=True, silent=True)
 
             if not data:
                 print(f"[Mouse Tracking] No data received for session {session_id}")
                 return jsonify({"message": "No data received"}), 400
 
-            print(f"[Mouse Tracking] Received data for session {session_id}:")
-            print(f"  - Movements: {len(data.get('movements', []))}")
-            print(f"  - Quadrant Events: {len(data.get('quadrantEvents', []))}")
-            print(f"  - Agent Hovers: {len(data.get('agentHovers', []))}")
-            print(f"  - Total Duration: {data.get('totalDuration', 0)}ms")
-
-            # Add metadata
-            data['session_id'] = session_id
-            data['timestamp'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            data['round'] = session[session_id].get('current_round', 1)
-            data['condition'] = session[session_id].get('round2_condition', 'unknown')
-
-            # Store in session
-            round_key = f"mouse_tracking_round_{data['round']}"
-            session[session_id][round_key] = data
-
-            # Save to participant directory
+            round_num = session[session_id].get('current_round', 1)
             participant_dir = get_participant_dir(session_id)
-            if not os.path.exists(participant_dir):
-                os.makedirs(participant_dir)
 
-            tracking_file = os.path.join(participant_dir, f"mouse_tracking_round_{data['round']}.json")
-            try:
-                with open(tracking_file, 'w') as f:
-                    json.dump(data, f, indent=2)
-                print(f"[Mouse Tracking] Saved to {tracking_file}")
-            except Exception as e:
-                print(f"[Mouse Tracking] Error saving tracking file: {e}")
-
-            return jsonify({"message": "Tracking data received", "movements": len(data.get('movements', [])), "quadrantEvents": len(data.get('quadrantEvents', [])), "agentHovers": len(data.get('agentHovers', []))}), 200
+            if 'seq' not in data:
+                # Whole-round document from a client that predates chunked uploads
+                data.update({'session_id': session_id, 'round': round_num,
+                             'condition': session[session_id].get('round2_condition', 'unknown'),
+                             'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()})
+                os.makedirs(participant_dir, exist_ok=True)
+                with open(mouse_log.legacy_path(participant_dir, round_num), 'w') as f:
+                    json.dump(data, f)
+                return jsonify({"message": "Tracking data received", "movements": len(data.get('movements', []))}), 200
+
+            # A chunk belongs to the round its stream started in (sent by the tracker), even when it is resent
+            # after the next round began; older clients do not send it
+            if isinstance(data.get('round'), int) and data['round'] >= 1:
+                round_num = data['round']
+
+            chunk = {
+                'stream': str(data.get('stream')),
+                'seq': int(data['seq']),
+                'start': int(data['start']),
+                'final': bool(data.get('final', False)),
+                'total': int(data.get('total', 0)),
+                'm': data.get('m', []),
+                'q': data.get('q', []),
+                'h': data.get('h', []),
+                'session_id': session_id,
+                'round': round_num,
+                'condition': session[session_id].get('round2_condition', 'unknown'),
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+            appended = mouse_log.append_chunk(participant_dir, round_num, chunk)
+            # Ingest once the final chunk and every earlier one are in, whichever arrives last
+            if appended and mouse_log.stream_complete(participant_dir, round_num, chunk['stream']):
+                print(f"[Mouse Tracking] Round {round_num} complete for session {session_id} (stream {chunk['stream']})")
+                mouse_ingest_executor.submit(mouse_summary.ingest_round, participant_dir, round_num)
+
+            return jsonify({"message": "Tracking data received" if appended else "Duplicate chunk ignored",
+                            "seq": chunk['seq'], "duplicate": not appended, "movements": len(chunk['m']) // 3}), 200
 
         except Exception as e:
             print(f"[Mouse Tracking] Error storing mouse tracking: {e}")
@@ -1030,93 +1137,223 @@ def storeMouseTracking(session_id):
     return jsonify({"message": "Invalid session or session expired"}), 400
 
 
-@app.route('/get-emo-support/<session_id>/', methods=['POST'])
-def getEmoSupport(session_id):
-    if session_id in session:
-        client_id = request.json.get("client_id")
-        reply = request.json.get("client_reply")
-        support_type = request.json.get("type")
+# ===== Support panels =====
+# One function per sidebar panel. Each runs its agent for the current customer reply and returns
+# the JSON payload of its route plus the suggestions to log. getReply starts the enabled panels
+# right away (support_prefetcher); the single-panel routes and /support-bundle/ then serve the
+# prefetched result when there is one and compute the panel otherwise.
+
+SUPPORT_WORKERS = int(os.getenv("SUPPORT_WORKERS", "16"))
+PREFETCH_SUPPORT = os.getenv("PREFETCH_SUPPORT", "1") == "1"
+support_executor = ThreadPoolExecutor(max_workers=SUPPORT_WORKERS)
+support_prefetcher = SupportPrefetcher(ThreadPoolExecutor(max_workers=SUPPORT_WORKERS))
+# Round 2 conditions (e.g. "emo_only,both_agents") whose emotional agents make one structured call instead of their step pipelines
+FUSED_EMO_CONDITIONS = {c.strip() for c in os.getenv("FUSED_EMO_CONDITIONS", "").split(",") if c.strip()}
+
+def support_turn(session_id, client_id, reply):
+    """What every support agent needs for the current turn, read from the session and conversation store once"""
+    messages = conversation_store.messages(client_id)
+    return {
+        "session_id": session_id,
+        "client_id": client_id,
+        "reply": reply,
+        "chat_history": rolling_summary.window(client_id, messages),
+        "domain": session[session_id][client_id]["domain"],
+        "category": session[session_id][client_id]["category"],
+        "turn_number": len(messages) // 2 + 1,
+        "round": session[session_id].get('current_round', 1),
+        "condition": session[session_id].get('round2_condition') if session[session_id].get('current_round', 1) == 2 else None,
+    }
+
+def emo_agent_mode(turn):
+    """"fused" or "steps" (see mAgentER / mAgentEP.invoke_with_timings) for the turn's condition"""
+    return "fused" if turn.get("condition") in FUSED_EMO_CONDITIONS else "steps"
+
+def info_support(turn):
+    with agent_pool.checkout("info") as info_agent:
+        response_cw_info = info_agent.invoke({'domain': turn["domain"], 'message': turn["reply"], 'sender': 'client', "chat_history": turn["chat_history"], 'refresh_cache': turn.get("refresh_cache", False)})
+    return {"message": response_cw_info}, [("TYPE_INFO_CUE", response_cw_info)]
+
+def trouble_support(turn):
+    with agent_pool.checkout("trouble") as trouble_agent:
+        response_cw_trouble = trouble_agent.invoke({'domain': turn["domain"], 'message': turn["reply"], 'sender': 'client', "chat_history": turn["chat_history"], 'refresh_cache': turn.get("refresh_cache", False)})
+    return {"message": response_cw_trouble}, [("TYPE_INFO_GUIDE", response_cw_trouble)]
+
+def sentiment_support(turn):
+    # sentiment_category = analyze_sentiment_transformer(reply)
+    sentiment_category = sentiment_engine.analyze(turn["reply"])
+    return {"message": sentiment_category}, [("TYPE_SENTIMENT", sentiment_category)]
+
+def shoes_support(turn):
+    with agent_pool.checkout("ep") as ep_agent:
+        response, timings = ep_agent.invoke_with_timings({'complaint': turn["reply"], "chat_history": turn["chat_history"]}, emo_agent_mode(turn))
+    print(f"[TIMING] mAgentEP steps: {timings}")
+    # chat_in_task.insert_one({
+    #     "session_id": session_id,
+    #     "client_id": client_id,
+    #     "turn_number": turn_number,
+    #     "support_type": "Put Yourself in the Client's Shoes",
+    #     "support_content": response.strip(),
+    #     "timestamp_arrival": timestamp
+    # })
+    return {"message": response, "timings": timings}, [("TYPE_EMO_SHOES", response.strip())]
+
+def reframe_support(turn):
+    with agent_pool.checkout("emo") as emo_agent:
+        response_cw_emo, timings = emo_agent.invoke_with_timings({'complaint': turn["reply"], "chat_history": turn["chat_history"]}, emo_agent_mode(turn))
+    print(f"[TIMING] mAgentER steps: {timings}")
+    thought = response_cw_emo['thought']
+    reframe = response_cw_emo['reframe']
+    # Thought and Reframe
+    # chat_in_task.insert_one({
+    #     "session_id": session_id,
+    #     "client_id": client_id,
+    #     "turn_number": turn_number,
+    #     "support_type": "TYPE_EMO_THOUGHT" / "TYPE_EMO_REFRAME",
+    #     "support_content": thought.strip() / reframe.strip(),
+    #     "timestamp_arrival":timestamp
+    # })
+    return ({"message": {'thought': thought, 'reframe': reframe}, "timings": timings},
+            [("TYPE_EMO_THOUGHT", thought.strip()), ("TYPE_EMO_REFRAME", reframe.strip())])
+
+SUPPORT_PANELS = {
+    "TYPE_INFO_CUE": info_support,
+    "TYPE_INFO_GUIDE": trouble_support,
+    "TYPE_SENTIMENT": sentiment_support,
+    "TYPE_EMO_SHOES": shoes_support,
+    "TYPE_EMO_REFRAME": reframe_support,
+}
+
+def enabled_support_panels(session_id, turn_number):
+    """Panels script_chat.js shows for the current client: info/trouble with the info flag, sentiment (+ reframe after the first turn) with the emo flag"""
+    current_client = session[session_id].get('current_client', {})
+    panels = []
+    if str(current_client.get('info')) == '1':
+        panels += ["TYPE_INFO_CUE", "TYPE_INFO_GUIDE"]
+    if str(current_client.get('emo')) == '1':
+        panels.append("TYPE_SENTIMENT")
+        if turn_number > 1:
+            panels.append("TYPE_EMO_REFRAME")
+    return panels
+
+def turn_key(turn):
+    return (turn["session_id"], turn["client_id"], turn["turn_number"])
+
+def compute_support_panel(panel, turn):
+    start = time.perf_counter()
+    entry = opening_panel(panel, turn)
+    if entry is not None:
+        return dict(entry, elapsed=time.perf_counter() - start)
+    payload, suggestions = SUPPORT_PANELS[panel](turn)
+    return {"payload": payload, "suggestions": suggestions, "elapsed": time.perf_counter() - start}
+
+def serve_support_panel(panel, turn):
+    """
+    JSON payload of one panel for this turn: the prefetched result if getReply already started it,
+    otherwise computed now. Suggestions are logged here, when they are actually served.
+    """
+    result = support_prefetcher.claim(turn_key(turn), turn["reply"], panel) or compute_support_panel(panel, turn)
+    for support_type, content in result["suggestions"]:
+        save_ai_suggestion(turn["session_id"], turn["client_id"], turn["turn_number"], support_type, content, turn["round"])
+    return dict(result["payload"], prefetched=result.get("prefetched", False))
+
+# ===== Precomputed first-turn panels =====
+OPENING_PANEL_POOL_SIZE = int(os.getenv("OPENING_PANEL_POOL_SIZE", "3"))
+opening_panels = OpeningPanelPool("opening_panels.json", size=OPENING_PANEL_POOL_SIZE)
+
+def opening_panel(panel, turn):
+    """Precomputed result for a first-turn panel on the hardcoded opening complaint, or None"""
+    if turn["turn_number"] != 1 or turn["reply"] != common.openingComplaints.get(turn["category"]):
+        return None
+    return opening_panels.get(turn["category"], turn["domain"], panel)
+
+def _compute_opening_panel(category, domain, panel):
+    complaint = common.openingComplaints[category]
+    turn = {"session_id": None, "client_id": None, "reply": complaint, "chat_history": [AIMessage(content="Client: "+complaint)],
+            "domain": domain, "category": category, "turn_number": 1, "round": None, "refresh_cache": True}
+    payload, suggestions = SUPPORT_PANELS[panel](turn)
+    return {"payload": payload, "suggestions": suggestions}
+
+def _fill_opening_panels():
+    # Load (or generate, when prompts changed) the first-turn panels for every category and scenario
+    if OPENING_PANEL_POOL_SIZE <= 0:
+        return
+    try:
+        opening_panels.fill(prompt_hash(mAgentInfo(), mAgentTrouble()), _compute_opening_panel,
+                            list(common.openingComplaints), common.scenarios)
+    except Exception as e:
+        print(f"[WARNING] Opening panel pool unavailable, first turns will call the agents: {e}")
 
-        retrieve_from_session = json.loads(json.dumps(session[session_id][client_id]["chat_history"]))
-        chat_history = messages_from_dict(retrieve_from_session)
+def prefetch_support(session_id, client_id, reply):
+    """Start the support panels enabled for this client on the reply just generated, before the browser asks for them"""
+    if not PREFETCH_SUPPORT or FINISH_MARKER in reply:
+        return
+    turn = support_turn(session_id, client_id, reply)
+    panels = enabled_support_panels(session_id, turn["turn_number"])
+    support_prefetcher.submit(turn_key(turn), reply, {panel: metrics.bind(partial(compute_support_panel, panel, turn)) for panel in panels})
 
-        turn_number = len(chat_history) // 2 + 1
-        timestamp = datetime.datetime.now(datetime.timezone.utc)
 
-        if support_type=="TYPE_EMO_REFRAME":
-            response_cw_emo = emo_agent.invoke({'complaint':reply, "chat_history": chat_history})
-            thought = response_cw_emo['thought']
-            reframe = response_cw_emo['reframe']
-            # Thought
-            # chat_in_task.insert_one({
-            #     "session_id": session_id,
-            #     "client_id": client_id,
-            #     "turn_number": turn_number,
-            #     "support_type": "TYPE_EMO_THOUGHT",
-            #     "support_content": thought.strip(),
-            #     "timestamp_arrival":timestamp
-            # })
-            # Reframe
-            # chat_in_task.insert_one({
-            #     "session_id": session_id,
-            #     "client_id": client_id,
-            #     "turn_number": turn_number,
-            #     "support_type": "TYPE_EMO_REFRAME",
-            #     "support_content": reframe.strip(),
-            #     "timestamp_arrival": timestamp
-            # })
-
-            # Save AI suggestions to file
-            current_round = session[session_id].get('current_round', 1)
-            save_ai_suggestion(session_id, client_id, turn_number, "TYPE_EMO_THOUGHT", thought.strip(), current_round)
-            save_ai_suggestion(session_id, client_id, turn_number, "TYPE_EMO_REFRAME", reframe.strip(), current_round)
+@app.route('/support-bundle/<session_id>/', methods=['POST'])
+def getSupportBundle(session_id):
+    """
+    All support panels enabled for the current client, run concurrently for one customer reply.
+    Streams a "panel" event ({"type", "message", "elapsed", ...}) as each one finishes, an "error"
+    event for a panel that failed, then a "done" event with every panel's time in seconds.
+    An optional "types" list in the body restricts which of the enabled panels are run.
+    """
+    if session_id not in session:
+        return jsonify({"message": "Invalid session or session expired"}), 400
+    turn = support_turn(session_id, request.json.get("client_id"), request.json.get("client_reply"))
+    panels = enabled_support_panels(session_id, turn["turn_number"])
+    requested = request.json.get("types")
+    if requested:
+        panels = [panel for panel in panels if panel in requested]
+
+    def run_panel(panel):
+        start = time.perf_counter()
+        payload = serve_support_panel(panel, turn)
+        return dict(payload, type=panel, elapsed=time.perf_counter() - start)
+
+    start = time.perf_counter()
+    # Each worker gets its own copy of the request context (the suggestion log needs the session) and of the metric labels
+    futures = {support_executor.submit(metrics.bind(copy_current_request_context(run_panel)), panel): panel for panel in panels}
+
+    def generate():
+        timings = {}
+        for future in as_completed(futures):
+            panel = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[ERROR] {panel} support failed: {e}")
+                yield sse_event({"type": panel, "message": str(e)}, "error")
+                continue
+            timings[panel] = result["elapsed"]
+            yield sse_event(result, "panel")
+        timings["total"] = time.perf_counter() - start
+        print(f"[TIMING] support bundle turn {turn['turn_number']}: {timings}")
+        yield sse_event({"timings": timings}, "done")
 
-            return jsonify({
-                "message": {
-                    'thought':thought,
-                    'reframe': reframe
-                }
-            })
-        elif support_type=="TYPE_EMO_SHOES":
-            response_cw_emo = ep_agent.invoke({'complaint':reply, "chat_history": chat_history})
-            response = response_cw_emo
-            # chat_in_task.insert_one({
-            #     "session_id": session_id,
-            #     "client_id": client_id,
-            #     "turn_number": turn_number,
-            #     "support_type": "Put Yourself in the Client's Shoes",
-            #     "support_content": response.strip(),
-            #     "timestamp_arrival": timestamp
-            # })
-
-            # Save AI suggestion to file
-            current_round = session[session_id].get('current_round', 1)
-            save_ai_suggestion(session_id, client_id, turn_number, "TYPE_EMO_SHOES", response.strip(), current_round)
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-            return jsonify({
-                "message": response
-            })
-        else:
+
+@app.route('/get-emo-support/<session_id>/', methods=['POST'])
+def getEmoSupport(session_id):
+    if session_id in session:
+        support_type = request.json.get("type")
+        if support_type not in ("TYPE_EMO_REFRAME", "TYPE_EMO_SHOES"):
             return jsonify({"error": "Invalid support_type"}), 400
+        turn = support_turn(session_id, request.json.get("client_id"), request.json.get("client_reply"))
+        return jsonify(serve_support_panel(support_type, turn))
 
     return jsonify({"error": "Invalid session_id"}), 400
 
 @app.route('/sentiment/<session_id>/', methods=['POST'])
 def sentiment(session_id):
     if session_id in session:
-        client_id = request.json.get("client_id")
-        reply = request.json.get("client_reply")
-        turn_number = len(session[session_id][client_id]["chat_history"]) // 2 + 1
-
-        # Perform sentiment analysis
-        # sentiment_category = analyze_sentiment_transformer(reply)
-        sentiment_category = analyze_sentiment_decision(reply)
-
-        # Save AI suggestion to file
-        current_round = session[session_id].get('current_round', 1)
-        save_ai_suggestion(session_id, client_id, turn_number, "TYPE_SENTIMENT", sentiment_category, current_round)
-
-        return jsonify({'message': sentiment_category})
+        turn = support_turn(session_id, request.json.get("client_id"), request.json.get("client_reply"))
+        return jsonify(serve_support_panel("TYPE_SENTIMENT", turn))
     else:
         return jsonify({"error": "Invalid session_id"}), 400
 
@@ -1125,47 +1362,16 @@ def sentiment(session_id):
 @app.route('/get-info-support/<session_id>/', methods=['POST'])
 def getInfoSupport(session_id):
     if session_id in session:
-        client_id = request.json.get("client_id")
-        reply = request.json.get("client_reply")
-
-        retrieve_from_session = json.loads(json.dumps(session[session_id][client_id]["chat_history"]))
-        chat_history = messages_from_dict(retrieve_from_session)
-
-        response_cw_info = info_agent.invoke({'domain': session[session_id][client_id]["domain"],'message':reply, 'sender':'client', "chat_history": chat_history})
-
-        turn_number = len(chat_history) // 2 + 1
-        current_round = session[session_id].get('current_round', 1)
-
-        # Save AI suggestion to file
-        save_ai_suggestion(session_id, client_id, turn_number, "TYPE_INFO_CUE", response_cw_info, current_round)
-
-        return jsonify({
-            "message": response_cw_info
-        })
+        turn = support_turn(session_id, request.json.get("client_id"), request.json.get("client_reply"))
+        return jsonify(serve_support_panel("TYPE_INFO_CUE", turn))
     return jsonify({"message": "Invalid session or session expired"}), 400
 
 
 @app.route('/get-trouble-support/<session_id>/', methods=['POST'])
 def getTroubleSupport(session_id):
     if session_id in session:
-        client_id = request.json.get("client_id")
-        reply = request.json.get("client_reply")
-
-        retrieve_from_session = json.loads(json.dumps(session[session_id][client_id]["chat_history"]))
-        chat_history = messages_from_dict(retrieve_from_session)
-
-        response_cw_trouble = trouble_agent.invoke({'domain': session[session_id][client_id]["domain"],'message':reply, 'sender':'client', "chat_history": chat_history})
-        response = response_cw_trouble
-
-        turn_number = len(chat_history) // 2 + 1
-        current_round = session[session_id].get('current_round', 1)
-
-        # Save AI suggestion to file
-        save_ai_suggestion(session_id, client_id, turn_number, "TYPE_INFO_GUIDE", response, current_round)
-
-        return jsonify({
-            "message": response
-        })
+        turn = support_turn(session_id, request.json.get("client_id"), request.json.get("client_reply"))
+        return jsonify(serve_support_panel("TYPE_INFO_GUIDE", turn))
     return jsonify({"message": "Invalid session or session expired"}), 400
 
 @app.route('/conversation_history/')
@@ -1184,8 +1390,6 @@ def complete():
     return render_template('complete.html', session_id=session_id, prolific_id=prolific_id)
 
 
-COMPLETIONS_CSV = "completions.csv"
-
 def _check_completion_gate(participant_dir):
     """
     Verify all required files exist and are valid.
@@ -1194,30 +1398,29 @@ def _check_completion_gate(participant_dir):
     required_files = [
         'pre_task_survey.json',
         'post_round1_survey.json',
-        'chat_history.json',
-        'mouse_tracking_round_1.json',
-        'mouse_tracking_round_2.json',
         'post_task_survey.json',
         'demographics_survey.json',
     ]
     for fname in required_files:
         if not os.path.exists(os.path.join(participant_dir, fname)):
             return False, f"missing {fname}"
+    for round_num in (1, 2):
+        if not mouse_log.has_round(participant_dir, round_num):
+            return False, f"missing mouse_tracking_round_{round_num}"
 
     # Attention check must NOT have failed
     if os.path.exists(os.path.join(participant_dir, 'attention_check_failed.json')):
         return False, "attention_check_failed.json present"
 
-    # chat_history must contain messages from both round 1 and round 2
+    # chat_history must contain messages from both round 1 and round 2 (read from the round index, not the full log)
     try:
-        with open(os.path.join(participant_dir, 'chat_history.json')) as f:
-            chat_data = json.load(f)
-        messages = chat_data if isinstance(chat_data, list) else chat_data.get('messages', [])
-        rounds_present = {msg.get('round') for msg in messages if isinstance(msg, dict)}
+        rounds_present = event_store.read_rounds(participant_dir, 'chat_history')
+        if not rounds_present:
+            return False, "missing chat_history"
         if 1 not in rounds_present or 2 not in rounds_present:
             return False, f"chat_history missing round data (found rounds: {rounds_present})"
     except Exception as e:
-        return False, f"chat_history.json unreadable: {e}"
+        return False, f"chat_history unreadable: {e}"
 
     return True, "ok"
 
@@ -1256,7 +1459,10 @@ def storeProlificExit(session_id):
         print(f"[GATE FAIL] session={session_id}, reason={reason}")
         return jsonify({"error": "incomplete", "reason": reason}), 400
 
-    # Gate passed — save prolific IDs
+    # Gate passed — compact the JSONL logs into the JSON files the analysis notebooks read
+    event_store.export_json(participant_dir)
+
+    # Save prolific IDs
     save_session_data(session_id, 'prolific_ids', {
         'prolific_id_entry': prolific_id_entry,
         'prolific_id_exit': prolific_id_exit
@@ -1266,10 +1472,8 @@ def storeProlificExit(session_id):
     condition = session.get(session_id, {}).get('round2_condition', 'unknown') if session_id in session else 'unknown'
     emotion_regulation_type = session.get(session_id, {}).get('emotion_regulation_type', 'unknown') if session_id in session else 'unknown'
     if condition != 'unknown' and emotion_regulation_type != 'unknown':
-        counts = load_participant_counts()
-        if condition in counts and emotion_regulation_type in counts[condition]:
-            counts[condition][emotion_regulation_type] += 1
-            save_participant_counts(counts)
+        if slot_allocator.complete(session_id, condition, emotion_regulation_type):
+            save_participant_counts(load_participant_counts())
             print(f"[COMPLETION] Incremented count: {condition}/{emotion_regulation_type}")
 
     # Log to CSV
@@ -67,6 +67,18 @@ complaintTypes = [
     "Resolution"
 ]
 
+scenarios = ["Airline", "Hotel"]
+
+# Hardcoded first complaint messages per category (avoids slow LLM call)
+openingComplaints = {
+    "Service Quality": "I just got off the worst flight of my life. The crew was completely dismissive, nobody helped with my overhead bag, and the gate agent was rude when I asked a simple question. This is absolutely unacceptable!",
+    "Product Issues": "Your online check-in keeps throwing errors every time I try to get my boarding pass! My flight leaves in a few hours and I can't even check in. What kind of system are you running here?!",
+    "Pricing and Charges": "I just noticed a $150 charge on my credit card that was never mentioned when I booked my ticket! Hidden fees are completely unacceptable. I want an explanation and a refund immediately!",
+    "Policy": "So you're telling me I can't change my flight without paying a $200 fee even though YOUR airline changed the departure time?! That's the most unfair policy I've ever heard. This is ridiculous!",
+    "Resolution": "I filed a complaint two weeks ago about my lost luggage and all I got was a generic email saying you're 'looking into it.' Nobody has actually done anything! I'm still waiting for my bag and a real answer!"
+}
+OPENING_COMPLAINT_FALLBACK = "I'm having a serious issue with your airline and I need this resolved immediately!"
+
 def get_study_queue(scenario, round2_condition="both_agents"):
     """
     Create a 2-round study queue for the given scenario.
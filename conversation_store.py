@@ -0,0 +1,91 @@
+'''
+Per-conversation chat history store.
+Messages live in SQLite (one row per message, so appending a turn is a single INSERT) with an in-process
+LRU cache of the deserialized langchain message objects, so routes no longer round-trip the whole
+history through the Flask session on every request. The session only keeps the client_id.
+Each conversation can also keep a running summary of its first `covered` messages (see conversation_summary.py).
+'''
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langchain.schema import messages_from_dict, messages_to_dict
+
+
+class ConversationStore:
+    def __init__(self, path="conversations.db", cache_size=512):
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, seq))""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS summaries (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                covered INTEGER NOT NULL)""")
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads; keep one per Flask worker thread
+        if not hasattr(self.local, "conn"):
+            self.local.conn = sqlite3.connect(self.path, timeout=30)
+        return self.local.conn
+
+    def _cache_put(self, conversation_id, messages):
+        self.cache[conversation_id] = messages
+        self.cache.move_to_end(conversation_id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _load(self, conversation_id):
+        with self.lock:
+            if conversation_id in self.cache:
+                self.cache.move_to_end(conversation_id)
+                return self.cache[conversation_id]
+
+        rows = self._connection().execute(
+            "SELECT message FROM messages WHERE conversation_id = ? ORDER BY seq", (conversation_id,)).fetchall()
+        messages = messages_from_dict([json.loads(row[0]) for row in rows])
+        with self.lock:
+            if conversation_id not in self.cache:
+                self._cache_put(conversation_id, messages)
+            return self.cache[conversation_id]
+
+    def append(self, conversation_id, *messages):
+        """Add messages to the end of a conversation."""
+        history = self._load(conversation_id)
+        with self.lock:
+            start = len(history)
+            history.extend(messages)
+        rows = [(conversation_id, start + i, json.dumps(data)) for i, data in enumerate(messages_to_dict(list(messages)))]
+        with self._connection() as conn:
+            conn.executemany("INSERT INTO messages (conversation_id, seq, message) VALUES (?, ?, ?)", rows)
+
+    def messages(self, conversation_id):
+        """Return the conversation as a new list of message objects (safe for the caller to extend)."""
+        history = self._load(conversation_id)
+        with self.lock:
+            return list(history)
+
+    def count(self, conversation_id):
+        history = self._load(conversation_id)
+        with self.lock:
+            return len(history)
+
+    def summary(self, conversation_id):
+        """Return (summary text, number of leading messages it covers); ("", 0) when there is none yet."""
+        row = self._connection().execute(
+            "SELECT summary, covered FROM summaries WHERE conversation_id = ?", (conversation_id,)).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def set_summary(self, conversation_id, summary, covered):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO summaries (conversation_id, summary, covered) VALUES (?, ?, ?)",
+                         (conversation_id, summary, covered))
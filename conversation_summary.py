@@ -0,0 +1,88 @@
+'''
+Rolling conversation summary and the history window sent to the agents.
+Agents no longer receive the full chat history: they get a system message with the running summary
+of the older messages, followed by the last `window_messages` messages, trimmed to `token_budget`.
+
+When a turn pushes messages out of the window, refresh() folds only those messages into the stored
+summary on a background thread. window() never waits for it: messages the summary does not cover
+yet are sent verbatim, so nothing is lost while an update is in flight.
+'''
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+
+def estimate_tokens(message):
+    # ~4 characters per token for English text; close enough for budgeting
+    return len(str(message.content)) // 4 + 4
+
+
+class RollingSummary:
+    def __init__(self, store, summarize, window_messages=HISTORY_WINDOW_MESSAGES, token_budget=HISTORY_TOKEN_BUDGET, max_workers=4):
+        """
+        store: ConversationStore holding the messages and the summaries
+        summarize: callable (summary so far, messages to add) -> new summary
+        """
+        self.store = store
+        self.summarize = summarize
+        self.window_messages = window_messages
+        self.token_budget = token_budget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def refresh(self, conversation_id):
+        """Fold messages that have left the window into the summary, in the background."""
+        with self.lock:
+            if conversation_id in self.in_flight:
+                return
+            self.in_flight.add(conversation_id)
+        self.executor.submit(self._fold, conversation_id)
+
+    def _fold(self, conversation_id):
+        try:
+            # Loop in case more turns arrived while the previous fold was running
+            while True:
+                messages = self.store.messages(conversation_id)
+                summary, covered = self.store.summary(conversation_id)
+                target = len(messages) - self.window_messages
+                if target <= covered:
+                    return
+                summary = self.summarize(summary, messages[covered:target])
+                self.store.set_summary(conversation_id, summary, target)
+                print(f"[INFO] Summarized messages {covered}-{target} of {conversation_id}")
+        except Exception as e:
+            print(f"[WARNING] Summary update failed for {conversation_id}, sending more raw history: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(conversation_id)
+
+    def window(self, conversation_id, messages=None):
+        """The summary (if any) as a system message, then the messages it does not cover, within the token budget."""
+        messages = self.store.messages(conversation_id) if messages is None else messages
+        summary, covered = self.store.summary(conversation_id)
+        recent = messages[covered:]
+
+        # Keep the newest messages that fit; the latest two (one exchange) are always kept
+        budget = self.token_budget
+        if summary:
+            rep_count = sum(1 for m in messages if isinstance(m, HumanMessage))
+            header = SystemMessage(content=f"Summary of the earlier conversation ({covered} messages; {rep_count} representative messages so far): {summary}")
+            budget -= estimate_tokens(header)
+        kept = []
+        for message in reversed(recent):
+            cost = estimate_tokens(message)
+            if len(kept) >= 2 and cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        kept.reverse()
+        if len(kept) < len(recent):
+            print(f"[INFO] History window for {conversation_id} dropped {len(recent) - len(kept)} messages over the token budget")
+
+        return ([header] if summary else []) + kept
@@ -0,0 +1,147 @@
+'''
+Append-only JSONL storage for per-participant study records (chat messages, AI suggestions, slider feedback).
+Every record is one line appended to <participant_dir>/<stream>.jsonl, so saving a record costs O(1)
+instead of re-reading and re-writing the whole participant file.
+
+Writes to the same file are serialized with a per-file thread lock plus fcntl.flock for other worker processes.
+A tiny <stream>.index.json keeps the set of rounds seen, so completion checks do not parse the full log.
+
+export_json() compacts the logs into the chat_history.json / ai_suggestions.json / ai_feedback.json layout
+used by the analysis notebooks. Run `python event_store.py [DATA_DIR]` to export every participant folder.
+'''
+import os
+import sys
+import json
+import fcntl
+import threading
+
+STREAMS = ['chat_history', 'ai_suggestions', 'ai_feedback']
+
+# fsync after every append; safer on power loss, slower on every write
+FSYNC = os.getenv("EVENT_STORE_FSYNC", "0") == "1"
+
+_locks = {}
+_locks_guard = threading.Lock()
+_rounds_cache = {}
+
+
+def _lock_for(path):
+    with _locks_guard:
+        if path not in _locks:
+            _locks[path] = threading.Lock()
+        return _locks[path]
+
+def log_path(participant_dir, stream):
+    return os.path.join(participant_dir, f"{stream}.jsonl")
+
+def index_path(participant_dir, stream):
+    return os.path.join(participant_dir, f"{stream}.index.json")
+
+def _write_atomic(path, data, indent=None):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def append(participant_dir, stream, record, fsync=None):
+    """Append one record to the participant's stream log."""
+    if fsync is None:
+        fsync = FSYNC
+    os.makedirs(participant_dir, exist_ok=True)
+
+    path = log_path(participant_dir, stream)
+    line = json.dumps(record, default=str) + "\n"
+    with _lock_for(path):
+        with open(path, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            f.write(line)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        _add_round(participant_dir, stream, record.get('round'))
+
+
+def read(participant_dir, stream):
+    """Return all records of a stream, skipping a partially written last line."""
+    path = log_path(participant_dir, stream)
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path, 'r') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            records.append(json.loads(line))
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return records
+
+
+def _load_rounds(participant_dir, stream):
+    path = index_path(participant_dir, stream)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)['rounds']
+
+    rounds = []
+    for record in read(participant_dir, stream):
+        if record.get('round') not in rounds:
+            rounds.append(record.get('round'))
+    return rounds
+
+def _add_round(participant_dir, stream, round_num):
+    path = index_path(participant_dir, stream)
+    if round_num in _rounds_cache.get(path, ()):
+        return
+
+    # Another worker process may have added a round since we cached it, so merge with what is on disk
+    with _lock_for(path):
+        with open(path + ".lock", 'w') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            rounds = _load_rounds(participant_dir, stream)
+            if round_num not in rounds:
+                rounds.append(round_num)
+                _write_atomic(path, {'rounds': rounds})
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        _rounds_cache[path] = rounds
+
+
+def read_rounds(participant_dir, stream):
+    """
+    Return the set of rounds present in a stream, read from the index.
+    Falls back to an exported <stream>.json for participants recorded before the JSONL logs existed.
+    """
+    if os.path.exists(log_path(participant_dir, stream)) or os.path.exists(index_path(participant_dir, stream)):
+        return set(_load_rounds(participant_dir, stream))
+
+    legacy_path = os.path.join(participant_dir, f"{stream}.json")
+    if not os.path.exists(legacy_path):
+        return set()
+    with open(legacy_path) as f:
+        data = json.load(f)
+    messages = data if isinstance(data, list) else data.get('messages', [])
+    return {msg.get('round') for msg in messages if isinstance(msg, dict)}
+
+
+def export_json(participant_dir, streams=STREAMS):
+    """Write <stream>.json (a pretty-printed list of records) for every stream that has a log. Returns the written paths."""
+    written = []
+    for stream in streams:
+        if not os.path.exists(log_path(participant_dir, stream)):
+            continue
+        json_path = os.path.join(participant_dir, f"{stream}.json")
+        _write_atomic(json_path, read(participant_dir, stream), indent=2)
+        written.append(json_path)
+    return written
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "study_data_round_1"
+    for name in sorted(os.listdir(data_dir)):
+        participant_dir = os.path.join(data_dir, name)
+        if os.path.isdir(participant_dir):
+            for path in export_json(participant_dir):
+                print(f"Exported {path}")
@@ -0,0 +1,165 @@
+'''
+Deterministic local stand-ins for the OpenAI models and the sentiment models.
+They return canned text chosen from a hash of the prompt (same prompt, same answer) after sleeping
+for a latency drawn from a configurable distribution, so agent pipelines can be exercised and
+benchmarked offline without an API key.
+
+install_fake_models() swaps them into the model registry in place of llmchat / llminfo / llmemo /
+llmcompletion (mLangChain.client_completion), the model_routing tiers, the embeddings and the sentiment models.
+'''
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from typing import Any, List
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import model_routing
+from model_registry import registry
+
+
+class LatencyProfile:
+    """
+    Latency distribution in seconds, written as "<kind>:<params>":
+    - "constant:0.5"
+    - "uniform:0.2:1.0"            (low, high)
+    - "lognormal:0.8:0.5"          (median, sigma) — long right tail, like real LLM calls
+    """
+    def __init__(self, spec="lognormal:0.8:0.5", seed=None):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.kind == "constant":
+                return self.params[0]
+            if self.kind == "uniform":
+                return self.rng.uniform(self.params[0], self.params[1])
+            median, sigma = self.params
+            return self.rng.lognormvariate(0, sigma) * median
+
+
+DEFAULT_RESPONSES = [
+    "Ask for the booking reference\nOffer to check the flight status\nExplain the rebooking options",
+    "You might be thinking that the customer is blaming you personally for something you did not cause.",
+    "This is ridiculous. I've been waiting for hours and nobody has told me anything useful!",
+    "The customer is frustrated because their flight was changed without notice.",
+    "Confirm the charge on the account\nReview the fare rules\nOffer a refund or travel credit",
+]
+
+def _pick(prompt, responses, seed):
+    digest = hashlib.sha256(f"{seed}:{prompt}".encode()).digest()
+    return responses[int.from_bytes(digest[:4], "big") % len(responses)]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model stand-in with scripted latency; streams its answer word by word."""
+    latency: Any = None
+    responses: List[str] = DEFAULT_RESPONSES
+    seed: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _reply(self, messages, response_format=None):
+        time.sleep(self.latency.sample() if self.latency else 0)
+        prompt = "\n".join(str(m.content) for m in messages)
+        if response_format and response_format.get("type") == "json_schema":
+            # Structured output: one canned answer per schema property
+            properties = response_format["json_schema"]["schema"]["properties"]
+            return json.dumps({name: _pick(prompt + name, self.responses, self.seed) for name in properties})
+        return _pick(prompt, self.responses, self.seed)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self._reply(messages, kwargs.get("response_format"))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self._reply(messages, kwargs.get("response_format")).split(" ")
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+class FakeCompletionModel(LLM):
+    """Completion model stand-in (for mLangChain.client_completion) with scripted latency."""
+    latency: Any = None
+    responses: List[str] = DEFAULT_RESPONSES
+    seed: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-completion"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency.sample() if self.latency else 0)
+        return _pick(prompt, self.responses, self.seed)
+
+
+class HashingEmbeddings:
+    """
+    Local stand-in for OpenAIEmbeddings: bag of hashed words and word pairs, so texts sharing most of
+    their wording get a high cosine similarity. No latency, no API key.
+    """
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def embed_query(self, text):
+        words = re.findall(r"[a-z0-9']+", text.lower())
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            digest = hashlib.md5(token.encode()).digest()
+            vector[int.from_bytes(digest[:4], "big") % self.dim] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeSentimentPipeline:
+    """Stand-in for transformers.pipeline("sentiment-analysis"); one sleep per call, however many texts."""
+    def __init__(self, latency=None):
+        self.latency = latency
+
+    def __call__(self, texts, **kwargs):
+        time.sleep(self.latency.sample() if self.latency else 0)
+        batch = texts if isinstance(texts, list) else [texts]
+        return [{"label": "NEGATIVE" if "!" in text or "not" in text.lower() else "POSITIVE", "score": 0.9} for text in batch]
+
+
+class FakeVader:
+    """Stand-in for nltk's SentimentIntensityAnalyzer when vader_lexicon is not provisioned."""
+    def polarity_scores(self, text):
+        return {"compound": -0.5 if "!" in text else 0.1}
+
+
+def install_fake_models(latency="lognormal:0.8:0.5", sentiment_latency="constant:0.05", seed=0, fake_sentiment=True,
+                        tier_latency=None):
+    """
+    Replace every LLM client and the embeddings (and optionally the sentiment models) in the registry with a stand-in.
+    tier_latency: {tier: latency spec} for the model_routing tiers (default: `latency` for all of them)
+    """
+    for name in ("llmchat", "llminfo", "llmemo"):
+        registry.override(name, FakeChatModel(latency=LatencyProfile(latency, seed=seed), seed=seed))
+    registry.override("llmcompletion", FakeCompletionModel(latency=LatencyProfile(latency, seed=seed), seed=seed))
+    for tier, settings in model_routing.routing["tiers"].items():
+        profile = LatencyProfile((tier_latency or {}).get(tier, latency), seed=seed)
+        model_class = FakeChatModel if settings["kind"] == "chat" else FakeCompletionModel
+        registry.override(model_routing.component(tier), model_class(latency=profile, seed=seed))
+    registry.override("embeddings", HashingEmbeddings())
+    if fake_sentiment:
+        registry.override("sentiment_pipeline", FakeSentimentPipeline(LatencyProfile(sentiment_latency, seed=seed)))
+        registry.override("vader", FakeVader())
@@ -0,0 +1,127 @@
+'''
+Compare the fused single-call mode of mAgentER and mAgentEP with their step pipelines.
+For the opening turn of each scenario in phase1_scenarios.tsv, both agents run in both modes
+("steps" and "fused", see agents.py). The report covers:
+- p50, p95 and mean seconds per agent and mode;
+- the mean length in words of each output field and the difference between the modes (fused - steps);
+- how many fused runs fell back to the step pipeline because their output did not parse.
+
+By default the agents call the configured models. With --offline every routing tier is replaced by a
+stand-in with the tier's "benchmark_latency" (see model_routing.py). Stand-ins take the same time for
+every call whatever its length, so offline numbers only show what the saved calls are worth.
+
+    python fused_comparison.py --scenarios 20 --output fused_comparison.tsv
+    python fused_comparison.py --offline --json fused_report.json
+'''
+import os
+import sys
+import json
+import time
+import argparse
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+AGENTS = ["mAgentER", "mAgentEP"]
+MODES = ["steps", "fused"]
+FIELDS = {"mAgentER": ["situation", "thought", "reframe"], "mAgentEP": ["paraphrase"]}
+
+
+def load_turns(path, limit):
+    scenarios = pd.read_csv(path, sep='\t', keep_default_na=False).head(limit)
+    return [{"id": row["ID"], "domain": row["Domain"], "complaint": row["Initial Complaint"].strip()}
+            for row in scenarios.to_dict("records")]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def words(text):
+    return len(text.split())
+
+
+def run(turns):
+    """One row per (scenario, agent, mode): seconds, fallback flag and the output fields"""
+    import agents
+    from langchain_core.messages import AIMessage
+
+    instances = {name: getattr(agents, name)() for name in AGENTS}
+    rows = []
+    for turn in turns:
+        user_input = {'complaint': turn["complaint"], 'chat_history': [AIMessage(content="Client: " + turn["complaint"])]}
+        for name in AGENTS:
+            for mode in MODES:
+                start = time.perf_counter()
+                output, timings = instances[name].invoke_with_timings(user_input, mode)
+                elapsed = time.perf_counter() - start
+                fields = output if isinstance(output, dict) else {"paraphrase": output}
+                rows.append({"id": turn["id"], "domain": turn["domain"], "agent": name, "mode": mode, "seconds": elapsed,
+                             "fallback": "fused_attempt" in timings, **fields})
+                print(f"[TIMING] {turn['id']} {name} {mode}: {elapsed:.2f}s")
+    return pd.DataFrame(rows)
+
+
+def summarize(df):
+    """{agent: {mode: {latency and mean words per field}, "word_diff": {field: fused - steps}}}"""
+    report = {}
+    for name in AGENTS:
+        report[name] = {}
+        for mode in MODES:
+            rows = df[(df["agent"] == name) & (df["mode"] == mode)]
+            seconds = list(rows["seconds"])
+            report[name][mode] = {
+                "p50": percentile(seconds, 50), "p95": percentile(seconds, 95), "mean": sum(seconds) / len(seconds),
+                "words": {field: float(rows[field].map(words).mean()) for field in FIELDS[name]},
+                "fallbacks": int(rows["fallback"].sum()),
+            }
+        report[name]["word_diff"] = {field: report[name]["fused"]["words"][field] - report[name]["steps"]["words"][field]
+                                     for field in FIELDS[name]}
+    return report
+
+
+def print_report(report, scenarios):
+    print(f"\n{scenarios} scenarios; seconds per agent (p50 / p95 / mean)")
+    for name in AGENTS:
+        for mode in MODES:
+            result = report[name][mode]
+            lengths = ", ".join(f"{field} {count:.1f}" for field, count in result["words"].items())
+            print(f"{name:<10}{mode:<7}{result['p50']:>8.2f}{result['p95']:>8.2f}{result['mean']:>8.2f}   words: {lengths}"
+                  + (f"   fallbacks: {result['fallbacks']}" if mode == "fused" else ""))
+        diff = ", ".join(f"{field} {delta:+.1f}" for field, delta in report[name]["word_diff"].items())
+        print(f"{'':<17}fused - steps: {report[name]['fused']['mean'] - report[name]['steps']['mean']:+.2f}s mean, words {diff}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fused and step modes of mAgentER / mAgentEP")
+    parser.add_argument('--scenarios', type=int, default=20, help="opening turns taken from --input")
+    parser.add_argument('--input', default=os.path.join(ROOT, 'phase1_scenarios.tsv'))
+    parser.add_argument('--offline', action='store_true', help="use stand-in models instead of the configured ones")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write every run's outputs to this TSV file")
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    if args.offline:
+        os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+        import model_routing
+        from fake_models import install_fake_models
+        latencies = {tier: settings.get("benchmark_latency", "lognormal:1.0:0.5")
+                     for tier, settings in model_routing.routing["tiers"].items()}
+        install_fake_models(latency="constant:0", seed=args.seed, tier_latency=latencies)
+
+    turns = load_turns(args.input, args.scenarios)
+    df = run(turns)
+    report = summarize(df)
+    print_report(report, len(turns))
+    if args.output:
+        df.to_csv(args.output, sep='\t', index=False)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 from dotenv import load_dotenv
 import pandas as pd
 import os
+import json
+import time
+import argparse
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import openai as oai
 import langchain_openai as lcai
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -10,6 +17,7 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
 import agents as mAgents
+from rate_limiter import RateLimiter
 sender_initial = mAgents.agent_sender_fewshot_twitter_categorized()
 sender_agent = mAgents.mAgentCustomer()
 
@@ -32,12 +40,8 @@ def agent_representative():
         ]
     )
 
-    chain = (RunnablePassthrough.assign(
-        context=mAgents.get_historical_context_chain()
-    )
-             | template
-             | mAgents.llminfo
-             )
+    chain = mAgents.build_chain("agent_representative", template, mAgents.llminfo,
+                                context=mAgents.get_historical_context_chain)
 
     chain = chain | StrOutputParser()
 
@@ -45,6 +49,9 @@ def agent_representative():
 
 
 
+COLUMNS = ["ID", "Category", "Domain", "Initial Complaint", "Support Agent Response 1", "Follow-up Complaint 1",
+           "Support Agent Response 2", "Follow-up Complaint 2"]
+
 follow_up_prompt = """
 The customer has received a response from the support agent. Generate a follow-up complaint or question from the customer: {support_agent_response}. Ensure the follow-up complaint is concise and limited to 2 sentences, containing all relevant information.
 """
@@ -67,65 +74,127 @@ def generate_initial_complaint(val_domain, val_category):
     return initial_complaint
 
 
-# Function to generate scenarios
-def generate_scenarios(domains, categories, examples_per_pair):
-    scenarios = []
-
-    iteration = 1
-    for domain in domains:
-        for category in categories:
-            for _ in range(examples_per_pair):
-                print(f"Generating scenario {iteration}")
-                iteration += 1          
-                
-                # Generate initial complaint
-                initial_complaint = generate_initial_complaint(domain, category)
-                chat_history = [AIMessage(content="Client: "+initial_complaint)]
-
-
-                # Generate support agent response
-                support_agent_response1 = agent_representative().invoke({"chat_history": chat_history, "message": initial_complaint, "sender":"client"})
-                chat_history.extend([HumanMessage(content="Representative: "+support_agent_response1)])
-
-
-                # Generate follow-up complaint
-                follow_up_complaint1 = sender_agent.invoke({"input": support_agent_response1, "chat_history": chat_history, "civil": 0})
-                chat_history.extend([AIMessage(content="Client: "+follow_up_complaint1)])
-
-
-                # Generate support agent response
-                support_agent_response2 = agent_representative().invoke({"chat_history": chat_history, "message": follow_up_complaint1, "sender":"client"})
-                chat_history.extend([HumanMessage(content="Representative: "+support_agent_response2)])
-
+# Function to generate one scenario (initial complaint and two exchanges)
+def generate_scenario(scenario_id, domain, category, representative_chain, limiter):
+    # Generate initial complaint
+    limiter.acquire()
+    initial_complaint = generate_initial_complaint(domain, category)
+    chat_history = [AIMessage(content="Client: "+initial_complaint)]
+
+    # Generate support agent response
+    limiter.acquire()
+    support_agent_response1 = representative_chain.invoke({"chat_history": chat_history, "message": initial_complaint, "sender":"client"})
+    chat_history.extend([HumanMessage(content="Representative: "+support_agent_response1)])
+
+    # Generate follow-up complaint
+    limiter.acquire()
+    follow_up_complaint1 = sender_agent.invoke({"input": support_agent_response1, "chat_history": chat_history, "civil": 0})
+    chat_history.extend([AIMessage(content="Client: "+follow_up_complaint1)])
+
+    # Generate support agent response
+    limiter.acquire()
+    support_agent_response2 = representative_chain.invoke({"chat_history": chat_history, "message": follow_up_complaint1, "sender":"client"})
+    chat_history.extend([HumanMessage(content="Representative: "+support_agent_response2)])
+
+    # Generate follow-up complaint
+    limiter.acquire()
+    follow_up_complaint2 = sender_agent.invoke({"input": support_agent_response2, "chat_history": chat_history, "civil": 0})
+
+    return {
+        "ID": scenario_id,
+        "Category": category,
+        "Domain": domain,
+        "Initial Complaint": initial_complaint,
+        "Support Agent Response 1": support_agent_response1,
+        "Follow-up Complaint 1": follow_up_complaint1,
+        "Support Agent Response 2": support_agent_response2,
+        "Follow-up Complaint 2": follow_up_complaint2
+    }
 
-                # Generate follow-up complaint
-                follow_up_complaint2 = sender_agent.invoke({"input": support_agent_response2, "chat_history": chat_history, "civil": 0})
-                chat_history.extend([AIMessage(content="Client: "+follow_up_complaint2)])
 
+def load_checkpoint(checkpoint_path):
+    """Scenarios finished by earlier runs, keyed by ID (a truncated last line from a crash is ignored)."""
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            for line in f:
+                try:
+                    scenario = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[scenario["ID"]] = scenario
+    return done
 
-                # Store scenario
-                scenarios.append({
-                    "Category": category,
-                    "Domain": domain,
-                    "Initial Complaint": initial_complaint,
-                    "Support Agent Response 1": support_agent_response1,
-                    "Follow-up Complaint 1": follow_up_complaint1,
-                    "Support Agent Response 2": support_agent_response2,
-                    "Follow-up Complaint 2": follow_up_complaint2
-                })
 
+def generate_scenarios(domains, categories, examples_per_pair, file_path="phase1_scenarios.tsv",
+                       checkpoint_path="phase1_scenarios.jsonl", max_concurrency=8, requests_per_minute=0):
+    """
+    Generate examples_per_pair scenarios for every (domain, category) pair, max_concurrency at a time.
+    Pairs that already have scenarios in the checkpoint only get the missing ones, so a rerun resumes
+    after a crash (or retries failed scenarios, or tops up with a larger examples_per_pair).
+    Each finished scenario is appended to the JSONL checkpoint and the TSV as soon as it completes;
+    at the end the TSV is rewritten sorted by ID.
+    """
+    done = load_checkpoint(checkpoint_path)
+    if not done and os.path.exists(file_path):
+        # TSV from before checkpoints existed: keep its scenarios
+        existing = pd.read_csv(file_path, sep='\t', keep_default_na=False)
+        done = {int(row["ID"]): {**row, "ID": int(row["ID"])} for row in existing.to_dict("records")}
+        with open(checkpoint_path, 'w') as f:
+            f.writelines(json.dumps(done[i]) + "\n" for i in sorted(done))
+
+    have = Counter((s["Domain"], s["Category"]) for s in done.values())
+    tasks = [(domain, category) for domain in domains for category in categories
+             for _ in range(examples_per_pair - have[(domain, category)])]
+    free_ids = (i for i in itertools.count(1) if i not in done)
+    pending = [(next(free_ids), domain, category) for domain, category in tasks]
+    print(f"[INFO] {len(done)} scenarios in {checkpoint_path}, generating {len(pending)}")
+
+    representative_chain = agent_representative()
+    limiter = RateLimiter(requests_per_minute)
+    write_lock = threading.Lock()
+    failed = 0
+    start_time = time.time()
+
+    def write(scenario):
+        with write_lock:
+            with open(checkpoint_path, 'a') as f:
+                f.write(json.dumps(scenario) + "\n")
+            pd.DataFrame([scenario], columns=COLUMNS).to_csv(file_path, sep='\t', index=False, lineterminator='\n',
+                                                           mode='a', header=not os.path.exists(file_path))
+            done[scenario["ID"]] = scenario
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(generate_scenario, i, domain, category, representative_chain, limiter): i
+                   for i, domain, category in pending}
+        for n, future in enumerate(as_completed(futures), start=1):
+            try:
+                write(future.result())
+                print(f"Generated scenario {futures[future]} ({n}/{len(pending)}, {time.time() - start_time:.1f}s)")
+            except Exception as e:
+                failed += 1
+                print(f"[WARNING] Scenario {futures[future]} failed, it will be retried on the next run: {e}")
+
+    scenarios = [done[i] for i in sorted(done)]
+    pd.DataFrame(scenarios, columns=COLUMNS).to_csv(file_path, sep='\t', index=False, lineterminator='\n')
+    print(f"[TIMING] Generated {len(pending) - failed} scenarios in {time.time() - start_time:.1f}s "
+          f"({limiter.waited:.1f}s waiting on the rate limit, {failed} failed)")
     return scenarios
 
 
-# Generate scenarios
-domains = ["mobile-device", "hotel", "airlines"]
-categories = mAgents.categories.keys()
-scenarios = generate_scenarios(domains, categories, examples_per_pair=3)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate phase 1 complaint scenarios")
+    parser.add_argument('--per-pair', type=int, default=3, help="scenarios per (domain, category) pair")
+    parser.add_argument('--max-concurrency', type=int, default=8, help="scenarios generated at the same time")
+    parser.add_argument('--rpm', type=float, default=0, help="LLM requests per minute across all workers (0 = unlimited)")
+    parser.add_argument('--output', default="phase1_scenarios.tsv")
+    parser.add_argument('--checkpoint', default="phase1_scenarios.jsonl", help="JSONL of finished scenarios, used to resume")
+    args = parser.parse_args()
 
-df = pd.DataFrame(scenarios)
-df["ID"] = range(1, len(df)+1)
-file_path = "phase1_scenarios.tsv"
-df.to_csv(file_path, sep='\t', index=False, lineterminator='\n')
+    # Generate scenarios
+    domains = ["mobile-device", "hotel", "airlines"]
+    categories = mAgents.categories.keys()
+    generate_scenarios(domains, categories, args.per_pair, file_path=args.output, checkpoint_path=args.checkpoint,
+                       max_concurrency=args.max_concurrency, requests_per_minute=args.rpm)
 
-print("Saved file to {}".format(file_path))
-#%%
+    print("Saved file to {}".format(args.output))
@@ -0,0 +1,198 @@
+'''
+Offline load test for the agent endpoints.
+Swaps every model for the stand-ins in fake_models.py, then runs the Flask app in-process with
+N concurrent simulated participants. Each participant opens a chat and, for every turn, requests
+all support panels the way script_chat.js does (one /support-bundle/ stream, or one request per
+panel with --per-panel-routes) before sending the next representative message.
+
+Reports p50/p95/p99 latency and throughput per route. With --baseline, exits non-zero when a
+route's p95 is more than --tolerance slower than in the baseline report, so regressions in the
+agent pipelines are caught without an API key.
+
+    python loadtest.py --participants 20 --turns 3 --latency lognormal:0.5:0.4
+    python loadtest.py --json report.json
+    python loadtest.py --baseline report.json --tolerance 0.2
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+REP_MESSAGES = [
+    "I'm sorry to hear that. Could you share your booking reference?",
+    "Thank you. I can see the change on your booking, let me check the options.",
+    "I can offer you a seat on the next flight or a refund to your card.",
+    "I have processed that for you. Is there anything else I can help with?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def call(self, route, fn):
+        start = time.perf_counter()
+        response = fn()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+    def report(self, wall_time):
+        report = {}
+        for route, values in sorted(self.latencies.items()):
+            report[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "throughput": len(values) / wall_time,
+            }
+        return report
+
+
+def drain_stream(response):
+    """Read a streamed response to the end (so its full duration is timed)"""
+    if b"event: error" in response.get_data():
+        print(f"[WARNING] error event in stream: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def run_participant(app, recorder, turns, category, per_panel_routes=False):
+    client = app.test_client()
+    response = client.get('/chat/Airline/')
+    session_id = response.headers['Location'].split('/')[2].split('?')[0]
+
+    # Skip the surveys: go straight to a round with both agents enabled
+    with client.session_transaction() as sess:
+        sess[session_id]['current_client'].update({"info": 1, "emo": 1})
+
+    query = f"name=Test&domain=Airline&category={category}&grateful=0&ranting=1&expression=1&civil=0&info=1&emo=1"
+    response = recorder.call('GET /get-reply', lambda: client.get(f'/get-reply/{session_id}/?{query}'))
+    client_id = response.json['client']
+    reply = response.json['message']
+
+    for turn in range(turns):
+        body = {"client_id": client_id, "client_reply": reply}
+        if not per_panel_routes:
+            recorder.call('/support-bundle', lambda: drain_stream(client.post(f'/support-bundle/{session_id}/', json=body)))
+        else:
+            recorder.call('/get-info-support', lambda: client.post(f'/get-info-support/{session_id}/', json=body))
+            recorder.call('/get-trouble-support', lambda: client.post(f'/get-trouble-support/{session_id}/', json=body))
+            recorder.call('/sentiment', lambda: client.post(f'/sentiment/{session_id}/', json=body))
+            if turn > 0:
+                recorder.call('/get-emo-support[REFRAME]', lambda: client.post(f'/get-emo-support/{session_id}/', json=dict(body, type="TYPE_EMO_REFRAME")))
+
+        prompt = REP_MESSAGES[turn % len(REP_MESSAGES)]
+        response = recorder.call('POST /get-reply', lambda: client.post(f'/get-reply/{session_id}/', json={
+            "prompt": prompt, "client_id": client_id, "show_info": "1", "show_emo": "1"}))
+        reply = response.json['message']
+
+
+def load_app(args):
+    """Import app.py with fake models, running in a scratch directory so no study data is touched."""
+    os.environ["WARM_UP_MODELS"] = "0"
+    os.environ.setdefault("OPENING_PANEL_POOL_SIZE", "0")  # time the agents, not the precomputed first turn
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+    sys.path.insert(0, ROOT)
+
+    from fake_models import install_fake_models
+    install_fake_models(latency=args.latency, sentiment_latency=args.sentiment_latency, seed=args.seed,
+                        fake_sentiment=not args.real_sentiment)
+
+    os.chdir(tempfile.mkdtemp(prefix="propilot-loadtest-"))
+    import app as flask_app
+    while not flask_app.agent_pool.is_ready():
+        time.sleep(0.05)
+    return flask_app.app
+
+
+def print_report(report):
+    print(f"{'route':<28}{'requests':>9}{'errors':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'req/s':>8}")
+    for route, stats in report.items():
+        print(f"{route:<28}{stats['requests']:>9}{stats['errors']:>8}{stats['p50']:>8.2f}{stats['p95']:>8.2f}{stats['p99']:>8.2f}{stats['throughput']:>8.2f}")
+
+
+def print_prefetch_stats(stats):
+    print(f"\n{'turn':<6}{'panels':>8}{'hits':>6}{'hit rate':>10}{'saved s':>9}")
+    for turn_number, turn_stats in stats.items():
+        print(f"{turn_number:<6}{turn_stats['requests']:>8}{turn_stats['hits']:>6}{turn_stats['hit_rate']:>10.0%}{turn_stats['saved']:>9.2f}")
+
+
+def find_regressions(report, baseline, tolerance):
+    regressions = []
+    for route, stats in report.items():
+        if route in baseline and stats['p95'] > baseline[route]['p95'] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {stats['p95']:.2f}s vs baseline {baseline[route]['p95']:.2f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=10)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--latency', default="lognormal:0.5:0.4", help="LLM latency distribution (see fake_models.LatencyProfile)")
+    parser.add_argument('--sentiment-latency', default="constant:0.05")
+    parser.add_argument('--real-sentiment', action='store_true', help="use the real VADER/TextBlob/transformer models")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--per-panel-routes', action='store_true', help="call each support route separately instead of /support-bundle/")
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--baseline', help="report from a previous run to compare p95 against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(os.path.abspath(args.baseline)) as f:
+            baseline = json.load(f)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    app = load_app(args)
+    import config as common
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.participants) as executor:
+        futures = [executor.submit(run_participant, app, recorder, args.turns, common.complaintTypes[i % len(common.complaintTypes)], args.per_panel_routes)
+                   for i in range(args.participants)]
+        for future in futures:
+            future.result()
+    report = recorder.report(time.perf_counter() - start)
+
+    print_report(report)
+    print_prefetch_stats(app.test_client().get('/health/').json["prefetch"])
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+'''
+In-process metrics in the Prometheus text exposition format, served by app.py at /metrics.
+
+LLM calls are measured by LLMMetricsHandler, a langchain callback handler attached to the llmchat /
+llminfo / llmemo / llmcompletion models when the registry loads them (fake stand-ins included).
+Calls are labelled with the model, the agent class and pipeline step they ran for, and the Flask
+route that triggered them. Those labels are kept in context variables:
+- app.py sets the route for each request (set_route);
+- AgentPool.checkout sets the agent class and StepGraph the step (labels());
+- work handed to another thread keeps them when wrapped with bind().
+Labels that are unknown for a call (e.g. background warm-up) are "none".
+'''
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_context = contextvars.ContextVar("metrics_labels", default={})
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple("none" if labels.get(name) is None else str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines += self._samples(key, value)
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the with-block as in flight."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the with-block's duration in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total = value
+        lines = [f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {count}"
+                 for bound, count in zip(self.buckets, counts)]
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+def render():
+    """Every metric in the Prometheus text format (version 0.0.4)."""
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+
+# ===== Labels carried by the current context =====
+
+def current_labels():
+    return _context.get()
+
+@contextmanager
+def labels(**values):
+    """Add labels (agent, step, ...) for the metrics recorded inside the with-block."""
+    token = _context.set({**_context.get(), **values})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def set_route(route):
+    """Label everything recorded from now on in this context with `route` (None clears it)."""
+    values = dict(_context.get())
+    if route is None:
+        values.pop("route", None)
+    else:
+        values["route"] = route
+    _context.set(values)
+
+def bind(fn):
+    """Wrap `fn` to run with the caller's labels, for handing it to a thread pool (call it once)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+# ===== Metrics =====
+
+llm_seconds = Histogram("llm_request_seconds", "Latency of one LLM call in seconds",
+                        ["model", "agent", "step", "route"])
+llm_tokens = Histogram("llm_tokens", "Tokens per LLM call, by type (prompt/completion); "
+                       "estimated at 4 characters per token when the provider does not report usage",
+                       ["model", "agent", "step", "route", "type"], buckets=TOKEN_BUCKETS)
+llm_errors = Counter("llm_errors_total", "Failed LLM calls, by exception type",
+                     ["model", "agent", "step", "route", "error"])
+llm_timeouts = Counter("llm_timeouts_total", "LLM calls that failed with a timeout",
+                       ["model", "agent", "step", "route"])
+llm_in_flight = Gauge("llm_in_flight", "LLM calls currently running", ["model", "agent", "route"])
+
+agent_seconds = Histogram("agent_chain_seconds", "Time an agent instance was checked out to serve one request",
+                          ["agent", "route"])
+agent_in_flight = Gauge("agent_in_flight", "Agent invocations currently running", ["agent", "route"])
+step_seconds = Histogram("agent_step_seconds", "Latency of one pipeline step of an agent",
+                         ["agent", "step", "route"])
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+def _is_timeout(error):
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Records latency, tokens, errors and in-flight calls of one registry model (see module docstring)."""
+
+    def __init__(self, model):
+        self.model = model
+        self.runs = {}  # run_id -> (start, labels, estimated prompt tokens)
+        self.lock = threading.Lock()
+
+    def _start(self, run_id, prompt_text):
+        run_labels = dict(model=self.model, **current_labels())
+        with self.lock:
+            self.runs[run_id] = (time.perf_counter(), run_labels, _estimate_tokens(prompt_text))
+        llm_in_flight.inc(**run_labels)
+
+    def _finish(self, run_id):
+        with self.lock:
+            run = self.runs.pop(run_id, None)
+        if run is None:
+            return None
+        start, run_labels, prompt_estimate = run
+        llm_in_flight.dec(**run_labels)
+        llm_seconds.observe(time.perf_counter() - start, **run_labels)
+        return run_labels, prompt_estimate
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "".join(prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "".join(str(m.content) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        run_labels, prompt_estimate = finished
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            prompt_tokens, completion_tokens = usage["prompt_tokens"], usage.get("completion_tokens", 0)
+        else:
+            prompt_tokens = prompt_estimate
+            completion_tokens = sum(_estimate_tokens(g.text) for batch in response.generations for g in batch)
+        llm_tokens.observe(prompt_tokens, type="prompt", **run_labels)
+        llm_tokens.observe(completion_tokens, type="completion", **run_labels)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        run_labels, _ = finished
+        llm_errors.inc(error=type(error).__name__, **run_labels)
+        if _is_timeout(error):
+            llm_timeouts.inc(**run_labels)
+
+
+def instrument_model(name, model):
+    """Registry load hook: attach an LLMMetricsHandler for `name` to a langchain model."""
+    callbacks = list(getattr(model, "callbacks", None) or [])
+    if not any(isinstance(c, LLMMetricsHandler) for c in callbacks):
+        model.callbacks = callbacks + [LLMMetricsHandler(name)]
+    return model
@@ -0,0 +1,81 @@
+'''
+Lazy registry for the heavy models (LLM clients, embeddings, sentiment models).
+Modules register a factory per component; nothing is imported or constructed until the component is
+first used or warm_up() is called, so importing app.py only pays for Flask.
+Load and import times are recorded per component and available from timings().
+Load hooks (on_load) run on every instance handed out, built or overridden, e.g. to attach callbacks.
+'''
+import time
+import importlib
+import threading
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.load_timings = {}
+        self.locks = {}
+        self.hooks = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Register a zero-argument factory building component `name`."""
+        with self.lock:
+            self.factories[name] = factory
+            self.locks[name] = threading.Lock()
+
+    def on_load(self, name, hook):
+        """Call `hook(name, instance)` on component `name` once it is built or overridden; the hook returns the instance to use."""
+        with self.lock:
+            self.hooks.setdefault(name, []).append(hook)
+            if name in self.instances:
+                self.instances[name] = hook(name, self.instances[name])
+
+    def _apply_hooks(self, name, instance):
+        for hook in self.hooks.get(name, []):
+            instance = hook(name, instance)
+        return instance
+
+    def override(self, name, instance):
+        """Use `instance` for `name` instead of building it (e.g. a stand-in model for offline runs)."""
+        with self.lock:
+            self.instances[name] = self._apply_hooks(name, instance)
+
+    def is_loaded(self, name):
+        return name in self.instances
+
+    def get(self, name):
+        """Return component `name`, building it on first use."""
+        if name in self.instances:
+            return self.instances[name]
+        if name not in self.factories:
+            raise KeyError(f"No model registered as '{name}'")
+
+        with self.locks[name]:
+            if name not in self.instances:
+                start = time.perf_counter()
+                instance = self.factories[name]()
+                self.load_timings[name] = time.perf_counter() - start
+                print(f"[INFO] Loaded {name} in {self.load_timings[name]:.2f}s")
+                self.instances[name] = self._apply_hooks(name, instance)
+        return self.instances[name]
+
+    def import_module(self, module_name):
+        """Import a module from inside a factory, recording the import time as 'import:<module>'."""
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self.load_timings.setdefault(f"import:{module_name}", time.perf_counter() - start)
+        return module
+
+    def warm_up(self, names=None):
+        """Build the given components (default: all registered) and return timings()."""
+        for name in names or list(self.factories):
+            self.get(name)
+        return self.timings()
+
+    def timings(self):
+        return dict(self.load_timings)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,163 @@
+'''
+Per-step model routing for the agents.
+Every LLM step of mAgentER, mAgentEP, mAgentInfo, mAgentTrouble and mAgentCustomer is assigned to a tier
+(a model and its settings), with its own max_tokens and latency budget, so trivial steps such as the
+rephrases do not have to wait on the model used for the reasoning steps.
+
+A routing is {"tiers": {...}, "steps": {"<agent>.<step>": {"tier", "max_tokens", "budget"}}}.
+MODEL_ROUTING picks one of the ROUTINGS below by name, or a JSON file with the same layout (its
+entries are merged over the baseline). "baseline" keeps the models the agents have always used.
+
+Agents get their model from model_for(agent, step). An LLM call slower than its step's budget (seconds)
+is logged and counted in llm_budget_exceeded_total.
+Tier models are registry components ("tier:<name>"); fake_models.install_fake_models() replaces them too,
+and routing_benchmark.py compares the end-to-end latency of routings with those stand-ins.
+'''
+import os
+import copy
+import json
+import time
+import hashlib
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import metrics
+from model_registry import registry
+
+TIERS = {
+    # The model every chat chain used before routing existed
+    "reasoning": {"kind": "chat", "model": "gpt-5-nano", "temperature": 1, "max_tokens_param": "max_completion_tokens",
+                  "benchmark_latency": "lognormal:2.0:0.5"},
+    # Non-reasoning model for rephrasing and short lists
+    "light": {"kind": "chat", "model": "gpt-4.1-nano", "temperature": 0.7, "max_tokens_param": "max_tokens",
+              "benchmark_latency": "lognormal:0.5:0.4"},
+    # mLangChain.client_completion (langchain's OpenAI default: temperature 0.7, 256 tokens)
+    "completion": {"kind": "completion", "model": "gpt-3.5-turbo-instruct", "temperature": 0.7, "max_tokens_param": "max_tokens",
+                   "benchmark_latency": "lognormal:0.6:0.4"},
+}
+
+BASELINE_STEPS = {
+    "mAgentER.situation": {"tier": "reasoning", "max_tokens": None, "budget": 10.0},
+    "mAgentER.thought": {"tier": "reasoning", "max_tokens": None, "budget": 10.0},
+    "mAgentER.reframe": {"tier": "reasoning", "max_tokens": None, "budget": 10.0},
+    "mAgentER.rephrase_thought": {"tier": "reasoning", "max_tokens": None, "budget": 5.0},
+    "mAgentER.rephrase_reframe": {"tier": "reasoning", "max_tokens": None, "budget": 5.0},
+    "mAgentEP.perspective": {"tier": "completion", "max_tokens": 256, "budget": 5.0},
+    "mAgentEP.paraphrase": {"tier": "completion", "max_tokens": 256, "budget": 3.0},
+    "mAgentInfo.cues": {"tier": "reasoning", "max_tokens": None, "budget": 8.0},
+    "mAgentTrouble.procedure": {"tier": "reasoning", "max_tokens": None, "budget": 8.0},
+    "mAgentCustomer.context": {"tier": "reasoning", "max_tokens": None, "budget": 8.0},
+    "mAgentCustomer.reply": {"tier": "reasoning", "max_tokens": None, "budget": 10.0},
+    # Fused (single structured call) mode of mAgentER / mAgentEP; needs a chat tier for JSON-schema output
+    "mAgentER.fused": {"tier": "reasoning", "max_tokens": None, "budget": 15.0},
+    "mAgentEP.fused": {"tier": "reasoning", "max_tokens": None, "budget": 8.0},
+}
+
+ROUTINGS = {
+    "baseline": {"tiers": TIERS, "steps": BASELINE_STEPS},
+    # Rephrasing, paraphrasing and list steps on the light tier, with tight token caps
+    "tiered": {"tiers": TIERS, "steps": dict(BASELINE_STEPS, **{
+        "mAgentER.rephrase_thought": {"tier": "light", "max_tokens": 150, "budget": 2.0},
+        "mAgentER.rephrase_reframe": {"tier": "light", "max_tokens": 150, "budget": 2.0},
+        "mAgentEP.paraphrase": {"tier": "light", "max_tokens": 150, "budget": 2.0},
+        "mAgentInfo.cues": {"tier": "light", "max_tokens": 120, "budget": 3.0},
+        "mAgentTrouble.procedure": {"tier": "light", "max_tokens": 200, "budget": 3.0},
+        "mAgentCustomer.context": {"tier": "light", "max_tokens": 150, "budget": 2.0},
+    })},
+}
+
+budget_exceeded = metrics.Counter("llm_budget_exceeded_total", "LLM calls slower than their step's latency budget",
+                                  ["agent", "step", "tier"])
+
+
+def load(spec):
+    """Routing for a ROUTINGS name or a JSON file path; file entries override the baseline."""
+    if spec in ROUTINGS:
+        return copy.deepcopy(ROUTINGS[spec])
+    with open(spec) as f:
+        custom = json.load(f)
+    routing = copy.deepcopy(ROUTINGS["baseline"])
+    for tier, settings in custom.get("tiers", {}).items():
+        routing["tiers"][tier] = dict(routing["tiers"].get(tier, {}), **settings)
+    for step, settings in custom.get("steps", {}).items():
+        routing["steps"][step] = dict(routing["steps"].get(step, {}), **settings)
+    for step, settings in routing["steps"].items():
+        if settings["tier"] not in routing["tiers"]:
+            raise ValueError(f"{spec}: step {step} uses unknown tier '{settings['tier']}'")
+    return routing
+
+
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "baseline")
+routing = load(MODEL_ROUTING)
+
+
+def use(spec):
+    """Switch to another routing; agents built afterwards use it (for benchmarks and tests)."""
+    global routing
+    routing = load(spec) if isinstance(spec, str) else spec
+
+
+def component(tier):
+    return f"tier:{tier}"
+
+
+def step_settings(agent, step):
+    key = f"{agent}.{step}"
+    if key not in routing["steps"]:
+        raise KeyError(f"No model routing for step {key}")
+    return routing["steps"][key]
+
+
+def tier_for(agent, step):
+    """Settings of the tier a step is routed to."""
+    return routing["tiers"][step_settings(agent, step)["tier"]]
+
+
+def model_for(agent, step):
+    """The model for one agent step: its tier's registry model, with the step's max_tokens and budget check."""
+    settings = step_settings(agent, step)
+    tier = routing["tiers"][settings["tier"]]
+    model = registry.get(component(settings["tier"]))
+    if settings.get("max_tokens"):
+        model = model.bind(**{tier["max_tokens_param"]: settings["max_tokens"]})
+
+    if not settings.get("budget"):
+        return model
+    return model.with_config(callbacks=[BudgetCheck(agent, step, settings["tier"], settings["budget"])])
+
+
+class BudgetCheck(BaseCallbackHandler):
+    """Logs and counts LLM calls of one step that take longer than its budget."""
+
+    def __init__(self, agent, step, tier, budget):
+        self.agent = agent
+        self.step = step
+        self.tier = tier
+        self.budget = budget
+        self.started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id):
+        start = self.started.pop(run_id, None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed > self.budget:
+            budget_exceeded.inc(agent=self.agent, step=self.step, tier=self.tier)
+            print(f"[TIMING] {self.agent}.{self.step} took {elapsed:.2f}s, over its {self.budget:.1f}s budget ({self.tier} tier)")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def fingerprint():
+    """Hash of the active routing; changes whenever a step moves tier or a tier's settings change."""
+    return hashlib.sha256(json.dumps(routing, sort_keys=True).encode()).hexdigest()[:16]
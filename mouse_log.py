@@ -0,0 +1,241 @@
+'''
+Chunked mouse-tracking log, one JSONL file per participant and round (mouse_tracking_round_<N>.jsonl).
+The browser flushes small chunks every few seconds instead of one large document at the end of the round:
+
+    {"stream": "<tracker id>", "round": <round the stream started in>, "seq": 3, "start": <round start, epoch ms>, "final": false, "total": <ms>,
+     "m": [t0, x0, y0, dt, dx, dy, ...],           movement samples; first triple absolute, then deltas
+     "q": [[quadrant, entry_ms, exit_ms], ...],    completed quadrant visits
+     "h": [[agent, entry_ms, exit_ms], ...]}       completed agent panel hovers
+
+Times are ms since the tracker's start. A retried chunk has the same (stream, seq) and is dropped, so
+clients can resend freely. Chunks may arrive out of order; stream_complete() tells when a stream's final
+chunk and all chunks before it are in. The dedup check reads only the bytes appended since the last check, under the
+same flock as the append, so it also holds across worker processes.
+
+read_round() decodes a round back into the old mouse_tracking_round_<N>.json layout, and
+`python mouse_log.py [DATA_DIR]` exports those files for every participant.
+archive() moves a finished round's log into gzip cold storage (mouse_tracking_round_<N>.jsonl.gz);
+readers see archived and newer chunks together.
+'''
+import os
+import sys
+import gzip
+import json
+import fcntl
+import datetime
+import threading
+
+_locks = {}
+_locks_guard = threading.Lock()
+_seen = {}  # log path -> (bytes scanned, {(stream, seq)}, {stream: seq of its final chunk})
+
+
+def _lock_for(path):
+    with _locks_guard:
+        if path not in _locks:
+            _locks[path] = threading.Lock()
+        return _locks[path]
+
+def log_path(participant_dir, round_num):
+    return os.path.join(participant_dir, f"mouse_tracking_round_{round_num}.jsonl")
+
+def legacy_path(participant_dir, round_num):
+    return os.path.join(participant_dir, f"mouse_tracking_round_{round_num}.json")
+
+def archive_path(participant_dir, round_num):
+    return os.path.join(participant_dir, f"mouse_tracking_round_{round_num}.jsonl.gz")
+
+
+def append_chunk(participant_dir, round_num, chunk):
+    """Append a chunk to the round's log unless its (stream, seq) was stored already. Returns True if appended."""
+    os.makedirs(participant_dir, exist_ok=True)
+    path = log_path(participant_dir, round_num)
+    key = (chunk.get('stream'), chunk.get('seq'))
+    with _lock_for(path):
+        with open(path, 'a+b') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                # Pick up chunks appended since the last check (possibly by another process)
+                scanned, seen, finals = _seen.get(path, (0, set(), {}))
+                if os.fstat(f.fileno()).st_size < scanned:
+                    # Truncated by archive(); readers drop chunks that are also in the archive
+                    scanned, seen, finals = 0, set(), {}
+                f.seek(scanned)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    record = json.loads(line)
+                    seen.add((record.get('stream'), record.get('seq')))
+                    if record.get('final'):
+                        finals[record.get('stream')] = record.get('seq')
+                    scanned += len(line)
+                _seen[path] = (scanned, seen, finals)
+
+                if key in seen:
+                    return False
+                line = (json.dumps(chunk, separators=(',', ':')) + "\n").encode()
+                f.write(line)
+                f.flush()
+                seen.add(key)
+                if chunk.get('final'):
+                    finals[chunk.get('stream')] = chunk.get('seq')
+                _seen[path] = (scanned + len(line), seen, finals)
+                return True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def stream_complete(participant_dir, round_num, stream):
+    """
+    True once the stream's final chunk and every chunk before it (seq 0..final) have been appended.
+    Chunks are sent in parallel, so the final one can arrive before earlier ones.
+    """
+    path = log_path(participant_dir, round_num)
+    with _lock_for(path):
+        state = _seen.get(path)
+        final = state[2].get(stream) if state else None
+        if final is None:
+            return False
+        return all((stream, seq) in state[1] for seq in range(final + 1))
+
+
+def _read_lines(f):
+    return [json.loads(line) for line in f if line.endswith("\n")]
+
+
+def read_chunks(participant_dir, round_num):
+    """Archived and live chunks of a round, each (stream, seq) once"""
+    chunks = []
+    if os.path.exists(archive_path(participant_dir, round_num)):
+        with gzip.open(archive_path(participant_dir, round_num), 'rt') as f:
+            chunks += _read_lines(f)
+    if os.path.exists(log_path(participant_dir, round_num)):
+        with open(log_path(participant_dir, round_num)) as f:
+            chunks += _read_lines(f)
+
+    unique = {}
+    for chunk in chunks:
+        unique.setdefault((chunk.get('stream'), chunk.get('seq')), chunk)
+    return list(unique.values())
+
+
+def archive(participant_dir, round_num):
+    """Move the round's live log into the gzip archive (merged with what is archived already). Returns the chunk count."""
+    path = log_path(participant_dir, round_num)
+    if not os.path.exists(path):
+        return 0
+    with _lock_for(path):
+        with open(path, 'r+b') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                chunks = read_chunks(participant_dir, round_num)
+                tmp_path = archive_path(participant_dir, round_num) + ".tmp"
+                with gzip.open(tmp_path, 'wt') as out:
+                    for chunk in chunks:
+                        out.write(json.dumps(chunk, separators=(',', ':')) + "\n")
+                os.replace(tmp_path, archive_path(participant_dir, round_num))
+                # Truncate rather than delete: another process may be waiting on this file's lock to append
+                f.truncate(0)
+                _seen.pop(path, None)
+                return len(chunks)
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def has_round(participant_dir, round_num):
+    """True when tracking data for the round was received (chunked log, its archive, or an old single-document file)"""
+    path = log_path(participant_dir, round_num)
+    return (os.path.exists(path) and os.path.getsize(path) > 0) or os.path.exists(archive_path(participant_dir, round_num)) \
+        or os.path.exists(legacy_path(participant_dir, round_num))
+
+
+def _iso(epoch_ms):
+    # Same format as JavaScript's Date.toISOString(), which the old single-document uploads used
+    moment = datetime.datetime.fromtimestamp(epoch_ms // 1000, datetime.timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S') + f".{int(epoch_ms) % 1000:03d}Z"
+
+
+def decode_chunks(chunks):
+    """Rebuild {startTime, movements, quadrantEvents, agentHovers, totalDuration} from a round's chunks"""
+    chunks = sorted(chunks, key=lambda c: (c['start'], c['stream'], c['seq']))
+    start_time = chunks[0]['start'] if chunks else None
+    data = {'startTime': start_time, 'movements': [], 'quadrantEvents': [], 'agentHovers': [], 'totalDuration': 0}
+
+    for chunk in chunks:
+        # A page reload starts a new stream; shift its times onto the first stream's clock
+        offset = chunk['start'] - start_time
+        m = chunk.get('m', [])
+        t = x = y = 0
+        for i in range(0, len(m) - 2, 3):
+            t, x, y = (m[i], m[i + 1], m[i + 2]) if i == 0 else (t + m[i], x + m[i + 1], y + m[i + 2])
+            data['movements'].append({'x': x, 'y': y, 'timestamp': t + offset})
+
+        for events, key, name in ((chunk.get('q', []), 'quadrantEvents', 'quadrant'), (chunk.get('h', []), 'agentHovers', 'agent')):
+            for label, entry, exit_ in events:
+                data[key].append({
+                    name: label,
+                    'entry_timestamp_ms': entry + offset,
+                    'exit_timestamp_ms': exit_ + offset,
+                    'duration_ms': exit_ - entry,
+                    'entry_timestamp_iso': _iso(chunk['start'] + entry),
+                    'exit_timestamp_iso': _iso(chunk['start'] + exit_),
+                })
+        data['totalDuration'] = max(data['totalDuration'], chunk.get('total', 0) + offset)
+    return data
+
+
+def read_round(participant_dir, round_num):
+    """The round's tracking data in the mouse_tracking_round_<N>.json layout, or None if nothing was received"""
+    chunks = read_chunks(participant_dir, round_num)
+    if not chunks:
+        path = legacy_path(participant_dir, round_num)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    data = decode_chunks(chunks)
+    last = chunks[-1]
+    data.update({
+        'session_id': last.get('session_id'),
+        'round': last.get('round', round_num),
+        'condition': last.get('condition'),
+        'timestamp': last.get('timestamp'),
+        'chunks': len(chunks),
+        'complete': any(c.get('final') for c in chunks),
+    })
+    return data
+
+
+def rounds(participant_dir):
+    """Round numbers with a chunked log, an archive or an old single-document file"""
+    found = set()
+    for name in os.listdir(participant_dir):
+        if name.startswith('mouse_tracking_round_') and name.endswith(('.json', '.jsonl', '.jsonl.gz')):
+            round_num = name[len('mouse_tracking_round_'):].split('.')[0]
+            if round_num.isdigit():
+                found.add(int(round_num))
+    return sorted(found)
+
+
+def export_json(participant_dir):
+    """Write mouse_tracking_round_<N>.json for every round that has a chunked log. Returns the written paths."""
+    written = []
+    for round_num in rounds(participant_dir):
+        if not (os.path.exists(log_path(participant_dir, round_num)) or os.path.exists(archive_path(participant_dir, round_num))):
+            continue
+        path = legacy_path(participant_dir, round_num)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(read_round(participant_dir, round_num), f, indent=2)
+        os.replace(path + ".tmp", path)
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "study_data_round_1"
+    for name in sorted(os.listdir(data_dir)):
+        participant_dir = os.path.join(data_dir, name)
+        if os.path.isdir(participant_dir):
+            for path in export_json(participant_dir):
+                print(f"Exported {path}")
@@ -0,0 +1,170 @@
+'''
+Ingestion stage for finished mouse-tracking rounds (see mouse_log.py for the raw chunk log).
+For each round it:
+- simplifies the movement trace with Ramer-Douglas-Peucker (NumPy, `tolerance` in pixels) and stores it
+  as mouse_trajectory_round_<N>.npz (t, x, y int32 arrays);
+- adds the round to the participant's summary index, mouse_summary.json: dwell time and visits per
+  quadrant, hover count and duration per agent card, and time to first look at each panel;
+- moves the raw chunk log to gzip cold storage (mouse_log.archive).
+
+The app runs it once a round's final chunk and all the chunks before it have arrived; `python mouse_summary.py [DATA_DIR]` (re)ingests
+every participant, e.g. after changing MOUSE_RDP_TOLERANCE.
+'''
+import os
+import json
+import argparse
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+import mouse_log
+
+MOUSE_RDP_TOLERANCE = float(os.getenv("MOUSE_RDP_TOLERANCE", "2.0"))
+MOUSE_COLD_STORAGE = os.getenv("MOUSE_COLD_STORAGE", "1") == "1"
+SUMMARY_FILE = "mouse_summary.json"
+
+_summary_lock = threading.Lock()
+
+
+def movement_array(movements):
+    """[{x, y, timestamp}, ...] -> int32 array of shape (n, 3) with columns t, x, y, in time order"""
+    if not movements:
+        return np.empty((0, 3), dtype=np.int32)
+    points = np.array([(m['timestamp'], m['x'], m['y']) for m in movements], dtype=np.float64)
+    points = points[np.argsort(points[:, 0], kind='stable')]
+    return np.rint(points).astype(np.int32)
+
+
+def rdp_mask(xy, tolerance):
+    """Boolean mask of the points Ramer-Douglas-Peucker keeps (iterative; each split is one vectorized distance pass)"""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n <= 2:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    xy = xy.astype(np.float64)
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        inner = xy[start + 1:end]
+        dx, dy = b - a
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            distances = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify(points, tolerance=MOUSE_RDP_TOLERANCE):
+    """Simplified (t, x, y) trace; timestamps of the kept points are preserved"""
+    if tolerance <= 0 or len(points) <= 2:
+        return points
+    return points[rdp_mask(points[:, 1:], tolerance)]
+
+
+def summarize(data, points, simplified, tolerance=MOUSE_RDP_TOLERANCE):
+    """Per-round summary of the decoded round data (mouse_log.read_round layout)"""
+    quadrants = defaultdict(lambda: {"dwell_ms": 0, "visits": 0, "first_entry_ms": None})
+    for event in data.get('quadrantEvents', []):
+        q = quadrants[event['quadrant']]
+        q["dwell_ms"] += event['duration_ms']
+        q["visits"] += 1
+        if q["first_entry_ms"] is None or event['entry_timestamp_ms'] < q["first_entry_ms"]:
+            q["first_entry_ms"] = event['entry_timestamp_ms']
+
+    agents = defaultdict(lambda: {"hovers": 0, "hover_ms": 0, "first_look_ms": None})
+    for event in data.get('agentHovers', []):
+        a = agents[event['agent']]
+        a["hovers"] += 1
+        a["hover_ms"] += event['duration_ms']
+        if a["first_look_ms"] is None or event['entry_timestamp_ms'] < a["first_look_ms"]:
+            a["first_look_ms"] = event['entry_timestamp_ms']
+    for a in agents.values():
+        a["mean_hover_ms"] = a["hover_ms"] / a["hovers"]
+
+    steps = np.diff(points[:, 1:].astype(np.float64), axis=0)
+    return {
+        "round": data.get('round'),
+        "condition": data.get('condition'),
+        "duration_ms": data.get('totalDuration', 0),
+        "complete": data.get('complete', True),
+        "movements": int(len(points)),
+        "simplified_points": int(len(simplified)),
+        "rdp_tolerance_px": tolerance,
+        "path_length_px": float(np.hypot(steps[:, 0], steps[:, 1]).sum()) if len(steps) else 0.0,
+        "quadrants": dict(quadrants),
+        "agents": dict(agents),
+    }
+
+
+def trajectory_path(participant_dir, round_num):
+    return os.path.join(participant_dir, f"mouse_trajectory_round_{round_num}.npz")
+
+
+def load_trajectory(participant_dir, round_num):
+    """Simplified (t, x, y) int32 array of a round"""
+    with np.load(trajectory_path(participant_dir, round_num)) as npz:
+        return np.stack([npz['t'], npz['x'], npz['y']], axis=1)
+
+
+def load_summary(participant_dir):
+    """{round (str): summary} for the participant, {} if nothing was ingested"""
+    path = os.path.join(participant_dir, SUMMARY_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["rounds"]
+
+
+def _save_summary(participant_dir, round_num, summary):
+    path = os.path.join(participant_dir, SUMMARY_FILE)
+    with _summary_lock:
+        rounds = load_summary(participant_dir)
+        rounds[str(round_num)] = summary
+        with open(path + ".tmp", 'w') as f:
+            json.dump({"rounds": rounds}, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+def ingest_round(participant_dir, round_num, tolerance=MOUSE_RDP_TOLERANCE, archive=MOUSE_COLD_STORAGE):
+    """Simplify, summarize and (optionally) archive one round. Returns the summary, or None without data."""
+    data = mouse_log.read_round(participant_dir, round_num)
+    if data is None:
+        return None
+    points = movement_array(data.get('movements', []))
+    simplified = simplify(points, tolerance)
+    np.savez_compressed(trajectory_path(participant_dir, round_num),
+                        t=simplified[:, 0], x=simplified[:, 1], y=simplified[:, 2])
+    summary = summarize(data, points, simplified, tolerance)
+    _save_summary(participant_dir, round_num, summary)
+    if archive:
+        mouse_log.archive(participant_dir, round_num)
+    print(f"[INFO] Mouse round {round_num} of {os.path.basename(participant_dir)}: "
+          f"{len(points)} -> {len(simplified)} points, {len(summary['quadrants'])} quadrants, {len(summary['agents'])} agents")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simplify and summarize the mouse-tracking rounds of every participant")
+    parser.add_argument('data_dir', nargs='?', default='study_data_round_1')
+    parser.add_argument('--tolerance', type=float, default=MOUSE_RDP_TOLERANCE, help="RDP tolerance in pixels")
+    parser.add_argument('--no-archive', action='store_true', help="keep the raw logs uncompressed")
+    args = parser.parse_args()
+
+    for name in sorted(os.listdir(args.data_dir)):
+        participant_dir = os.path.join(args.data_dir, name)
+        if os.path.isdir(participant_dir):
+            for round_num in mouse_log.rounds(participant_dir):
+                ingest_round(participant_dir, round_num, tolerance=args.tolerance, archive=not args.no_archive)
@@ -0,0 +1,98 @@
+'''
+Precomputed support panels for the opening complaints.
+Every conversation starts with one of the hardcoded complaints in config.openingComplaints, so the
+first-turn panels always see the same text and the same one-message history. fill() computes a pool
+of `size` results per (category, domain, panel) once, persists it to a JSON file, and get() serves a
+random one of them, so the first turn costs no LLM call.
+
+The file records the hash of the agents' prompts it was generated with; when a prompt in agents.py
+changes, the stored results are discarded and regenerated.
+'''
+import os
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Panels app.enabled_support_panels turns on for the first turn (the reframe panel starts on the second)
+OPENING_PANELS = ["TYPE_INFO_CUE", "TYPE_INFO_GUIDE", "TYPE_SENTIMENT"]
+
+
+class OpeningPanelPool:
+    def __init__(self, path="opening_panels.json", size=3, panels=OPENING_PANELS):
+        self.path = path
+        self.size = size
+        self.panels = panels
+        self.prompt_hash = None
+        self.entries = {}  # "category|domain|panel" -> [{"payload": ..., "suggestions": [...]}, ...]
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(category, domain, panel):
+        return f"{category}|{domain}|{panel}"
+
+    def load(self, prompt_hash):
+        """Read the pool from disk, keeping it only if it was generated with the current prompts."""
+        self.prompt_hash = prompt_hash
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+        with self.lock:
+            if data.get("prompt_hash") == prompt_hash:
+                self.entries = data.get("entries", {})
+            else:
+                if data:
+                    print(f"[INFO] Agent prompts changed, regenerating {self.path}")
+                self.entries = {}
+
+    def save(self):
+        with self.lock:
+            data = {"prompt_hash": self.prompt_hash, "entries": self.entries}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def fill(self, prompt_hash, compute, categories, domains, max_workers=2):
+        """
+        Load the pool and generate whatever is missing.
+        compute: callable (category, domain, panel) -> {"payload": ..., "suggestions": [...]}
+        """
+        self.load(prompt_hash)
+        missing = []
+        for category in categories:
+            for domain in domains:
+                for panel in self.panels:
+                    have = len(self.entries.get(self.key(category, domain, panel), []))
+                    missing += [(category, domain, panel)] * (self.size - have)
+        if not missing:
+            print(f"[INFO] Opening panel pool loaded from {self.path}")
+            return
+
+        print(f"[INFO] Generating {len(missing)} opening support panels")
+
+        def generate(args):
+            try:
+                entry = compute(*args)
+            except Exception as e:
+                print(f"[WARNING] Opening panel {args} failed: {e}")
+                return
+            with self.lock:
+                self.entries.setdefault(self.key(*args), []).append(entry)
+            self.save()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(generate, missing))
+        print(f"[INFO] Opening panel pool saved to {self.path}")
+
+    def get(self, category, domain, panel):
+        """A random precomputed result for this panel, or None when the pool has none (yet)."""
+        with self.lock:
+            entries = self.entries.get(self.key(category, domain, panel))
+            return random.choice(entries) if entries else None
+
+    def stats(self):
+        with self.lock:
+            return {"prompt_hash": self.prompt_hash, "size": self.size,
+                    "entries": sum(len(entries) for entries in self.entries.values())}
@@ -0,0 +1,40 @@
+'''
+Token-bucket rate limiter shared by the offline generation scripts.
+acquire() blocks until the bucket has enough tokens, so any number of worker threads together stay
+under the configured rate (e.g. an OpenAI requests-per-minute or tokens-per-minute limit).
+'''
+import time
+import threading
+
+
+class RateLimiter:
+    def __init__(self, per_minute, burst=None):
+        """
+        per_minute: tokens added per minute (<= 0 disables limiting)
+        burst: bucket size, i.e. how many tokens can be taken at once after an idle period (default: 1 second's worth, at least 1)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, tokens=1):
+        """Take `tokens` from the bucket, sleeping until they are available. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.waited += waited
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
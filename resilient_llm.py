@@ -0,0 +1,322 @@
+'''
+Resilient invocation of the LLM clients.
+The registry wraps llmchat / llminfo / llmemo / llmcompletion in ResilientLLM (see agents.py), so every
+chain built from them gets:
+- a per-request deadline: app.py sets one for each request (LLM_REQUEST_DEADLINE seconds, a little
+  under the browser's AGENT_TIMEOUT_MS); a call still running at the deadline raises DeadlineExceeded
+  instead of finishing work the browser has given up on;
+- hedging: when an attempt takes longer than the LLM_HEDGE_PERCENTILE of the model's recent latencies,
+  a second identical request is sent and whichever answers first is used. The other one is cancelled
+  if it has not started, otherwise its result is discarded (a running HTTP call cannot be interrupted).
+  At most LLM_HEDGE_MAX_RATE of the calls are hedged, since each hedge costs a second request;
+- retries with full-jitter exponential backoff on transient errors (rate limits, timeouts, connection
+  errors, 5xx), as long as the deadline allows;
+- a circuit breaker shared by all models: after LLM_BREAKER_FAILURES consecutive transient failures
+  calls fail fast with CircuitOpen for LLM_BREAKER_COOLDOWN seconds, then one trial call decides
+  whether it closes again. Calls cut off by their request's deadline do not count either way.
+
+Streaming calls only go through the breaker and are retried while nothing has been streamed yet.
+Counts and rates are in stats() (/health) and in the llm_* metrics (/metrics).
+'''
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from langchain_core.runnables import Runnable
+
+import metrics
+
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "110"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))  # 0 disables hedging
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "0.5"))
+LLM_RETRY_CAP = float(os.getenv("LLM_RETRY_CAP", "8"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "64"))
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+calls_total = metrics.Counter("llm_calls_total", "Resilient LLM invocations (each may send several requests)", ["model"])
+hedges_total = metrics.Counter("llm_hedges_total", "Hedged second requests sent", ["model"])
+hedge_wins_total = metrics.Counter("llm_hedge_wins_total", "Calls answered by the hedged request", ["model"])
+retries_total = metrics.Counter("llm_retries_total", "Retries after a transient error", ["model"])
+deadline_total = metrics.Counter("llm_deadline_exceeded_total", "Calls abandoned at the request deadline", ["model"])
+fast_fails_total = metrics.Counter("llm_circuit_rejected_total", "Calls rejected while the circuit breaker was open", ["model"])
+breaker_open = metrics.Gauge("llm_circuit_open", "1 while the LLM circuit breaker is open")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before the LLM answered."""
+
+
+class CircuitOpen(Exception):
+    """The provider is failing; calls are rejected until the breaker's cooldown ends."""
+    def __init__(self, retry_after):
+        super().__init__(f"LLM provider unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# ===== Deadlines =====
+
+def set_deadline(seconds):
+    """Give the calls made from now on in this context `seconds` to finish (None removes the deadline)."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_transient(error):
+    """Errors worth retrying: rate limits, timeouts, dropped connections and server errors."""
+    if isinstance(error, (DeadlineExceeded, CircuitOpen)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+                                    "ServiceUnavailableError", "ReadTimeout", "ConnectTimeout")
+
+
+class CircuitBreaker:
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial = False
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpen while open; after the cooldown let a single trial call through."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            left = self.opened_at + self.cooldown - time.monotonic()
+            if left > 0 or self.trial:
+                raise CircuitOpen(max(left, 1.0))
+            self.trial = True
+
+    def success(self):
+        with self.lock:
+            self.consecutive = 0
+            if self.opened_at is not None:
+                print("[INFO] LLM circuit breaker closed")
+                breaker_open.dec()
+            self.opened_at = None
+            self.trial = False
+
+    def inconclusive(self):
+        """A call ended without telling whether the provider is healthy; a trial call may be retried."""
+        with self.lock:
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.trial or (self.opened_at is None and self.consecutive >= self.failures):
+                if self.opened_at is None:
+                    breaker_open.inc()
+                    self.trips += 1
+                    print(f"[WARNING] LLM circuit breaker open after {self.consecutive} consecutive failures")
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self.trial or time.monotonic() >= self.opened_at + self.cooldown else "open"
+
+
+breaker = CircuitBreaker()
+
+
+class ResilientLLM(Runnable):
+    """Runnable wrapper around one registry model (see module docstring)."""
+
+    def __init__(self, name, model, breaker=breaker, hedge_percentile=LLM_HEDGE_PERCENTILE,
+                 max_retries=LLM_MAX_RETRIES):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        self.hedge_percentile = hedge_percentile
+        self.max_retries = max_retries
+        self.latencies = deque(maxlen=200)
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "deadline_exceeded": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+    # The wrapper is transparent for prompt introspection and schemas
+    @property
+    def InputType(self):
+        return self.model.InputType
+
+    @property
+    def OutputType(self):
+        return self.model.OutputType
+
+    def get_input_schema(self, config=None):
+        return self.model.get_input_schema(config)
+
+    def get_output_schema(self, config=None):
+        return self.model.get_output_schema(config)
+
+    def get_name(self, suffix=None, *, name=None):
+        return self.model.get_name(suffix, name=name)
+
+    def __getattr__(self, attr):
+        # Model settings (model_name, temperature, callbacks, ...) read through to the wrapped model
+        if attr == "model":
+            raise AttributeError(attr)
+        return getattr(self.model, attr)
+
+    def _count(self, key, counter):
+        with self.lock:
+            self.counts[key] += 1
+        counter.inc(model=self.name)
+
+    def hedge_delay(self):
+        """Seconds after which an attempt is hedged, or None (hedging off, too few samples, or hedge budget used up)."""
+        with self.lock:
+            if self.hedge_percentile <= 0 or len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            if self.counts["hedges"] >= LLM_HEDGE_MAX_RATE * self.counts["calls"]:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _attempt(self, input, config, kwargs):
+        start = time.perf_counter()
+        result = self.model.invoke(input, config, **kwargs)
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def _hedged(self, input, config, kwargs):
+        """One attempt, plus a hedged duplicate if it is slow; returns the first successful result."""
+        def submit():
+            return _executor.submit(contextvars.copy_context().run, self._attempt, input, config, kwargs)
+
+        primary = submit()
+        futures = {primary}
+        delay = self.hedge_delay()
+        left = remaining()
+        if delay is not None and (left is None or delay < left):
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self._count("hedges", hedges_total)
+                futures.add(submit())
+
+        error = None
+        while futures:
+            left = remaining()
+            done, futures = wait(futures, timeout=None if left is None else max(left, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                for future in futures:
+                    future.cancel()
+                self._count("deadline_exceeded", deadline_total)
+                raise DeadlineExceeded(f"{self.name}: no answer before the request deadline")
+            for future in done:
+                if future.exception() is None:
+                    for loser in futures:
+                        loser.cancel()
+                    if future is not primary:
+                        self._count("hedge_wins", hedge_wins_total)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _retry_or_raise(self, error, attempt):
+        """Record a failed attempt; sleep before the next one, or re-raise when it should not be retried."""
+        if isinstance(error, DeadlineExceeded):
+            # The caller's own deadline says nothing about the provider's health
+            self.breaker.inconclusive()
+            raise error
+        if not is_transient(error):
+            # The provider answered (e.g. a bad request): that says nothing against its health
+            self.breaker.success()
+            raise error
+        self.breaker.failure()
+        delay = random.uniform(0, min(LLM_RETRY_CAP, LLM_RETRY_BASE * 2 ** attempt))
+        left = remaining()
+        if attempt >= self.max_retries or (left is not None and delay >= left):
+            raise error
+        print(f"[WARNING] {self.name} failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        self._count("retries", retries_total)
+        time.sleep(delay)
+
+    def _check_breaker(self):
+        try:
+            self.breaker.check()
+        except CircuitOpen:
+            self._count("rejected", fast_fails_total)
+            raise
+
+    def invoke(self, input, config=None, **kwargs):
+        self._count("calls", calls_total)
+        attempt = 0
+        while True:
+            self._check_breaker()
+            try:
+                result = self._hedged(input, config, kwargs)
+            except Exception as e:
+                self._retry_or_raise(e, attempt)
+                attempt += 1
+                continue
+            self.breaker.success()
+            return result
+
+    def stream(self, input, config=None, **kwargs):
+        self._count("calls", calls_total)
+        attempt = 0
+        while True:
+            self._check_breaker()
+            started = False
+            try:
+                for chunk in self.model.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started:
+                    if is_transient(e):
+                        self.breaker.failure()
+                    raise
+                self._retry_or_raise(e, attempt)
+                attempt += 1
+                continue
+            self.breaker.success()
+            return
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        calls = counts["calls"] or 1
+        return dict(counts, hedge_rate=counts["hedges"] / calls, retry_rate=counts["retries"] / calls,
+                    hedge_delay=self.hedge_delay())
+
+
+_wrapped = {}
+
+def wrap(name, model):
+    """Registry load hook: wrap a model in ResilientLLM (once)."""
+    if isinstance(model, ResilientLLM):
+        return model
+    _wrapped[name] = ResilientLLM(name, model)
+    return _wrapped[name]
+
+def stats():
+    """Per model: calls, hedges, retries, deadline and breaker rejections, hedge/retry rates; plus the breaker state."""
+    return {"breaker": {"state": breaker.state(), "trips": breaker.trips},
+            "models": {name: model.stats() for name, model in _wrapped.items()}}
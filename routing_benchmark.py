@@ -0,0 +1,140 @@
+'''
+Offline benchmark of model routings (see model_routing.py).
+Every tier is replaced by a stand-in model whose latency follows the tier's "benchmark_latency"
+(override with --tier-latency light=lognormal:0.3:0.4). Then, for each routing, the agents are
+built and run on the opening turns of phase1_scenarios.tsv: for every scenario, mAgentER, mAgentEP,
+mAgentInfo, mAgentTrouble and mAgentCustomer run concurrently, the way a support turn does.
+
+Reports p50/p95/mean seconds per agent and for the whole turn, and how many steps went over their
+latency budget. Hedging is off (LLM_HEDGE_PERCENTILE=0) so routings are compared on the models alone.
+
+    python routing_benchmark.py --routings baseline,tiered --scenarios 20
+    python routing_benchmark.py --routings baseline,my_routing.json --json routing_report.json
+'''
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+AGENTS = ["mAgentER", "mAgentEP", "mAgentInfo", "mAgentTrouble", "mAgentCustomer"]
+
+
+def load_turns(path, limit):
+    scenarios = pd.read_csv(path, sep='\t', keep_default_na=False).head(limit)
+    return [{"domain": row["Domain"], "complaint": row["Initial Complaint"].strip(),
+             "representative": row["Support Agent Response 1"]} for row in scenarios.to_dict("records")]
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def run_routing(turns):
+    """{agent or "turn": [seconds per scenario]} for the agents built with the active routing"""
+    import agents
+    from langchain_core.messages import AIMessage
+
+    instances = {name: getattr(agents, name)() for name in AGENTS}
+    calls = {
+        "mAgentER": lambda t: instances["mAgentER"].invoke({'complaint': t["complaint"], 'chat_history': t["chat_history"]}),
+        "mAgentEP": lambda t: instances["mAgentEP"].invoke({'complaint': t["complaint"], 'chat_history': t["chat_history"]}),
+        "mAgentInfo": lambda t: instances["mAgentInfo"].invoke({'domain': t["domain"], 'message': t["complaint"], 'sender': 'client',
+                                                                'chat_history': t["chat_history"], 'refresh_cache': True}),
+        "mAgentTrouble": lambda t: instances["mAgentTrouble"].invoke({'domain': t["domain"], 'message': t["complaint"], 'sender': 'client',
+                                                                      'chat_history': t["chat_history"], 'refresh_cache': True}),
+        "mAgentCustomer": lambda t: instances["mAgentCustomer"].invoke({'input': t["representative"], 'chat_history': t["chat_history"], 'civil': '0'}),
+    }
+
+    def timed(name, turn):
+        start = time.perf_counter()
+        calls[name](turn)
+        return time.perf_counter() - start
+
+    seconds = {name: [] for name in AGENTS + ["turn"]}
+    with ThreadPoolExecutor(max_workers=len(AGENTS)) as executor:
+        for turn in turns:
+            turn = dict(turn, chat_history=[AIMessage(content="Client: " + turn["complaint"])])
+            start = time.perf_counter()
+            futures = {name: executor.submit(timed, name, turn) for name in AGENTS}
+            for name, future in futures.items():
+                seconds[name].append(future.result())
+            seconds["turn"].append(time.perf_counter() - start)
+    return seconds
+
+
+def budget_overruns():
+    import model_routing
+    return {f"{agent}.{step}": count for (agent, step, tier), count in model_routing.budget_exceeded.values.items()}
+
+
+def benchmark(routings, turns, tier_latency=None, seed=0):
+    """Run every routing; tier_latency ({tier: spec}) overrides the tiers' benchmark_latency."""
+    import model_routing
+    from fake_models import install_fake_models
+
+    report = {}
+    for spec in routings:
+        model_routing.use(spec)
+        latencies = {tier: settings.get("benchmark_latency", "lognormal:1.0:0.5")
+                     for tier, settings in model_routing.routing["tiers"].items()}
+        latencies.update(tier_latency or {})
+        # Fresh stand-ins per routing, so every routing sees the same latency draws per tier
+        install_fake_models(latency="constant:0", seed=seed, tier_latency=latencies)
+        before = budget_overruns()
+        start = time.perf_counter()
+        seconds = run_routing(turns)
+        after = budget_overruns()
+        report[spec] = {
+            "elapsed": time.perf_counter() - start,
+            "agents": {name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "mean": sum(values) / len(values)}
+                       for name, values in seconds.items()},
+            "over_budget": {step: count - before.get(step, 0) for step, count in after.items() if count > before.get(step, 0)},
+            "tiers": {step: settings["tier"] for step, settings in model_routing.routing["steps"].items()},
+        }
+    return report
+
+
+def print_report(report, scenarios):
+    names = AGENTS + ["turn"]
+    print(f"\n{scenarios} scenarios; seconds per agent (p50 / p95)")
+    print(f"{'routing':<20}" + "".join(f"{name:>18}" for name in names))
+    for spec, result in report.items():
+        print(f"{os.path.basename(spec):<20}" + "".join(
+            f"{result['agents'][name]['p50']:>9.2f}{result['agents'][name]['p95']:>9.2f}" for name in names))
+    for spec, result in report.items():
+        overruns = ", ".join(f"{step} x{count}" for step, count in sorted(result["over_budget"].items())) or "none"
+        print(f"[TIMING] {spec}: steps over budget: {overruns}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the latency of model routings with stand-in models")
+    parser.add_argument('--routings', default='baseline,tiered', help="comma-separated routing names or JSON files")
+    parser.add_argument('--scenarios', type=int, default=20, help="opening turns taken from --input")
+    parser.add_argument('--input', default=os.path.join(ROOT, 'phase1_scenarios.tsv'))
+    parser.add_argument('--tier-latency', action='append', default=[], metavar='TIER=SPEC',
+                        help="stand-in latency for a tier (see fake_models.LatencyProfile); repeatable")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    os.environ["LLM_HEDGE_PERCENTILE"] = "0"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+    sys.path.insert(0, ROOT)
+    tier_latency = dict(item.split("=", 1) for item in args.tier_latency)
+
+    turns = load_turns(args.input, args.scenarios)
+    report = benchmark(args.routings.split(','), turns, tier_latency, seed=args.seed)
+    print_report(report, len(turns))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+'''
+Embedding-based cache for agent suggestions.
+Similar complaints in the same domain get near-identical cue / procedure lists, so before calling the
+LLM the latest customer message (plus a short fingerprint of the recent history) is embedded and
+compared with earlier ones; above `threshold` cosine similarity the cached list is returned instead.
+Entries are partitioned by domain and evicted by TTL and LRU.
+
+Off by default (SEMANTIC_CACHE=1 turns it on). While it is on:
+- every mAgentInfo / mAgentTrouble request makes a synchronous embedding call before the LLM call, which
+  adds latency whenever the lookup misses;
+- entries are shared by all participants: a message similar enough to another participant's gets that
+  participant's cues. Raise SEMANTIC_CACHE_THRESHOLD if suggestions must stay specific to the message.
+
+The embedding function is pluggable: by default it is the registry's "embeddings" component
+(OpenAIEmbeddings), which fake_models.install_fake_models() swaps for a local hashing embedder.
+'''
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from model_registry import registry
+
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+
+def _registry_embedding(text):
+    return registry.get("embeddings").embed_query(text)
+
+
+class SemanticCache:
+    def __init__(self, name, embed=None, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 max_entries=512, history_messages=2, enabled=SEMANTIC_CACHE):
+        """
+        embed: callable text -> vector (default: registry "embeddings")
+        max_entries: entries kept per partition (least recently used are evicted first)
+        history_messages: how many of the latest chat messages are part of the lookup text
+        """
+        self.name = name
+        self.embed = embed or _registry_embedding
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.history_messages = history_messages
+        self.enabled = enabled
+        self.partitions = {}  # partition -> OrderedDict(entry id -> (unit vector, value, created))
+        self.matrices = {}    # partition -> (entry ids, stacked vectors), rebuilt after changes
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def lookup_text(self, message, chat_history):
+        """Latest message plus a compact fingerprint of the last few chat messages"""
+        recent = chat_history[-self.history_messages:] if self.history_messages else []
+        fingerprint = [str(m.content)[:200] for m in recent]
+        return "\n".join(fingerprint + [message])
+
+    def _vector(self, text):
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _matrix(self, partition):
+        if partition not in self.matrices:
+            entries = self.partitions.get(partition, {})
+            ids = list(entries)
+            vectors = np.stack([entries[i][0] for i in ids]) if ids else None
+            self.matrices[partition] = (ids, vectors)
+        return self.matrices[partition]
+
+    def _expire(self, partition, now):
+        entries = self.partitions.get(partition)
+        expired = [i for i, (_, _, created) in entries.items() if now - created > self.ttl] if entries else []
+        for i in expired:
+            del entries[i]
+        if expired:
+            self.matrices.pop(partition, None)
+
+    def get(self, partition, vector):
+        """Cached value of the most similar entry above the threshold, and its similarity; (None, best) otherwise"""
+        with self.lock:
+            self._expire(partition, time.time())
+            ids, vectors = self._matrix(partition)
+            if vectors is None:
+                return None, 0.0
+            similarities = vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None, float(similarities[best])
+            entries = self.partitions[partition]
+            entries.move_to_end(ids[best])
+            return entries[ids[best]][1], float(similarities[best])
+
+    def put(self, partition, vector, value):
+        with self.lock:
+            entries = self.partitions.setdefault(partition, OrderedDict())
+            entries[self.next_id] = (vector, value, time.time())
+            self.next_id += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self.matrices.pop(partition, None)
+
+    def invoke(self, partition, message, chat_history, compute, refresh=False):
+        """
+        Return the cached value for a similar message in `partition`, or compute() it and cache the result.
+        refresh=True always computes (and caches) a fresh value.
+        """
+        if not self.enabled:
+            return compute()
+        try:
+            vector = self._vector(self.lookup_text(message, chat_history))
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            print(f"[WARNING] {self.name} semantic cache unavailable, calling the agent: {e}")
+            return compute()
+
+        value, similarity = (None, 0.0) if refresh else self.get(partition, vector)
+        with self.lock:
+            if value is not None:
+                self.hits += 1
+            elif not refresh:
+                self.misses += 1
+        if value is not None:
+            print(f"[INFO] {self.name} semantic cache hit ({partition}, similarity {similarity:.3f})")
+            return list(value)
+
+        value = compute()
+        self.put(partition, vector, list(value))
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.partitions.clear()
+            self.matrices.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": {partition: len(entries) for partition, entries in self.partitions.items()},
+            }
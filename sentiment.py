@@ -4,24 +4,34 @@ Approach 1: NLTK (traditional)
 Approch 2: Transformers (Hugging-Face)
 Approch 3: TextBlob
 '''
-from transformers import pipeline
-from textblob import TextBlob
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-import ssl
+from model_registry import registry
 
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
+# Models are loaded on first use (or registry.warm_up()) from the local NLTK / Hugging Face caches.
+# Nothing is downloaded at import time: provision the server once with
+#   python -m nltk.downloader vader_lexicon
+def _transformer_pipeline():
+    transformers = registry.import_module("transformers")
+    return transformers.pipeline("sentiment-analysis")
 
-nltk.download('vader_lexicon')
-nltk.download('punkt')
+def _vader():
+    nltk_sentiment = registry.import_module("nltk.sentiment")
+    try:
+        return nltk_sentiment.SentimentIntensityAnalyzer()
+    except LookupError as e:
+        raise LookupError("vader_lexicon not found in the local NLTK data path (NLTK_DATA); "
+                          "run `python -m nltk.downloader vader_lexicon` when provisioning the server") from e
 
-sentiment_analysis = pipeline("sentiment-analysis")
+def _textblob():
+    return registry.import_module("textblob").TextBlob
+
+registry.register("sentiment_pipeline", _transformer_pipeline)
+registry.register("vader", _vader)
+registry.register("textblob", _textblob)
 
 def get_sentiment_category_transformer(score, label):
     """Categorize sentiment based on score and label."""
@@ -47,7 +57,7 @@ def get_sentiment_category_transformer(score, label):
 
 def analyze_sentiment_transformer(client_latest_response):
     """Analyze sentiment using transformers and return the sentiment category."""
-    result = sentiment_analysis(client_latest_response)
+    result = registry.get("sentiment_pipeline")(client_latest_response)
     sentiment_score = result[0]['score']
     sentiment_label = result[0]['label']
     sentiment_category = get_sentiment_category_transformer(sentiment_score, sentiment_label)
@@ -63,8 +73,6 @@ def analyze_sentiment_transformer(client_latest_response):
 
 
 
-sia = SentimentIntensityAnalyzer()
-
 # categorize sentiment into 7 levels，  it can range from -1 to 1.
 def get_sentiment_category_nltk(score):
     """Categorize sentiment score into a 7-point scale with equal intervals."""
@@ -86,7 +94,7 @@ def get_sentiment_category_nltk(score):
 # analyze the last response from client
 def analyze_sentiment_nltk(client_latest_response):
     """Analyze sentiment of a given text and return the sentiment category."""
-    score = sia.polarity_scores(client_latest_response)["compound"]
+    score = registry.get("vader").polarity_scores(client_latest_response)["compound"]
     return get_sentiment_category_nltk(score)
 
 
@@ -94,7 +102,7 @@ def analyze_sentiment_nltk(client_latest_response):
 
 def analyze_sentiment_textblob(client_latest_response):
     """Analyze sentiment using TextBlob and return sentiment category."""
-    blob = TextBlob(client_latest_response)
+    blob = registry.get("textblob")(client_latest_response)
     sentiment = blob.sentiment
     sentiment_category = get_sentiment_category_nltk(sentiment.polarity)
     return sentiment_category
@@ -115,6 +123,10 @@ def analyze_sentiment_decision(client_latest_response):
     textblob_result = analyze_sentiment_textblob(client_latest_response)
     transformers_result = analyze_sentiment_transformer(client_latest_response)
 
+    return combine_sentiment_results(nltk_result, textblob_result, transformers_result)
+
+def combine_sentiment_results(nltk_result, textblob_result, transformers_result):
+    """Average the three 7-point categories and map the rounded score back to a category."""
     sentiment_dict = {
         "Very Positive": 3,
         "Positive": 2,
@@ -134,6 +146,138 @@ def analyze_sentiment_decision(client_latest_response):
     return label_score
 
 
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies of a message share a cache entry."""
+    return " ".join(str(text).split())
+
+class SentimentEngine:
+    """
+    Cached, batched front-end to analyze_sentiment_decision().
+    - Results are kept in an LRU cache keyed on the normalized text.
+    - Concurrent analyze() calls are grouped by a background worker into one transformer forward pass
+      (up to max_batch_size texts, waiting at most max_wait_ms for more to arrive); analyze_batch() scores
+      its texts in forward passes of max_batch_size.
+    - VADER and TextBlob run on a thread pool while the transformer batch is being scored.
+    """
+    def __init__(self, cache_size=1024, max_batch_size=16, max_wait_ms=10):
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batch_queue = queue.Queue()
+        self.worker = None
+        self.worker_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sentiment")
+
+    def _cache_get(self, key):
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+            return None
+
+    def _cache_put(self, key, value):
+        with self.cache_lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _transformer_batch(self, texts):
+        # A pipeline given a list still runs one forward pass per text unless batch_size says otherwise
+        results = registry.get("sentiment_pipeline")(texts, batch_size=min(len(texts), self.max_batch_size), truncation=True)
+        return [get_sentiment_category_transformer(r['score'], r['label']) for r in results]
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.batch_queue.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.batch_queue.get(timeout=self.max_wait))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                categories = self._transformer_batch(texts)
+                for (_, future), category in zip(batch, categories):
+                    future.set_result(category)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def _submit_transformer(self, text):
+        with self.worker_lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._batch_loop, daemon=True)
+                self.worker.start()
+        future = Future()
+        self.batch_queue.put((text, future))
+        return future
+
+    def analyze(self, text):
+        """Return the sentiment category of one message."""
+        key = normalize_text(text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        transformers_future = self._submit_transformer(key)
+        nltk_future = self.executor.submit(analyze_sentiment_nltk, key)
+        textblob_future = self.executor.submit(analyze_sentiment_textblob, key)
+
+        category = combine_sentiment_results(nltk_future.result(), textblob_future.result(), transformers_future.result())
+        self._cache_put(key, category)
+        return category
+
+    def analyze_batch(self, texts):
+        """Return the sentiment category of every text, scoring each distinct text once (in transformer batches of max_batch_size)."""
+        keys = [normalize_text(text) for text in texts]
+        results = {}
+        todo = []
+        for key in dict.fromkeys(keys):
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                todo.append(key)
+
+        if todo:
+            transformers_future = self.executor.submit(self._transformer_batch, todo)
+            nltk_results = list(self.executor.map(analyze_sentiment_nltk, todo))
+            textblob_results = list(self.executor.map(analyze_sentiment_textblob, todo))
+            for key, nltk_result, textblob_result, transformers_result in zip(todo, nltk_results, textblob_results, transformers_future.result()):
+                results[key] = combine_sentiment_results(nltk_result, textblob_result, transformers_result)
+                self._cache_put(key, results[key])
+
+        return [results[key] for key in keys]
+
+    def analyze_tsv(self, path, column, output_column=None, output_path=None):
+        """
+        Score one text column of a TSV file (e.g. "Follow-up Complaint 2" in phase1_scenarios.tsv) offline.
+        Adds the categories as `output_column` and writes to `output_path` when given. Returns the DataFrame.
+        """
+        import pandas as pd
+
+        df = pd.read_csv(path, sep='\t')
+        df[output_column or f"{column} Sentiment"] = self.analyze_batch(df[column].fillna("").tolist())
+        if output_path:
+            df.to_csv(output_path, sep='\t', index=False, lineterminator='\n')
+        return df
+
+    def stats(self):
+        with self.cache_lock:
+            return {"cache_size": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+sentiment_engine = SentimentEngine()
+
+
 # if __name__ == "__main__":
 #     test_queries = [
 #         "Sorry? That's all you've got? A simple \"sorry\" won't fix the mess of a stay I had. What are you going to do about it?",
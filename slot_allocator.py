@@ -0,0 +1,176 @@
+'''
+Participant slot allocation per (condition, emotion regulation type).
+Backed by SQLite so assignment and completion are single transactions even with several workers:
+- reserve() atomically picks a condition with room (completed + active leases < max) and leases a slot
+  to the participant for `lease_seconds`; calling it again for the same session returns the same lease.
+- release() gives a leased slot back (attention check failed); expired leases are dropped automatically.
+- complete() turns the lease into a completion, at most once per session.
+Reads (is_full(), counts()) are served from an in-memory snapshot refreshed after every write and at
+most `refresh_seconds` old otherwise.
+
+    python slot_allocator.py status
+    python slot_allocator.py rebuild [completions.csv]    # recount completions from the CSV log
+'''
+import os
+import sys
+import csv
+import json
+import time
+import random
+import sqlite3
+import threading
+
+import config as common
+
+EMOTION_REGULATION_TYPES = ["Suppressor", "NonSuppressor"]
+SLOT_LEASE_MINUTES = float(os.getenv("SLOT_LEASE_MINUTES", "90"))
+
+
+class SlotAllocator:
+    def __init__(self, path="slots.db", max_per_slot=30, conditions=None, types=EMOTION_REGULATION_TYPES,
+                 lease_seconds=SLOT_LEASE_MINUTES * 60, refresh_seconds=1.0):
+        self.path = path
+        self.max_per_slot = max_per_slot
+        self.conditions = conditions or list(common.ROUND_2_CONDITIONS)
+        self.types = types
+        self.lease_seconds = lease_seconds
+        self.refresh_seconds = refresh_seconds
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.snapshot_at = 0.0
+
+        conn = self._connection()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS counts (
+                condition TEXT NOT NULL, type TEXT NOT NULL, completed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (condition, type))""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+                session_id TEXT PRIMARY KEY, condition TEXT NOT NULL, type TEXT NOT NULL, expires REAL NOT NULL)""")
+            conn.execute("CREATE TABLE IF NOT EXISTS completed_sessions (session_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO counts (condition, type, completed) VALUES (?, ?, 0)",
+                             [(c, t) for c in self.conditions for t in self.types])
+
+    def _connection(self):
+        if not hasattr(self.local, "conn"):
+            # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+            self.local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return self.local.conn
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside one write transaction, then refresh the snapshot."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+            result = fn(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._load(conn)
+        return result
+
+    def _load(self, conn=None):
+        conn = conn or self._connection()
+        now = time.time()
+        snapshot = {c: {t: {"completed": 0, "leased": 0} for t in self.types} for c in self.conditions}
+        for condition, type_, completed in conn.execute("SELECT condition, type, completed FROM counts"):
+            snapshot.setdefault(condition, {}).setdefault(type_, {"completed": 0, "leased": 0})["completed"] = completed
+        for condition, type_, leased in conn.execute(
+                "SELECT condition, type, COUNT(*) FROM leases WHERE expires >= ? GROUP BY condition, type", (now,)):
+            snapshot.setdefault(condition, {}).setdefault(type_, {"completed": 0, "leased": 0})["leased"] = leased
+        with self.lock:
+            self.snapshot = snapshot
+            self.snapshot_at = now
+        return snapshot
+
+    def _current(self):
+        with self.lock:
+            if self.snapshot is not None and time.time() - self.snapshot_at < self.refresh_seconds:
+                return self.snapshot
+        return self._load()
+
+    def counts(self):
+        """{condition: {type: completed}} — same shape as the old participant_counts.json"""
+        return {c: {t: cell["completed"] for t, cell in types.items()} for c, types in self._current().items()}
+
+    def status(self):
+        """{condition: {type: {"completed", "leased"}}}"""
+        return self._current()
+
+    def is_full(self):
+        """True when every slot is taken by a completion or an active lease."""
+        return all(cell["completed"] + cell["leased"] >= self.max_per_slot
+                   for types in self._current().values() for cell in types.values())
+
+    def reserve(self, session_id, emotion_regulation_type):
+        """Lease a slot in a random condition with room for this type; returns the condition, or None if all are full."""
+        def pick(conn):
+            row = conn.execute("SELECT condition FROM leases WHERE session_id = ?", (session_id,)).fetchone()
+            if row:
+                conn.execute("UPDATE leases SET expires = ? WHERE session_id = ?", (time.time() + self.lease_seconds, session_id))
+                return row[0]
+            available = [condition for condition, taken in conn.execute(
+                """SELECT c.condition, c.completed + (SELECT COUNT(*) FROM leases l WHERE l.condition = c.condition AND l.type = c.type)
+                   FROM counts c WHERE c.type = ?""", (emotion_regulation_type,)) if taken < self.max_per_slot]
+            if not available:
+                return None
+            condition = random.choice(available)
+            conn.execute("INSERT INTO leases (session_id, condition, type, expires) VALUES (?, ?, ?, ?)",
+                         (session_id, condition, emotion_regulation_type, time.time() + self.lease_seconds))
+            return condition
+        return self._transaction(pick)
+
+    def release(self, session_id):
+        """Give a participant's leased slot back."""
+        return self._transaction(lambda conn: conn.execute("DELETE FROM leases WHERE session_id = ?", (session_id,)).rowcount > 0)
+
+    def complete(self, session_id, condition, emotion_regulation_type):
+        """Count a verified completion (once per session) and drop its lease. Returns False if already counted."""
+        def finish(conn):
+            conn.execute("DELETE FROM leases WHERE session_id = ?", (session_id,))
+            if conn.execute("INSERT OR IGNORE INTO completed_sessions (session_id) VALUES (?)", (session_id,)).rowcount == 0:
+                return False
+            conn.execute("INSERT OR IGNORE INTO counts (condition, type, completed) VALUES (?, ?, 0)", (condition, emotion_regulation_type))
+            conn.execute("UPDATE counts SET completed = completed + 1 WHERE condition = ? AND type = ?", (condition, emotion_regulation_type))
+            return True
+        return self._transaction(finish)
+
+    def rebuild(self, completions_csv):
+        """Recount completions from completions.csv (rows with an unknown condition/type are skipped). Leases are kept."""
+        rows = []
+        if os.path.exists(completions_csv):
+            with open(completions_csv, newline='') as f:
+                rows = [row for row in csv.DictReader(f)
+                        if row['condition'] in self.conditions and row['emotion_regulation_type'] in self.types]
+
+        def recount(conn):
+            conn.execute("UPDATE counts SET completed = 0")
+            conn.execute("DELETE FROM completed_sessions")
+            for row in rows:
+                if conn.execute("INSERT OR IGNORE INTO completed_sessions (session_id) VALUES (?)", (row['session_id'],)).rowcount:
+                    conn.execute("UPDATE counts SET completed = completed + 1 WHERE condition = ? AND type = ?",
+                                 (row['condition'], row['emotion_regulation_type']))
+            return len(rows)
+        return self._transaction(recount)
+
+    def seed(self, counts):
+        """Initialise completion counts (e.g. from the old participant_counts.json) if nothing has been counted yet."""
+        def apply(conn):
+            if conn.execute("SELECT SUM(completed) FROM counts").fetchone()[0]:
+                return False
+            for condition, types in counts.items():
+                for type_, completed in types.items():
+                    conn.execute("INSERT OR REPLACE INTO counts (condition, type, completed) VALUES (?, ?, ?)", (condition, type_, completed))
+            return True
+        return self._transaction(apply)
+
+
+if __name__ == "__main__":
+    allocator = SlotAllocator()
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        path = sys.argv[2] if len(sys.argv) > 2 else "completions.csv"
+        print(f"Counted {allocator.rebuild(path)} completions from {path}")
+    print(json.dumps(allocator.status(), indent=2))
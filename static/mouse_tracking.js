@@ -1,22 +1,29 @@
 /**
  * Mouse Tracking Module
  * Tracks mouse position, quadrant entry/exit, and hover events on agent panels
+ *
+ * Data is uploaded in small chunks every FLUSH_INTERVAL_MS (see mouse_log.py for the format):
+ * movements are delta-encoded integers, every chunk carries a sequence number, and unacknowledged
+ * chunks are resent on the next flush (the server drops duplicates), so only the data since the
+ * last flush is held in memory or at risk when the page closes. Every chunk carries the round its stream
+ * started in (current_round, set by index_chat.html), so unacknowledged chunks that survive reset() are
+ * still filed under their own round.
+ * Only saveTrackingData() marks a round final; a page closed or reloaded mid-round is not.
  */
 
+const FLUSH_INTERVAL_MS = 5000;
+const FLUSH_MAX_MOVEMENTS = 150;
+
 class MouseTracker {
     constructor() {
-        this.tracking = {
-            movements: [],
-            quadrantEvents: [],
-            agentHovers: [],
-            startTime: Date.now()
-        };
+        this.startStream();
 
         this.currentQuadrant = null;
         this.quadrantStartTime = null;
         this.sampleInterval = 200; // Sample every 200ms
         this.lastSampleTime = 0;
         this.savedManually = false; // Track if data was manually saved
+        this.outbox = []; // Chunks sent but not yet acknowledged
 
         // Store references to layout columns for accurate boundary detection
         this.leftColumn = null;
@@ -30,6 +37,21 @@ class MouseTracker {
         this.init();
     }
 
+    startStream(round = (typeof current_round !== 'undefined' ? current_round : null)) {
+        const startTime = Date.now();
+        this.round = round;
+        this.tracking = {
+            movements: [],      // [timestamp, x, y] since the last flush
+            quadrantEvents: [], // [quadrant, entry_ms, exit_ms] since the last flush
+            agentHovers: [],    // [agent, entry_ms, exit_ms] since the last flush
+            startTime: startTime
+        };
+        // Identifies this tracker's chunks; a page reload in the same round starts a new stream
+        this.stream = startTime.toString(36) + '-' + Math.random().toString(36).slice(2, 8);
+        this.seq = 0;
+        this.movementCount = 0;
+    }
+
     init() {
         console.log('[Mouse Tracking] Initializing mouse tracker');
 
@@ -49,15 +71,20 @@ class MouseTracker {
         // Track agent panel hovers
         this.setupAgentHoverTracking();
 
-        // Save data when leaving page (only if not already saved manually)
+        // Upload what was collected every few seconds
+        this.flushTimer = setInterval(() => this.flush().catch(() => {}), FLUSH_INTERVAL_MS);
+
+        // Send the last chunk when leaving page (only if not already saved manually)
         window.addEventListener('beforeunload', () => {
             if (!this.savedManually) {
                 console.log('[Mouse Tracking] beforeunload - saving data');
-                // Use sendBeacon as fallback for beforeunload (synchronous)
-                const data = this.getTrackingData();
-                const blob = new Blob([JSON.stringify(data)], { type: 'application/json' });
-                const sessionId = window.location.pathname.split('/')[2];
-                navigator.sendBeacon(`/store-mouse-tracking/${sessionId}/`, blob);
+                // Use sendBeacon as fallback for beforeunload (synchronous); only unacknowledged chunks are sent.
+                // Not final: a reload continues the round in a new stream
+                this.finalizeActive();
+                this.outbox.push(this.buildChunk(false));
+                this.outbox.forEach(chunk => {
+                    navigator.sendBeacon(this.uploadUrl(), new Blob([JSON.stringify(chunk)], { type: 'application/json' }));
+                });
             } else {
                 console.log('[Mouse Tracking] beforeunload - skipping (already saved manually)');
             }
@@ -81,15 +108,15 @@ class MouseTracker {
         const timestamp = now - this.tracking.startTime;
 
         // Record position
-        this.tracking.movements.push({
-            x: x,
-            y: y,
-            timestamp: timestamp
-        });
+        this.tracking.movements.push([timestamp, Math.round(x), Math.round(y)]);
+        this.movementCount++;
 
         // Log every 50 movements for debugging
-        if (this.tracking.movements.length % 50 === 0) {
-            console.log(`[Mouse Tracking] Captured ${this.tracking.movements.length} mouse movements`);
+        if (this.movementCount % 50 === 0) {
+            console.log(`[Mouse Tracking] Captured ${this.movementCount} mouse movements`);
+        }
+        if (this.tracking.movements.length >= FLUSH_MAX_MOVEMENTS) {
+            this.flush().catch(() => {});
         }
 
         // Detect quadrant
@@ -103,14 +130,7 @@ class MouseTracker {
                 const entryTimestamp = this.quadrantStartTime;
                 const duration = exitTimestamp - entryTimestamp;
 
-                this.tracking.quadrantEvents.push({
-                    quadrant: this.currentQuadrant,
-                    entry_timestamp_ms: entryTimestamp,
-                    exit_timestamp_ms: exitTimestamp,
-                    duration_ms: duration,
-                    entry_timestamp_iso: new Date(this.tracking.startTime + entryTimestamp).toISOString(),
-                    exit_timestamp_iso: new Date(this.tracking.startTime + exitTimestamp).toISOString()
-                });
+                this.tracking.quadrantEvents.push([this.currentQuadrant, entryTimestamp, exitTimestamp]);
                 console.log(`[Mouse Tracking] Completed visit to ${this.currentQuadrant}, duration: ${duration}ms`);
             }
 
@@ -215,15 +235,8 @@ class MouseTracker {
                 const exitTime = Date.now() - this.tracking.startTime;
                 const duration = exitTime - entryTime;
 
-                // Record one complete hover event with all timestamps
-                this.tracking.agentHovers.push({
-                    agent: agentType,
-                    entry_timestamp_ms: entryTime,
-                    exit_timestamp_ms: exitTime,
-                    duration_ms: duration,
-                    entry_timestamp_iso: new Date(this.tracking.startTime + entryTime).toISOString(),
-                    exit_timestamp_iso: new Date(this.tracking.startTime + exitTime).toISOString()
-                });
+                // Record one complete hover event (ISO times and duration are derived on the server)
+                this.tracking.agentHovers.push([agentType, entryTime, exitTime]);
 
                 console.log(`[Mouse Tracking] Hover completed on ${agentType}, duration: ${duration}ms`);
                 this.activeHovers.delete(agentType);
@@ -231,21 +244,13 @@ class MouseTracker {
         });
     }
 
-    getTrackingData() {
-        const now = Date.now();
-        const currentTimestamp = now - this.tracking.startTime;
+    finalizeActive() {
+        const currentTimestamp = Date.now() - this.tracking.startTime;
 
         // Finalize any active quadrant visit
         if (this.currentQuadrant !== null && this.quadrantStartTime !== null) {
             const duration = currentTimestamp - this.quadrantStartTime;
-            this.tracking.quadrantEvents.push({
-                quadrant: this.currentQuadrant,
-                entry_timestamp_ms: this.quadrantStartTime,
-                exit_timestamp_ms: currentTimestamp,
-                duration_ms: duration,
-                entry_timestamp_iso: new Date(this.tracking.startTime + this.quadrantStartTime).toISOString(),
-                exit_timestamp_iso: new Date(now).toISOString()
-            });
+            this.tracking.quadrantEvents.push([this.currentQuadrant, this.quadrantStartTime, currentTimestamp]);
             console.log(`[Mouse Tracking] Finalizing active quadrant visit: ${this.currentQuadrant}, duration: ${duration}ms`);
             this.currentQuadrant = null;
             this.quadrantStartTime = null;
@@ -255,49 +260,96 @@ class MouseTracker {
         if (this.activeHovers.size > 0) {
             this.activeHovers.forEach((entryTime, agentType) => {
                 const duration = currentTimestamp - entryTime;
-                this.tracking.agentHovers.push({
-                    agent: agentType,
-                    entry_timestamp_ms: entryTime,
-                    exit_timestamp_ms: currentTimestamp,
-                    duration_ms: duration,
-                    entry_timestamp_iso: new Date(this.tracking.startTime + entryTime).toISOString(),
-                    exit_timestamp_iso: new Date(now).toISOString()
-                });
+                this.tracking.agentHovers.push([agentType, entryTime, currentTimestamp]);
                 console.log(`[Mouse Tracking] Finalizing active hover: ${agentType}, duration: ${duration}ms`);
             });
             this.activeHovers.clear();
         }
+    }
 
-        return {
-            ...this.tracking,
-            totalDuration: currentTimestamp
+    buildChunk(final) {
+        // First sample absolute, the rest as deltas: [t0, x0, y0, dt, dx, dy, ...]
+        const packed = [];
+        let prev = null;
+        this.tracking.movements.forEach(([t, x, y]) => {
+            if (prev === null) {
+                packed.push(t, x, y);
+            } else {
+                packed.push(t - prev[0], x - prev[1], y - prev[2]);
+            }
+            prev = [t, x, y];
+        });
+
+        const chunk = {
+            stream: this.stream,
+            round: this.round,
+            seq: this.seq++,
+            start: this.tracking.startTime,
+            final: final,
+            total: Date.now() - this.tracking.startTime,
+            m: packed,
+            q: this.tracking.quadrantEvents,
+            h: this.tracking.agentHovers
         };
+        this.tracking.movements = [];
+        this.tracking.quadrantEvents = [];
+        this.tracking.agentHovers = [];
+        return chunk;
     }
 
-    saveTrackingData() {
+    uploadUrl() {
         const sessionId = window.location.pathname.split('/')[2];
-        const data = this.getTrackingData();
+        return `/store-mouse-tracking/${sessionId}/`;
+    }
+
+    flush(final = false) {
+        const t = this.tracking;
+        if (final || t.movements.length || t.quadrantEvents.length || t.agentHovers.length) {
+            this.outbox.push(this.buildChunk(final));
+        }
+        if (!this.outbox.length) {
+            return Promise.resolve(null);
+        }
+
+        // Send every unacknowledged chunk; a chunk that arrives twice is ignored by the server
+        const sending = this.outbox.slice();
+        return Promise.all(sending.map(chunk =>
+            fetch(this.uploadUrl(), {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(chunk),
+                keepalive: true  // Ensures request completes even if page is closing
+            })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(result => {
+                this.outbox = this.outbox.filter(pending => pending !== chunk);
+                return result;
+            })
+        ))
+        .then(results => results[results.length - 1])
+        .catch(error => {
+            console.warn(`[Mouse Tracking] Upload failed, ${this.outbox.length} chunk(s) will be retried:`, error);
+            throw error;
+        });
+    }
 
+    saveTrackingData() {
         console.log('[Mouse Tracking] Saving tracking data:', {
-            movements: data.movements.length,
-            quadrantEvents: data.quadrantEvents.length,
-            agentHovers: data.agentHovers.length,
-            totalDuration: data.totalDuration,
-            startTime: new Date(data.startTime).toISOString()
+            movements: this.movementCount,
+            chunks: this.seq + 1,
+            totalDuration: Date.now() - this.tracking.startTime,
+            startTime: new Date(this.tracking.startTime).toISOString()
         });
-        console.log('[Mouse Tracking] Sample movement data:', data.movements.slice(0, 3));
-        console.log('[Mouse Tracking] Sample quadrant data:', data.quadrantEvents.slice(0, 3));
-
-        // Use fetch instead of sendBeacon for better compatibility with Flask
-        return fetch(`/store-mouse-tracking/${sessionId}/`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(data),
-            keepalive: true  // Ensures request completes even if page is closing
-        })
-        .then(response => response.json())
+
+        this.finalizeActive();
+        return this.flush(true)
         .then(result => {
             this.savedManually = true; // Mark as saved to prevent duplicate beforeunload save
             console.log('[Mouse Tracking] Data saved successfully:', result);
@@ -309,15 +361,15 @@ class MouseTracker {
         });
     }
 
-    reset() {
-        // Reset tracking for new round
+    reset(round) {
+        // Reset tracking for new round (the next one unless given)
         console.log('[Mouse Tracking] Resetting tracker for new round');
-        this.tracking = {
-            movements: [],
-            quadrantEvents: [],
-            agentHovers: [],
-            startTime: Date.now()
-        };
+        this.startStream(round !== undefined ? round : (this.round === null ? null : this.round + 1));
+        if (this.outbox.length) {
+            // Chunks of the previous round keep their stream and are resent until acknowledged
+            console.log(`[Mouse Tracking] Resending ${this.outbox.length} unacknowledged chunk(s) from the previous round`);
+            this.flush().catch(() => {});
+        }
         this.currentQuadrant = null;
         this.quadrantStartTime = null;
         this.activeHovers.clear(); // Clear active hover sessions
@@ -353,8 +405,8 @@ function saveMouseTracking() {
 }
 
 // Expose function to reset tracking (e.g., starting new round)
-function resetMouseTracking() {
+function resetMouseTracking(round) {
     if (mouseTracker) {
-        mouseTracker.reset();
+        mouseTracker.reset(round);
     }
 }
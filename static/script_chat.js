@@ -5,8 +5,86 @@ const AGENT_TIMEOUT_MS = 120000; // 2 minutes
 function fetchWithTimeout(url, options) {
     const controller = new AbortController();
     const timeoutId = setTimeout(() => controller.abort(), AGENT_TIMEOUT_MS);
-    return fetch(url, { ...options, signal: controller.signal })
-        .finally(() => clearTimeout(timeoutId));
+    // Agents that are still loading or all busy answer 503 + Retry-After; keep retrying until the timeout
+    const attempt = () => fetch(url, { ...options, signal: controller.signal })
+        .then((response) => {
+            if (response.status !== 503) return response;
+            const retryAfter = parseInt(response.headers.get('Retry-After') || '5', 10);
+            return new Promise((resolve) => setTimeout(resolve, retryAfter * 1000)).then(attempt);
+        });
+    return attempt().finally(() => clearTimeout(timeoutId));
+}
+
+// POST to a server-sent events endpoint, calling onEvent(event, payload) for every event.
+// Resolves once the server closes the stream.
+const STREAM_REPLIES = typeof ReadableStream !== 'undefined' && typeof TextDecoder !== 'undefined';
+
+function fetchEventStream(url, options, onEvent) {
+    return fetchWithTimeout(url, options).then((response) => {
+        if (!response.ok || !response.body) {
+            throw new Error(`Event stream failed with status ${response.status}`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const read = () => reader.read().then(({ value, done }) => {
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach((line) => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(event, JSON.parse(data));
+            }
+            return done ? null : read();
+        });
+        return read();
+    });
+}
+
+// Calls onToken for every {"token"} event; resolves with the payload of the final "done" event.
+function fetchReplyStream(url, options, onToken) {
+    let result = null;
+    return fetchEventStream(url, options, (event, payload) => {
+        if (event === 'done') result = payload;
+        else if (event === 'error') throw new Error(payload.message);
+        else onToken(payload.token);
+    }).then(() => {
+        if (!result) throw new Error('Reply stream ended before completion');
+        return result;
+    });
+}
+
+// Request every panel in `types` with one /support-bundle/ call.
+// Returns {type: promise of that panel's payload}, each settling as soon as its agent finishes.
+function fetchSupportBundle(message, types) {
+    const sessionId = window.location.pathname.split('/')[2];
+    const clientId = sessionStorage.getItem('client_id');
+    const pending = {};
+    const panels = {};
+    types.forEach((type) => {
+        panels[type] = new Promise((resolve, reject) => { pending[type] = { resolve, reject }; });
+    });
+    const failAll = (error) => Object.values(pending).forEach(({ reject }) => reject(error));
+
+    fetchEventStream(`/support-bundle/${sessionId}/`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ client_reply: message, client_id: clientId, types: types }),
+    }, (event, payload) => {
+        if (event === 'panel') pending[payload.type].resolve(payload);
+        else if (event === 'error') pending[payload.type].reject(new Error(payload.message));
+        else if (event === 'done') console.log('Support panel timings (s):', payload.timings);
+    })
+        .then(() => failAll(new Error('Support stream ended before all panels arrived')))
+        .catch(failAll);
+    return panels;
 }
 
 function showAgentError() {
@@ -378,7 +456,7 @@ function createLoader(loaderId = 'info-loader') {
   return loader;
 }
 
-function retrieveInfoSupport(message,support_type) {
+function retrieveInfoSupport(message, support_type, panelData = null) {
   const infoDiv = document.getElementById('co-pilot');
 
     const header = document.createElement('div');
@@ -401,14 +479,14 @@ function retrieveInfoSupport(message,support_type) {
   const sessionId = window.location.pathname.split('/')[2];
   const clientId = sessionStorage.getItem('client_id');
 
-  fetch(`/get-info-support/${sessionId}/`, {
+  (panelData || fetch(`/get-info-support/${sessionId}/`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
     body: JSON.stringify({ client_reply: message, client_id: clientId }),
   })
-    .then((response) => response.json())
+    .then((response) => response.json()))
     .then((data) => {
       const responseContainer = document.createElement('div');
       responseContainer.style.display = 'flex';
@@ -436,7 +514,7 @@ function retrieveInfoSupport(message,support_type) {
 
 
 
-function retrieveEmoSupport(message, support_type) {
+function retrieveEmoSupport(message, support_type, panelData = null) {
   const supportDiv = document.getElementById('supportWindow');
 
   const cardId = `${support_type}-card`;
@@ -482,14 +560,14 @@ function retrieveEmoSupport(message, support_type) {
   const clientId = sessionStorage.getItem('client_id');
 
   if (support_type == 'TYPE_SENTIMENT') {
-    fetch(`/sentiment/${sessionId}/`, {
+    (panelData || fetch(`/sentiment/${sessionId}/`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({ client_reply: message, client_id: clientId }),
     })
-      .then((response) => response.json())
+      .then((response) => response.json()))
       .then((data) => {
         // Add this into html
         document.getElementById(loaderId).remove();
@@ -507,7 +585,7 @@ function retrieveEmoSupport(message, support_type) {
         showAgentError();
       });
   } else {
-    fetch(`/get-emo-support/${sessionId}/`, {
+    (panelData || fetch(`/get-emo-support/${sessionId}/`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -518,7 +596,7 @@ function retrieveEmoSupport(message, support_type) {
         client_id: clientId,
       }),
     })
-      .then((response) => response.json())
+      .then((response) => response.json()))
       .then((data) => {
         //            var emoMessage = createSupportPane(data.message, "emo")
         //            card.appendChild(emoMessage);
@@ -624,7 +702,7 @@ function sendEmoFeedback(support_type) {
     });
 }
 
-function retrieveTroubleSupport(message, support_type) {
+function retrieveTroubleSupport(message, support_type, panelData = null) {
   const troubleDiv = document.getElementById('troubleWindow');
 
     const header = document.createElement('div');
@@ -649,14 +727,14 @@ function retrieveTroubleSupport(message, support_type) {
     const sessionId = window.location.pathname.split('/')[2];
     const clientId = sessionStorage.getItem('client_id');
 
-    fetch(`/get-trouble-support/${sessionId}/`, {
+    (panelData || fetch(`/get-trouble-support/${sessionId}/`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({client_reply: message, client_id: clientId}),
         })
-        .then(response => response.json())
+        .then(response => response.json()))
         .then(data => {
 
             const orderList = document.createElement('ol');
@@ -688,13 +766,18 @@ function retrieveTroubleSupport(message, support_type) {
     });
 }
 
-function processClientResponse(data) {
+function processClientResponse(data, messageElement = null) {
   turn_number += 1;
 
   const chatDiv = document.getElementById('chatWindow');
   const typing = document.getElementById('typing');
-  var aiMessage = createMessageElement(data.message, 'in');
-  chatDiv.appendChild(aiMessage);
+  if (messageElement) {
+    // Reply was streamed into this bubble already; replace it with the final cleaned message
+    messageElement.querySelector('.message-body').innerHTML = data.message;
+  } else {
+    var aiMessage = createMessageElement(data.message, 'in');
+    chatDiv.appendChild(aiMessage);
+  }
   chatDiv.scrollTop = chatDiv.scrollHeight;
   typing.style.display = 'none';
 
@@ -715,14 +798,23 @@ function processClientResponse(data) {
     }
   }
 
+  // Fetch all panels for this turn in one streamed request; each pane fills in as its agent finishes
+  const panelTypes = [];
+  if (data.show_info == '1') panelTypes.push('TYPE_INFO_CUE', 'TYPE_INFO_GUIDE');
+  if (data.show_emo == '1') {
+    panelTypes.push('TYPE_SENTIMENT');
+    if (turn_number > 1) panelTypes.push('TYPE_EMO_REFRAME');
+  }
+  const panels = STREAM_REPLIES && panelTypes.length ? fetchSupportBundle(data.message, panelTypes) : {};
+
   if (data.show_info == '1') {
     const infoDiv = document.getElementById('co-pilot');
     infoDiv.innerHTML = '';
-    retrieveInfoSupport(data.message, "TYPE_INFO_CUE");
+    retrieveInfoSupport(data.message, "TYPE_INFO_CUE", panels['TYPE_INFO_CUE']);
 
     const troubleDiv = document.getElementById('troubleWindow');
     troubleDiv.innerHTML = '';
-    retrieveTroubleSupport(data.message, 'TYPE_INFO_GUIDE');
+    retrieveTroubleSupport(data.message, 'TYPE_INFO_GUIDE', panels['TYPE_INFO_GUIDE']);
   }
 
   if (data.show_emo == '1') {
@@ -730,10 +822,10 @@ function processClientResponse(data) {
     supportDiv.innerHTML = '';
     //        retrieveEmoSupport(data.message,TYPE_EMO_THOUGHT);
     //        retrieveEmoSupport(data.message,TYPE_EMO_SHOES);
-    retrieveEmoSupport(data.message, 'TYPE_SENTIMENT');
+    retrieveEmoSupport(data.message, 'TYPE_SENTIMENT', panels['TYPE_SENTIMENT']);
 
     if (turn_number > 1){
-        retrieveEmoSupport(data.message, 'TYPE_EMO_REFRAME');
+        retrieveEmoSupport(data.message, 'TYPE_EMO_REFRAME', panels['TYPE_EMO_REFRAME']);
     }
 
   }
@@ -781,21 +873,37 @@ function sendMessage() {
     // retrieveEmoFeedback(TYPE_SENTIMENT);
   }
 
-    fetchWithTimeout(`/get-reply/${sessionId}/`, {
+    // Stream the customer's reply into a message bubble as it is generated (falls back to the JSON route)
+    let streamedMessage = null;
+    const replyOptions = {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify({prompt: message, client_id: clientId, show_info: showInfo, show_emo: showEmo}),
-    })
-    .then(response => response.json())
+    };
+    const replyRequest = STREAM_REPLIES
+        ? fetchReplyStream(`/get-reply-stream/${sessionId}/`, replyOptions, (token) => {
+            if (!streamedMessage) {
+                streamedMessage = createMessageElement('', 'in');
+                chatDiv.appendChild(streamedMessage);
+                typing.style.display = 'none';
+            }
+            streamedMessage.querySelector('.message-body').textContent += token;
+            chatDiv.scrollTop = chatDiv.scrollHeight;
+        })
+        : fetchWithTimeout(`/get-reply/${sessionId}/`, replyOptions).then(response => response.json());
+
+    replyRequest
     .then(data => {
         const isFinish = data.message.includes("FINISH:999");
         if(isFinish) {
             // Strip FINISH:999 and show the final message if there is one
             data.message = data.message.replace("FINISH:999", "").trim();
             if (data.message.length > 0) {
-                processClientResponse(data);
+                processClientResponse(data, streamedMessage);
+            } else if (streamedMessage) {
+                streamedMessage.remove();
             }
 
             // Show the modal after a short delay so the user can read the final message
@@ -806,7 +914,7 @@ function sendMessage() {
                 input.disabled = true;
             }, 3000);
         } else {
-            processClientResponse(data);
+            processClientResponse(data, streamedMessage);
         }
     })
     .catch((error) => {
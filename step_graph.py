@@ -0,0 +1,68 @@
+'''
+Small declarative step graph used by the emotional agents.
+Each step is a function of the results produced so far, and lists the steps it depends on.
+Steps whose dependencies are satisfied run concurrently on a shared thread pool,
+so a pipeline takes as long as its critical path instead of the sum of its steps.
+Step latencies are also recorded in metrics.step_seconds, and LLM calls made by a step carry its name.
+All graphs share one pool of STEP_GRAPH_WORKERS threads, since one agent instance serves concurrent requests.
+'''
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+
+STEP_GRAPH_WORKERS = int(os.getenv("STEP_GRAPH_WORKERS", "64"))
+_executor = ThreadPoolExecutor(max_workers=STEP_GRAPH_WORKERS, thread_name_prefix="step")
+
+
+class StepGraph:
+    def __init__(self, name, executor=None):
+        self.name = name
+        self.steps = {}
+        self.executor = executor or _executor
+
+    def add(self, name, fn, deps=()):
+        """Register step `name`; `fn(results)` is called once every step in `deps` has finished."""
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"{self.name}: step '{name}' depends on unknown step '{dep}'")
+        self.steps[name] = (fn, tuple(deps))
+        return self
+
+    def run(self, inputs):
+        """
+        Execute all steps and return (results, timings).
+        `results` holds the inputs plus one entry per step, `timings` the seconds spent in each step and in total.
+        """
+        results = dict(inputs)
+        timings = {}
+        pending = dict(self.steps)
+        running = {}
+        start = time.perf_counter()
+
+        def timed(step_name, fn):
+            step_start = time.perf_counter()
+            with metrics.labels(step=step_name):
+                output = fn(results)
+            elapsed = time.perf_counter() - step_start
+            metrics.step_seconds.observe(elapsed, **{**metrics.current_labels(), 'agent': self.name, 'step': step_name})
+            return step_name, output, elapsed
+
+        while pending or running:
+            for step_name, (fn, deps) in list(pending.items()):
+                if all(dep in timings for dep in deps):
+                    # Each step runs in a copy of the caller's context, so it keeps the metric labels
+                    running[self.executor.submit(contextvars.copy_context().run, timed, step_name, fn)] = step_name
+                    del pending[step_name]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                step_name, output, elapsed = future.result()
+                results[step_name] = output
+                timings[step_name] = elapsed
+
+        timings['total'] = time.perf_counter() - start
+        return results, timings
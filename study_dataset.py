@@ -0,0 +1,260 @@
+'''
+Columnar dataset builder for the participant folders under DATA_DIR.
+Every participant folder is parsed once into five Parquet tables, partitioned by condition and participant:
+
+    <out>/messages/condition=<c>/participant=<p>/part.parquet       chat_history
+    <out>/suggestions/...                                             ai_suggestions
+    <out>/feedback/...                                                ai_feedback
+    <out>/surveys/...                                                 *_survey.json, long format (survey, field, value)
+    <out>/mouse_events/...                                            mouse_tracking_round_N.jsonl/.json (movement / quadrant / hover rows)
+    <out>/mouse_summary/...                                           mouse_summary.json, one row per (round, quadrant or agent)
+
+Each table has participant, condition and round columns, so notebooks load them with
+pd.read_parquet("<out>/messages", columns=[...], filters=[("condition", "==", "emo_only")]).
+
+Runs are incremental: <out>/_manifest.json keeps each participant's file fingerprints (mtime and size, plus
+a content hash that is only computed when those changed). Unchanged participants are skipped; changed ones
+are re-parsed on a process pool and their partitions replaced; deleted ones are removed.
+
+    python study_dataset.py [DATA_DIR] [--out study_dataset] [--workers N] [--full]
+'''
+import os
+import csv
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import event_store
+import mouse_log
+import mouse_summary
+
+TABLES = ['messages', 'suggestions', 'feedback', 'surveys', 'mouse_events', 'mouse_summary']
+STREAM_TABLES = {'chat_history': 'messages', 'ai_suggestions': 'suggestions', 'ai_feedback': 'feedback'}
+SURVEYS = ['pre_task_survey', 'post_round1_survey', 'post_task_survey', 'demographics_survey']
+MOUSE_EVENTS = {'movements': 'movement', 'quadrantEvents': 'quadrant', 'agentHovers': 'hover'}
+MANIFEST_FILE = '_manifest.json'
+
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(participant_dir, previous=None):
+    """{file name: [mtime_ns, size, sha1]} of the participant's JSON/JSONL files; hashes are reused while mtime and size match"""
+    previous = previous or {}
+    files = {}
+    for name in sorted(os.listdir(participant_dir)):
+        if not name.endswith(('.json', '.jsonl', '.jsonl.gz')) or name.endswith('.index.json'):
+            continue
+        stat = os.stat(os.path.join(participant_dir, name))
+        old = previous.get(name)
+        if old and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+            files[name] = old
+        else:
+            files[name] = [stat.st_mtime_ns, stat.st_size, _file_hash(os.path.join(participant_dir, name))]
+    return files
+
+
+def unchanged(files, previous):
+    """Same files with the same content (a touched file with identical bytes counts as unchanged)"""
+    return previous is not None and files.keys() == previous.keys() and \
+        all(files[name][2] == previous[name][2] for name in files)
+
+
+def load_conditions(completions_csv):
+    """participant folder name (Prolific ID or session ID) -> round 2 condition, from completions.csv"""
+    conditions = {}
+    if os.path.exists(completions_csv):
+        with open(completions_csv, newline='') as f:
+            for row in csv.DictReader(f):
+                conditions[row['session_id']] = row['condition']
+                if row.get('prolific_id'):
+                    conditions[row['prolific_id']] = row['condition']
+    return conditions
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _stream_records(participant_dir, stream):
+    """Records of a stream from its JSONL log, or from the exported/legacy <stream>.json"""
+    if os.path.exists(event_store.log_path(participant_dir, stream)):
+        return event_store.read(participant_dir, stream)
+    legacy_path = os.path.join(participant_dir, f"{stream}.json")
+    if not os.path.exists(legacy_path):
+        return []
+    data = _load_json(legacy_path)
+    return data if isinstance(data, list) else data.get('messages', [])
+
+
+def _mouse_rows(data):
+    rows = []
+    for key, event_type in MOUSE_EVENTS.items():
+        for event in data.get(key, []):
+            rows.append({'round': data.get('round'), 'event_type': event_type, **event})
+    return rows
+
+
+def _normalize(df):
+    """Parquet needs one type per column: nested values become JSON, mixed object columns become strings"""
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        values = df[column].dropna()
+        if values.map(lambda v: isinstance(v, (dict, list))).any():
+            df[column] = df[column].map(lambda v: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v)
+            values = df[column].dropna()
+        if not values.map(lambda v: isinstance(v, str)).all():
+            df[column] = df[column].map(lambda v: None if v is None or v != v else str(v))
+    if 'round' in df.columns:
+        df['round'] = pd.to_numeric(df['round'], errors='coerce').astype('Int64')
+    return df
+
+
+def participant_tables(participant_dir, condition=None):
+    """Parse one participant folder into {table: DataFrame}"""
+    participant = os.path.basename(participant_dir.rstrip(os.sep))
+    rows = {table: [] for table in TABLES}
+
+    for stream, table in STREAM_TABLES.items():
+        rows[table] = _stream_records(participant_dir, stream)
+
+    for survey in SURVEYS:
+        path = os.path.join(participant_dir, f"{survey}.json")
+        if os.path.exists(path):
+            data = _load_json(path)
+            condition = condition or data.get('condition')
+            rows['surveys'] += [{'survey': survey, 'round': data.get('round'), 'timestamp': data.get('timestamp'),
+                                 'field': field, 'value': json.dumps(value, default=str)}
+                                for field, value in data.items() if field not in ('session_id', 'timestamp')]
+
+    for round_num in mouse_log.rounds(participant_dir):
+        data = mouse_log.read_round(participant_dir, round_num)
+        if data.get('condition') not in (None, 'unknown'):
+            condition = condition or data['condition']
+        rows['mouse_events'] += _mouse_rows(data)
+
+    for round_num, summary in mouse_summary.load_summary(participant_dir).items():
+        for kind in ('quadrants', 'agents'):
+            rows['mouse_summary'] += [{'round': round_num, 'kind': kind[:-1], 'name': name, **stats}
+                                      for name, stats in summary[kind].items()]
+
+    condition = condition or 'unknown'
+    tables = {}
+    for table, records in rows.items():
+        if not records:
+            continue
+        df = pd.DataFrame(records)
+        df = df.loc[:, ~df.columns.duplicated()]
+        df.insert(0, 'participant', participant)
+        df.insert(1, 'condition', condition)
+        if 'round' not in df.columns:
+            df['round'] = None
+        tables[table] = _normalize(df)
+    return condition, tables
+
+
+def partition_dir(out_dir, table, condition, participant):
+    return os.path.join(out_dir, table, f"condition={condition}", f"participant={participant}")
+
+
+def remove_participant(out_dir, participant):
+    for path in glob.glob(os.path.join(out_dir, '*', 'condition=*', f"participant={participant}")):
+        shutil.rmtree(path)
+
+
+def ingest_participant(participant_dir, out_dir, condition=None):
+    """Worker: rewrite one participant's partitions. Returns (participant, condition, rows per table)."""
+    participant = os.path.basename(participant_dir.rstrip(os.sep))
+    condition, tables = participant_tables(participant_dir, condition)
+    remove_participant(out_dir, participant)
+    for table, df in tables.items():
+        path = partition_dir(out_dir, table, condition, participant)
+        os.makedirs(path, exist_ok=True)
+        # Partition values live in the directory names
+        df.drop(columns=['participant', 'condition']).to_parquet(os.path.join(path, 'part.parquet'), index=False)
+    return participant, condition, {table: len(df) for table, df in tables.items()}
+
+
+def check_parquet_engine():
+    """Fail before ingesting anything when pandas cannot write Parquet (pyarrow, see requirements.txt)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("study_dataset needs pyarrow to write Parquet: pip install -r requirements.txt") from None
+
+
+def build(data_dir, out_dir, completions_csv='completions.csv', workers=None, full=False):
+    """Bring out_dir up to date with data_dir. Returns the number of participants (re)ingested."""
+    check_parquet_engine()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    manifest = {}
+    if full:
+        # Everyone is re-ingested; clearing the tables also drops participants whose folders were deleted
+        for table in TABLES:
+            shutil.rmtree(os.path.join(out_dir, table), ignore_errors=True)
+    elif os.path.exists(manifest_path):
+        manifest = _load_json(manifest_path)
+    conditions = load_conditions(completions_csv)
+
+    participants = sorted(name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+    for participant in set(manifest) - set(participants):
+        print(f"[INFO] Removing {participant} (folder deleted)")
+        remove_participant(out_dir, participant)
+        del manifest[participant]
+
+    changed = {}
+    for participant in participants:
+        previous = manifest.get(participant, {})
+        files = fingerprint(os.path.join(data_dir, participant), previous.get('files'))
+        condition = conditions.get(participant)
+        if unchanged(files, previous.get('files')) and (condition is None or condition == previous.get('condition')):
+            continue
+        changed[participant] = files
+    print(f"[INFO] {len(participants)} participants, {len(changed)} new or changed")
+
+    def save_manifest():
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_participant, os.path.join(data_dir, participant), out_dir, conditions.get(participant)): participant
+                   for participant in changed}
+        for future in as_completed(futures):
+            participant = futures[future]
+            try:
+                _, condition, counts = future.result()
+            except Exception as e:
+                print(f"[WARNING] Could not ingest {participant}, it will be retried on the next run: {e}")
+                continue
+            manifest[participant] = {'condition': condition, 'files': changed[participant], 'rows': counts}
+            save_manifest()
+            print(f"[INFO] Ingested {participant} ({condition}): {counts}")
+
+    save_manifest()
+    return len(changed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build partitioned Parquet tables from the participant folders")
+    parser.add_argument('data_dir', nargs='?', default='study_data_round_1')
+    parser.add_argument('--out', default='study_dataset')
+    parser.add_argument('--completions', default='completions.csv', help="CSV mapping participants to conditions")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--full', action='store_true', help="ignore the manifest and re-ingest everyone")
+    args = parser.parse_args()
+
+    build(args.data_dir, args.out, completions_csv=args.completions, workers=args.workers, full=args.full)
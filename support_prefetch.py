@@ -0,0 +1,87 @@
+'''
+Speculative computation of the support panels for a turn.
+getReply submits the panels enabled for the client as soon as the customer's reply is generated,
+keyed by (session_id, client_id, turn_number). When the browser then asks for a panel, the support
+route claims the finished result, or waits on the in-flight future, instead of starting the agent
+from scratch. Hits, misses and the agent time saved are tracked per turn number.
+'''
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+
+class SupportPrefetcher:
+    def __init__(self, executor, max_turns=1000):
+        """
+        executor: runs the panel computations
+        max_turns: prefetched turns kept at most; the oldest unclaimed ones are dropped first
+        """
+        self.executor = executor
+        self.max_turns = max_turns
+        self.turns = OrderedDict()  # key -> {"reply": ..., "panels": {panel: future}}
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: {"requests": 0, "hits": 0, "saved": 0.0})
+
+    def submit(self, key, reply, tasks):
+        """
+        Start `tasks` ({panel: zero-argument callable}) for the turn `key`.
+        Each callable must return a dict with the panel's "elapsed" computation time in seconds.
+        Turns of the same conversation that were never claimed are discarded.
+        """
+        futures = {panel: self.executor.submit(task) for panel, task in tasks.items()}
+        with self.lock:
+            for old_key in [k for k in self.turns if k[:-1] == key[:-1]]:
+                self._discard(old_key)
+            self.turns[key] = {"reply": reply, "panels": futures}
+            while len(self.turns) > self.max_turns:
+                self._discard(next(iter(self.turns)))
+
+    def _discard(self, key):
+        for future in self.turns.pop(key)["panels"].values():
+            future.cancel()
+
+    def claim(self, key, reply, panel):
+        """Prefetched result of `panel` for this turn (waiting for it if still running), or None on a miss"""
+        with self.lock:
+            entry = self.turns.get(key)
+            future = None
+            if entry and entry["reply"] == reply:
+                future = entry["panels"].pop(panel, None)
+                if not entry["panels"]:
+                    del self.turns[key]
+
+        result = None
+        waited = 0.0
+        if future is not None:
+            start = time.perf_counter()
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[WARNING] Prefetched {panel} failed, recomputing: {e}")
+            waited = time.perf_counter() - start
+
+        turn_number = key[-1]
+        with self.lock:
+            counts = self.counts[turn_number]
+            counts["requests"] += 1
+            if result is None:
+                return None
+            saved = max(result["elapsed"] - waited, 0.0)
+            counts["hits"] += 1
+            counts["saved"] += saved
+        print(f"[TIMING] Prefetch hit for {panel} on turn {turn_number}: waited {waited:.2f}s, saved {saved:.2f}s")
+        return dict(result, prefetched=True)
+
+    def stats(self):
+        """Per turn number: panel requests, prefetch hits, hit rate and agent time saved (seconds)"""
+        with self.lock:
+            return {
+                turn_number: {
+                    "requests": c["requests"],
+                    "hits": c["hits"],
+                    "hit_rate": c["hits"] / c["requests"] if c["requests"] else 0.0,
+                    "saved": c["saved"],
+                    "avg_saved": c["saved"] / c["hits"] if c["hits"] else 0.0,
+                }
+                for turn_number, c in sorted(self.counts.items())
+            }
@@ -1,44 +1,33 @@
 import time
-from flask import Flask, request, jsonify, render_template, session
-import os, json
-import certifi
-from flask_pymongo import PyMongo
-from langchain.schema import messages_from_dict, messages_to_dict
+import os, sys
+
+# Every call below repeats the same input; time the agents, not the semantic cache
+os.environ.setdefault("SEMANTIC_CACHE", "0")
 
-import langchain_openai as lcai
-from utils import mLangChain
 from agents import *
 
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 
 from dotenv import load_dotenv
 load_dotenv("project.env")
 
-DB_NAME = "test"
-
-print(os.getenv("AZURE_OPENAI_ENDPOINT"))
-
-app = Flask(__name__, static_url_path='/static', static_folder='static')
-app.secret_key = 'your_secret_key'  # Required for session to work
+# Live benchmark against the OpenAI API, one call at a time.
+# For concurrent, offline measurements of the Flask routes use loadtest.py; pass --fake here to use the stand-in models.
+if "--fake" in sys.argv:
+    from fake_models import install_fake_models
+    install_fake_models()
 
-product = "pizza"
+domain = "Airline"
 fixed_complaint = "Do I look like I memorize every insignificant number? It's your job to fix this, not mine. Here, since you can't seem to do it yourself: 85692347. Happy now?"
 chat_history = [AIMessage(content="""@Dominos I ordered a pizza from you guys and it arrived cold and soggy. Not the delicious meal I was hoping for. Disappointed and hungry."""), HumanMessage(content="Sorry, could you please share your order number?")]
-input_data_product = [product, fixed_complaint, chat_history]
-input_data = [None, fixed_complaint, chat_history]
+input_data_domain = {'domain': domain, 'message': fixed_complaint, 'sender': 'client', 'chat_history': chat_history}
+input_data = {'complaint': fixed_complaint, 'chat_history': chat_history}
 
-def test_agent_performance(agent_function, input_data, num_calls=100):
+def test_agent_performance(agent, input_data, num_calls=100):
     total_time = 0
     for _ in range(num_calls):
         start_time = time.time()
-        if input_data[0] == None:
-            res = agent_function.invoke({'complaint': input_data[1], 'chat_history': input_data[2]})
-        else:
-            res = agent_function.invoke({'product': input_data[0], 'complaint': input_data[1], 'chat_history': input_data[2]})
+        res = agent.invoke(input_data)
         end_time = time.time()
         print(res)
         total_time += (end_time - start_time)
@@ -46,11 +35,10 @@ def test_agent_performance(agent_function, input_data, num_calls=100):
     return average_time
 
 
-info_agent1_avg_time = test_agent_performance(agent_coworker_info(), input_data_product)
-emo_agent = mAgentER()
-emo_reframe_agent1_avg_time = test_agent_performance(emo_agent, input_data)
-emo_perspec_agent1_avg_time = test_agent_performance(agent_coworker_emo_perspective(), input_data)
-trouble_agent1_avg_time = test_agent_performance(agent_coworker_trouble(), input_data_product)
+info_agent1_avg_time = test_agent_performance(mAgentInfo(), input_data_domain)
+emo_reframe_agent1_avg_time = test_agent_performance(mAgentER(), input_data)
+emo_perspec_agent1_avg_time = test_agent_performance(mAgentEP(), input_data)
+trouble_agent1_avg_time = test_agent_performance(mAgentTrouble(), input_data_domain)
 
 # Output the results
 print(f"Info Agent 1 Average Time: {info_agent1_avg_time}")